@@ -1,8 +1,40 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
-import hashlib
+
+from db import (
+    bootstrap,
+    authenticate_user,
+    apply_leave,
+    get_leaves_page,
+    iter_leave_history,
+    get_departments,
+    get_employees_overview,
+    set_leave_statuses,
+    get_dashboard_stats,
+    get_team_absences,
+    get_headcount,
+    check_team_coverage,
+    latest_change,
+    cache_stats,
+)
+from approval_queue import approval_queue
+from credentials import LoginThrottled
+from instrumentation import (
+    begin_rerun,
+    enable as enable_instrumentation,
+    enabled as instrumentation_enabled,
+    end_rerun,
+    fragment_rerun,
+    section,
+    write_jsonl,
+    write_prometheus,
+)
+from leave_export import EXPORT_FORMATS, available_formats, export_bytes
+from live_updates import live_updates, mark_drawn
+from team_calendar import daily_absences
+from user_session import refresh, start_session
+from working_days import get_calendars, working_days
 
 # Page configuration
 st.set_page_config(
@@ -12,8 +44,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+begin_rerun("app.py")
+
 # Custom CSS for modern styling
-st.markdown("""
+with section("css"):
+    st.markdown("""
     <style>
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
     
@@ -185,227 +220,18 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Database initialization
-def init_db():
-    conn = sqlite3.connect('leave_management.db')
-    c = conn.cursor()
-    
-    # Create employees table
-    c.execute('''CREATE TABLE IF NOT EXISTS employees
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  emp_id TEXT UNIQUE NOT NULL,
-                  name TEXT NOT NULL,
-                  email TEXT NOT NULL,
-                  department TEXT NOT NULL,
-                  position TEXT NOT NULL,
-                  password TEXT NOT NULL,
-                  total_leaves INTEGER DEFAULT 20,
-                  used_leaves INTEGER DEFAULT 0)''')
-    
-    # Create leave_requests table
-    c.execute('''CREATE TABLE IF NOT EXISTS leave_requests
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  emp_id TEXT NOT NULL,
-                  leave_type TEXT NOT NULL,
-                  start_date DATE NOT NULL,
-                  end_date DATE NOT NULL,
-                  days INTEGER NOT NULL,
-                  reason TEXT,
-                  status TEXT DEFAULT 'Pending',
-                  applied_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  approved_by TEXT,
-                  approved_date TIMESTAMP,
-                  FOREIGN KEY (emp_id) REFERENCES employees(emp_id))''')
-    
-    conn.commit()
-    conn.close()
+# Initialize database and sample data once per process, not on every rerun
+@st.cache_resource(show_spinner=False)
+def bootstrap_database():
+    bootstrap()
+    return True
 
-# Insert sample data
-def insert_sample_data():
-    conn = sqlite3.connect('leave_management.db')
-    c = conn.cursor()
-    
-    # Check if data already exists
-    c.execute("SELECT COUNT(*) FROM employees")
-    if c.fetchone()[0] == 0:
-        # Sample employees
-        employees = [
-            ('EMP001', 'John Doe', 'john.doe@acme.com', 'Engineering', 'Senior Developer', hashlib.md5('password123'.encode()).hexdigest(), 20, 5),
-            ('EMP002', 'Jane Smith', 'jane.smith@acme.com', 'Marketing', 'Marketing Manager', hashlib.md5('password123'.encode()).hexdigest(), 20, 3),
-            ('EMP003', 'Mike Johnson', 'mike.johnson@acme.com', 'HR', 'HR Specialist', hashlib.md5('password123'.encode()).hexdigest(), 20, 8),
-            ('EMP004', 'Sarah Williams', 'sarah.williams@acme.com', 'Engineering', 'Junior Developer', hashlib.md5('password123'.encode()).hexdigest(), 20, 2),
-            ('EMP005', 'Robert Brown', 'robert.brown@acme.com', 'Sales', 'Sales Executive', hashlib.md5('password123'.encode()).hexdigest(), 20, 10),
-            ('ADMIN', 'Admin User', 'admin@acme.com', 'Management', 'Administrator', hashlib.md5('admin123'.encode()).hexdigest(), 20, 0),
-        ]
-        
-        c.executemany('''INSERT INTO employees 
-                        (emp_id, name, email, department, position, password, total_leaves, used_leaves)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', employees)
-        
-        # Sample leave requests
-        leave_requests = [
-            ('EMP001', 'Sick Leave', '2025-11-15', '2025-11-17', 3, 'Medical appointment', 'Approved', 'ADMIN'),
-            ('EMP001', 'Vacation', '2025-12-20', '2025-12-22', 2, 'Family vacation', 'Pending', None),
-            ('EMP002', 'Personal Leave', '2025-11-20', '2025-11-22', 3, 'Personal matters', 'Approved', 'ADMIN'),
-            ('EMP003', 'Sick Leave', '2025-11-10', '2025-11-17', 8, 'Flu recovery', 'Approved', 'ADMIN'),
-            ('EMP004', 'Vacation', '2025-12-15', '2025-12-16', 2, 'Short trip', 'Pending', None),
-            ('EMP005', 'Sick Leave', '2025-11-01', '2025-11-05', 5, 'Surgery recovery', 'Approved', 'ADMIN'),
-            ('EMP005', 'Vacation', '2025-12-10', '2025-12-14', 5, 'Year-end vacation', 'Rejected', 'ADMIN'),
-        ]
-        
-        c.executemany('''INSERT INTO leave_requests 
-                        (emp_id, leave_type, start_date, end_date, days, reason, status, approved_by)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', leave_requests)
-        
-        conn.commit()
-    
-    conn.close()
-
-# Authentication functions
-def authenticate_user(emp_id, password):
-    conn = sqlite3.connect('leave_management.db')
-    c = conn.cursor()
-    hashed_password = hashlib.md5(password.encode()).hexdigest()
-    c.execute("SELECT * FROM employees WHERE emp_id=? AND password=?", (emp_id, hashed_password))
-    user = c.fetchone()
-    conn.close()
-    return user
-
-def get_employee_info(emp_id):
-    conn = sqlite3.connect('leave_management.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM employees WHERE emp_id=?", (emp_id,))
-    employee = c.fetchone()
-    conn.close()
-    return employee
-
-# Leave management functions
-def apply_leave(emp_id, leave_type, start_date, end_date, reason):
-    conn = sqlite3.connect('leave_management.db')
-    c = conn.cursor()
-    
-    # Calculate number of days
-    days = (end_date - start_date).days + 1
-    
-    # Check available leaves
-    employee = get_employee_info(emp_id)
-    available_leaves = employee[6] - employee[7]  # total_leaves - used_leaves
-    
-    if days > available_leaves:
-        conn.close()
-        return False, f"Insufficient leave balance. Available: {available_leaves} days"
-    
-    c.execute('''INSERT INTO leave_requests 
-                 (emp_id, leave_type, start_date, end_date, days, reason)
-                 VALUES (?, ?, ?, ?, ?, ?)''',
-              (emp_id, leave_type, start_date, end_date, days, reason))
-    
-    conn.commit()
-    conn.close()
-    return True, "Leave application submitted successfully!"
-
-def get_employee_leaves(emp_id):
-    conn = sqlite3.connect('leave_management.db')
-    df = pd.read_sql_query(
-        "SELECT * FROM leave_requests WHERE emp_id=? ORDER BY applied_date DESC",
-        conn, params=(emp_id,))
-    conn.close()
-    return df
-
-def get_all_leaves():
-    conn = sqlite3.connect('leave_management.db')
-    df = pd.read_sql_query(
-        """SELECT lr.*, e.name, e.department 
-           FROM leave_requests lr 
-           JOIN employees e ON lr.emp_id = e.emp_id 
-           ORDER BY lr.applied_date DESC""", conn)
-    conn.close()
-    return df
-
-def update_leave_status(leave_id, status, approved_by):
-    conn = sqlite3.connect('leave_management.db')
-    c = conn.cursor()
-    
-    # Get leave details
-    c.execute("SELECT emp_id, days, status FROM leave_requests WHERE id=?", (leave_id,))
-    leave = c.fetchone()
-    
-    if leave:
-        emp_id, days, old_status = leave
-        
-        # Update leave status
-        c.execute('''UPDATE leave_requests 
-                     SET status=?, approved_by=?, approved_date=CURRENT_TIMESTAMP 
-                     WHERE id=?''', (status, approved_by, leave_id))
-        
-        # Update employee's used leaves if approved
-        if status == 'Approved' and old_status != 'Approved':
-            c.execute("UPDATE employees SET used_leaves = used_leaves + ? WHERE emp_id=?",
-                     (days, emp_id))
-        elif status == 'Rejected' and old_status == 'Approved':
-            c.execute("UPDATE employees SET used_leaves = used_leaves - ? WHERE emp_id=?",
-                     (days, emp_id))
-        
-        conn.commit()
-    
-    conn.close()
-
-def get_dashboard_stats(emp_id=None):
-    conn = sqlite3.connect('leave_management.db')
-    c = conn.cursor()
-    
-    if emp_id:
-        # Employee-specific stats
-        employee = get_employee_info(emp_id)
-        total_leaves = employee[6]
-        used_leaves = employee[7]
-        available_leaves = total_leaves - used_leaves
-        
-        c.execute("SELECT COUNT(*) FROM leave_requests WHERE emp_id=? AND status='Pending'", (emp_id,))
-        pending_requests = c.fetchone()[0]
-        
-        conn.close()
-        return {
-            'total_leaves': total_leaves,
-            'used_leaves': used_leaves,
-            'available_leaves': available_leaves,
-            'pending_requests': pending_requests
-        }
-    else:
-        # Admin stats
-        c.execute("SELECT COUNT(*) FROM leave_requests WHERE status='Pending'")
-        pending_requests = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM employees")
-        total_employees = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM leave_requests WHERE status='Approved'")
-        approved_leaves = c.fetchone()[0]
-        
-        c.execute("SELECT COUNT(*) FROM leave_requests")
-        total_requests = c.fetchone()[0]
-        
-        conn.close()
-        return {
-            'pending_requests': pending_requests,
-            'total_employees': total_employees,
-            'approved_leaves': approved_leaves,
-            'total_requests': total_requests
-        }
-
-# Initialize database and sample data
-init_db()
-insert_sample_data()
+bootstrap_database()
 
 # Session state initialization
-if 'logged_in' not in st.session_state:
-    st.session_state.logged_in = False
-if 'user_id' not in st.session_state:
-    st.session_state.user_id = None
-if 'user_name' not in st.session_state:
-    st.session_state.user_name = None
-if 'is_admin' not in st.session_state:
-    st.session_state.is_admin = False
+# The signed UserSession of the logged-in user, None when logged out
+if 'user' not in st.session_state:
+    st.session_state.user = None
 
 # Login page
 def login_page():
@@ -429,12 +255,13 @@ def login_page():
         with col_a:
             if st.button("Login", use_container_width=True):
                 if emp_id and password:
-                    user = authenticate_user(emp_id, password)
+                    try:
+                        user = authenticate_user(emp_id, password)
+                    except LoginThrottled as e:
+                        st.error(f"{e}.")
+                        st.stop()
                     if user:
-                        st.session_state.logged_in = True
-                        st.session_state.user_id = user[1]
-                        st.session_state.user_name = user[2]
-                        st.session_state.is_admin = (user[1] == 'ADMIN')
+                        st.session_state.user = start_session(user)
                         st.rerun()
                     else:
                         st.error("Invalid credentials!")
@@ -450,245 +277,425 @@ def login_page():
             </div>
         """, unsafe_allow_html=True)
 
+# Dashboard sections are fragments: a widget inside one reruns only that
+# fragment, and a write reruns by key just the fragments it changed,
+# instead of the whole script. Fragments get the user from session state,
+# since a fragment rerun does not run main().
+def session_user():
+    """The logged-in user, reloaded if their row changed; logs out via a full rerun if it is gone"""
+    user = st.session_state.user = refresh(st.session_state.user)
+    if user is None:
+        st.rerun()
+    return user
+
 # Employee dashboard
-def employee_dashboard():
-    st.markdown(f"<h1>👋 Welcome, {st.session_state.user_name}!</h1>", unsafe_allow_html=True)
-    
-    # Dashboard stats
-    stats = get_dashboard_stats(st.session_state.user_id)
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-label">Total Leaves</div>
-                <div class="metric-value">{stats['total_leaves']}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-            <div class="metric-card" style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%);">
-                <div class="metric-label">Used Leaves</div>
-                <div class="metric-value">{stats['used_leaves']}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-            <div class="metric-card" style="background: linear-gradient(135deg, #10b981 0%, #059669 100%);">
-                <div class="metric-label">Available Leaves</div>
-                <div class="metric-value">{stats['available_leaves']}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col4:
-        st.markdown(f"""
-            <div class="metric-card" style="background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%);">
-                <div class="metric-label">Pending Requests</div>
-                <div class="metric-value">{stats['pending_requests']}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("---")
-    
-    # Tabs for different sections
-    tab1, tab2 = st.tabs(["📝 Apply Leave", "📊 My Leave History"])
-    
-    with tab1:
+@st.fragment(key="employee_stats")
+def employee_stats():
+    with fragment_rerun("app.py", "employee_stats"):
+        mark_drawn(latest_change, st.session_state.user.emp_id)
+        # Dashboard stats, cached in the session until the employee's row changes
+        stats = session_user().stats
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.markdown(f"""
+                <div class="metric-card">
+                    <div class="metric-label">Total Leaves</div>
+                    <div class="metric-value">{stats['total_leaves']}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown(f"""
+                <div class="metric-card" style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%);">
+                    <div class="metric-label">Used Leaves</div>
+                    <div class="metric-value">{stats['used_leaves']}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col3:
+            st.markdown(f"""
+                <div class="metric-card" style="background: linear-gradient(135deg, #10b981 0%, #059669 100%);">
+                    <div class="metric-label">Available Leaves</div>
+                    <div class="metric-value">{stats['available_leaves']}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col4:
+            st.markdown(f"""
+                <div class="metric-card" style="background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%);">
+                    <div class="metric-label">Pending Requests</div>
+                    <div class="metric-value">{stats['pending_requests']}</div>
+                </div>
+            """, unsafe_allow_html=True)
+
+def submit_leave():
+    """Submit button callback; the form's values are read from session state"""
+    start_date, end_date, reason = (st.session_state.apply_start, st.session_state.apply_end,
+                                    st.session_state.apply_reason)
+    if not (start_date and end_date and reason):
+        st.session_state.apply_result = ('warning', "Please fill in all fields!")
+    elif end_date < start_date:
+        st.session_state.apply_result = ('error', "End date must be after or equal to start date!")
+    else:
+        success, message = apply_leave(
+            st.session_state.user.emp_id,
+            st.session_state.apply_leave_type,
+            start_date,
+            end_date,
+            reason
+        )
+        st.session_state.apply_result = ('success' if success else 'error', message)
+        if success:
+            # The cards show the new pending request; the history tab loads fresh when opened
+            st.rerun(["employee_stats", "apply_leave_form"])
+
+@st.fragment(key="apply_leave_form")
+def apply_leave_form():
+    with fragment_rerun("app.py", "apply_leave_form"):
+        user = session_user()
         st.markdown("## Apply for Leave")
         
         col1, col2 = st.columns(2)
         
         with col1:
-            leave_type = st.selectbox(
+            st.selectbox(
                 "Leave Type",
-                ["Sick Leave", "Vacation", "Personal Leave", "Emergency Leave", "Other"]
+                ["Sick Leave", "Vacation", "Personal Leave", "Emergency Leave", "Other"],
+                key="apply_leave_type"
             )
-            start_date = st.date_input("Start Date", min_value=datetime.now().date())
+            start_date = st.date_input("Start Date", min_value=datetime.now().date(), key="apply_start")
         
         with col2:
-            reason = st.text_area("Reason", placeholder="Please provide a reason for your leave request")
-            end_date = st.date_input("End Date", min_value=datetime.now().date())
+            st.text_area("Reason", placeholder="Please provide a reason for your leave request", key="apply_reason")
+            end_date = st.date_input("End Date", min_value=datetime.now().date(), key="apply_end")
         
-        if st.button("Submit Leave Request", use_container_width=True):
-            if start_date and end_date and reason:
-                if end_date >= start_date:
-                    success, message = apply_leave(
-                        st.session_state.user_id,
-                        leave_type,
-                        start_date,
-                        end_date,
-                        reason
-                    )
-                    if success:
-                        st.markdown(f'<div class="success-message">✅ {message}</div>', unsafe_allow_html=True)
-                        st.rerun()
-                    else:
-                        st.markdown(f'<div class="error-message">❌ {message}</div>', unsafe_allow_html=True)
-                else:
-                    st.error("End date must be after or equal to start date!")
-            else:
-                st.warning("Please fill in all fields!")
-    
-    with tab2:
+        # Weekends and holidays in the employee's calendar are not charged
+        days_requested = working_days(start_date, end_date, user.department)
+        if end_date >= start_date:
+            st.caption(f"Working days requested: {days_requested} · Available: {user.stats['available_leaves']}")
+            coverage = check_team_coverage(user.emp_id, user.department,
+                                           start_date, end_date)
+            if coverage:
+                st.warning(f"⚠️ {coverage}")
+        
+        st.button("Submit Leave Request", use_container_width=True, on_click=submit_leave)
+        
+        kind, message = st.session_state.pop('apply_result', (None, None))
+        if kind == 'success':
+            st.markdown(f'<div class="success-message">✅ {message}</div>', unsafe_allow_html=True)
+        elif kind == 'error':
+            st.markdown(f'<div class="error-message">❌ {message}</div>', unsafe_allow_html=True)
+        elif kind == 'warning':
+            st.warning(message)
+
+@st.fragment(key="leave_history")
+def leave_history():
+    with fragment_rerun("app.py", "leave_history"):
         st.markdown("## My Leave History")
         
-        leaves_df = get_employee_leaves(st.session_state.user_id)
+        leaves_df = session_user().leaves
         
         if not leaves_df.empty:
             # Format the dataframe for display
             display_df = leaves_df[['leave_type', 'start_date', 'end_date', 'days', 'reason', 'status', 'applied_date']].copy()
             display_df.columns = ['Leave Type', 'Start Date', 'End Date', 'Days', 'Reason', 'Status', 'Applied Date']
             
-            # Apply styling to status
-            def highlight_status(row):
-                if row['Status'] == 'Approved':
-                    return ['background-color: #d1fae5'] * len(row)
-                elif row['Status'] == 'Rejected':
-                    return ['background-color: #fee2e2'] * len(row)
-                else:
-                    return ['background-color: #fef3c7'] * len(row)
-            
             st.dataframe(display_df, use_container_width=True, hide_index=True)
         else:
             st.info("No leave requests found.")
 
-# Admin dashboard
-def admin_dashboard():
-    st.markdown(f"<h1>🔧 Admin Dashboard</h1>", unsafe_allow_html=True)
-    
-    # Dashboard stats
-    stats = get_dashboard_stats()
-    
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-label">Pending Requests</div>
-                <div class="metric-value">{stats['pending_requests']}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown(f"""
-            <div class="metric-card" style="background: linear-gradient(135deg, #10b981 0%, #059669 100%);">
-                <div class="metric-label">Total Employees</div>
-                <div class="metric-value">{stats['total_employees']}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown(f"""
-            <div class="metric-card" style="background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%);">
-                <div class="metric-label">Approved Leaves</div>
-                <div class="metric-value">{stats['approved_leaves']}</div>
-            </div>
-        """, unsafe_allow_html=True)
+def employee_dashboard(user):
+    st.markdown(f"<h1>👋 Welcome, {user.name}!</h1>", unsafe_allow_html=True)
     
-    with col4:
-        st.markdown(f"""
-            <div class="metric-card" style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%);">
-                <div class="metric-label">Total Requests</div>
-                <div class="metric-value">{stats['total_requests']}</div>
-            </div>
-        """, unsafe_allow_html=True)
+    employee_stats()
+    # Approvals of this employee's requests
+    live_updates(latest_change, "admin_queue", "app.py", user.emp_id)
     
     st.markdown("---")
     
-    # Tabs for different sections
-    tab1, tab2 = st.tabs(["📋 All Leave Requests", "👥 Employee Overview"])
+    # Tabs for different sections; only the open tab's section runs
+    tab1, tab2 = st.tabs(["📝 Apply Leave", "📊 My Leave History"], key="dashboard_tab", on_change="rerun")
+    
+    if tab1.open:
+        with tab1:
+            apply_leave_form()
     
-    with tab1:
+    if tab2.open:
+        with tab2:
+            leave_history()
+
+# Admin dashboard
+@st.fragment(key="admin_stats")
+def admin_stats():
+    with fragment_rerun("app.py", "admin_stats"):
+        mark_drawn(latest_change)
+        stats = get_dashboard_stats()
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.markdown(f"""
+                <div class="metric-card">
+                    <div class="metric-label">Pending Requests</div>
+                    <div class="metric-value">{stats['pending_requests']}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown(f"""
+                <div class="metric-card" style="background: linear-gradient(135deg, #10b981 0%, #059669 100%);">
+                    <div class="metric-label">Total Employees</div>
+                    <div class="metric-value">{stats['total_employees']}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col3:
+            st.markdown(f"""
+                <div class="metric-card" style="background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%);">
+                    <div class="metric-label">Approved Leaves</div>
+                    <div class="metric-value">{stats['approved_leaves']}</div>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col4:
+            st.markdown(f"""
+                <div class="metric-card" style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%);">
+                    <div class="metric-label">Total Requests</div>
+                    <div class="metric-value">{stats['total_requests']}</div>
+                </div>
+            """, unsafe_allow_html=True)
+
+@st.fragment(key="leave_requests")
+def leave_requests():
+    with fragment_rerun("app.py", "leave_requests"):
+        user = session_user()
         st.markdown("## Manage Leave Requests")
         
-        # Filter options
-        col1, col2 = st.columns(2)
+        # Filter options, applied in SQL
+        col1, col2, col3, col4, col5 = st.columns(5)
         with col1:
             status_filter = st.selectbox("Filter by Status", ["All", "Pending", "Approved", "Rejected"])
+        with col2:
+            department_filter = st.selectbox("Filter by Department", ["All"] + get_departments())
+        with col3:
+            from_date = st.date_input("From", value=None)
+        with col4:
+            to_date = st.date_input("To", value=None)
+        with col5:
+            page_size = st.selectbox("Page Size", [25, 100, 250, 500], index=1)
         
-        leaves_df = get_all_leaves()
+        # Keyset pagination: one cursor per visited page, reset when filters change
+        filters = (status_filter, department_filter, from_date, to_date, page_size)
+        if st.session_state.get('admin_filters') != filters:
+            st.session_state.admin_filters = filters
+            st.session_state.admin_page_cursors = [None]
+        cursors = st.session_state.admin_page_cursors
+        status = None if status_filter == "All" else status_filter
+        department = None if department_filter == "All" else department_filter
         
-        if status_filter != "All":
-            leaves_df = leaves_df[leaves_df['status'] == status_filter]
+        # Every request matching the filters, streamed from SQL only when clicked
+        col_format, col_export = st.columns([1, 3])
+        with col_format:
+            export_format = st.selectbox("Export Format", available_formats(), label_visibility="collapsed")
+        with col_export:
+            st.download_button(
+                f"⬇️ Export filtered history ({export_format})",
+                data=lambda: export_bytes(iter_leave_history(status, department, from_date, to_date), export_format),
+                file_name=f"leave_history_{datetime.now():%Y%m%d}.{EXPORT_FORMATS[export_format].extension}",
+                mime=EXPORT_FORMATS[export_format].mime,
+                on_click="ignore"
+            )
+        
+        leaves_df, next_cursor = get_leaves_page(
+            status=status,
+            department=department,
+            start_date=from_date,
+            end_date=to_date,
+            after=cursors[-1],
+            page_size=page_size
+        )
+        
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            st.button("⬅️ Previous", disabled=len(cursors) == 1, use_container_width=True,
+                      on_click=cursors.pop)
+        with col_page:
+            st.markdown(f"<div style='text-align: center;'>Page {len(cursors)}</div>", unsafe_allow_html=True)
+        with col_next:
+            st.button("Next ➡️", disabled=next_cursor is None, use_container_width=True,
+                      on_click=cursors.append, args=(next_cursor,))
         
         if not leaves_df.empty:
-            for idx, row in leaves_df.iterrows():
-                with st.expander(f"🗓️ {row['name']} - {row['leave_type']} ({row['start_date']} to {row['end_date']})"):
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.write(f"**Employee:** {row['name']}")
-                        st.write(f"**Department:** {row['department']}")
-                        st.write(f"**Leave Type:** {row['leave_type']}")
-                    
-                    with col2:
-                        st.write(f"**Start Date:** {row['start_date']}")
-                        st.write(f"**End Date:** {row['end_date']}")
-                        st.write(f"**Days:** {row['days']}")
-                    
-                    with col3:
-                        st.write(f"**Status:** {row['status']}")
-                        st.write(f"**Applied:** {row['applied_date']}")
-                    
-                    st.write(f"**Reason:** {row['reason']}")
-                    
-                    if row['status'] == 'Pending':
-                        col_a, col_b, col_c = st.columns([1, 1, 2])
-                        with col_a:
-                            if st.button("✅ Approve", key=f"approve_{row['id']}"):
-                                update_leave_status(row['id'], 'Approved', st.session_state.user_id)
-                                st.success("Leave approved!")
-                                st.rerun()
-                        with col_b:
-                            if st.button("❌ Reject", key=f"reject_{row['id']}"):
-                                update_leave_status(row['id'], 'Rejected', st.session_state.user_id)
-                                st.error("Leave rejected!")
-                                st.rerun()
+            # One grid for the page instead of a widget tree per request;
+            # its decisions are written in one transaction, after which
+            # only the cards and this section rerun
+            approval_queue(
+                leaves_df[['id', 'name', 'department', 'leave_type', 'start_date', 'end_date',
+                           'days', 'reason', 'status', 'applied_date']],
+                key="admin_queue",
+                id_column='id',
+                write=lambda decisions: set_leave_statuses(decisions, user.emp_id),
+                refresh=("admin_stats", "leave_requests"),
+                column_config={
+                    "id": "ID",
+                    "name": "Employee",
+                    "department": "Department",
+                    "leave_type": "Leave Type",
+                    "start_date": "Start Date",
+                    "end_date": "End Date",
+                    "days": "Days",
+                    "reason": "Reason",
+                    "status": "Status",
+                    "applied_date": "Applied"
+                }
+            )
         else:
             st.info("No leave requests found.")
+
+def employee_overview():
+    st.markdown("## Employee Overview")
+    
+    employees_df = get_employees_overview()
     
-    with tab2:
-        st.markdown("## Employee Overview")
+    if not employees_df.empty:
+        employees_df['available_leaves'] = employees_df['total_leaves'] - employees_df['used_leaves']
+        employees_df.columns = ['Employee ID', 'Name', 'Email', 'Department', 'Position', 'Total Leaves', 'Used Leaves', 'Available Leaves']
+        st.dataframe(employees_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No employees found.")
+
+@st.fragment(key="team_calendar")
+def team_calendar():
+    with fragment_rerun("app.py", "team_calendar"):
+        st.markdown("## Team Calendar")
         
-        conn = sqlite3.connect('leave_management.db')
-        employees_df = pd.read_sql_query(
-            "SELECT emp_id, name, email, department, position, total_leaves, used_leaves FROM employees WHERE emp_id != 'ADMIN'",
-            conn)
-        conn.close()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            calendar_department = st.selectbox("Department", ["All"] + get_departments(), key="calendar_department")
+        with col2:
+            calendar_from = st.date_input("From", value=datetime.now().date(), key="calendar_from")
+        with col3:
+            calendar_to = st.date_input("To", value=datetime.now().date() + timedelta(days=30), key="calendar_to")
         
-        if not employees_df.empty:
-            employees_df['available_leaves'] = employees_df['total_leaves'] - employees_df['used_leaves']
-            employees_df.columns = ['Employee ID', 'Name', 'Email', 'Department', 'Position', 'Total Leaves', 'Used Leaves', 'Available Leaves']
-            st.dataframe(employees_df, use_container_width=True, hide_index=True)
+        if calendar_from > calendar_to:
+            st.error("End date must be after or equal to start date!")
         else:
-            st.info("No employees found.")
+            department = None if calendar_department == "All" else calendar_department
+            absences_df = get_team_absences(calendar_from, calendar_to, department)
+            out = daily_absences(absences_df, calendar_from, calendar_to, get_calendars().for_department(department))
+            headcount = get_headcount(department)
+            
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Headcount", headcount)
+            col2.metric("Most Out on One Day", int(out.max()) if not out.empty else 0)
+            col3.metric("Lowest Coverage", f"{1 - out.max() / headcount:.0%}" if headcount and not out.empty else "-")
+            
+            if not out.empty:
+                st.bar_chart(out.rename("People out"))
+            
+            if not absences_df.empty:
+                display_df = absences_df[['name', 'department', 'leave_type', 'start_date', 'end_date', 'days', 'status']].copy()
+                display_df.columns = ['Name', 'Department', 'Leave Type', 'Start Date', 'End Date', 'Days', 'Status']
+                st.dataframe(display_df, use_container_width=True, hide_index=True,
+                             column_config={"Start Date": st.column_config.DateColumn(),
+                                            "End Date": st.column_config.DateColumn()})
+            else:
+                st.info("Nobody is out in this period.")
+
+def admin_dashboard(user):
+    st.markdown(f"<h1>🔧 Admin Dashboard</h1>", unsafe_allow_html=True)
+    
+    admin_stats()
+    # Any new request or decision
+    live_updates(latest_change, "admin_queue", "app.py")
+    
+    st.markdown("---")
+    
+    # Tabs for different sections; only the open tab's section runs
+    tab1, tab2, tab3 = st.tabs(["📋 All Leave Requests", "👥 Employee Overview", "📅 Team Calendar"],
+                               key="dashboard_tab", on_change="rerun")
+    
+    if tab1.open:
+        with tab1:
+            leave_requests()
+    
+    if tab2.open:
+        with tab2:
+            employee_overview()
+    
+    if tab3.open:
+        with tab3:
+            team_calendar()
 
 # Main app logic
 def main():
-    if not st.session_state.logged_in:
-        login_page()
+    # Reloads the cached profile only if the employee's row changed
+    user = st.session_state.user = refresh(st.session_state.user)
+    if user is None:
+        with section("login_page"):
+            login_page()
     else:
         # Sidebar
         with st.sidebar:
-            st.markdown(f"### 👤 {st.session_state.user_name}")
-            st.markdown(f"**ID:** {st.session_state.user_id}")
+            st.markdown(f"### 👤 {user.name}")
+            st.markdown(f"**ID:** {user.emp_id}")
             st.markdown("---")
             
             if st.button("🚪 Logout", use_container_width=True):
-                st.session_state.logged_in = False
-                st.session_state.user_id = None
-                st.session_state.user_name = None
-                st.session_state.is_admin = False
+                st.session_state.user = None
                 st.rerun()
         
         # Show appropriate dashboard
-        if st.session_state.is_admin:
-            admin_dashboard()
+        if user.is_admin:
+            with section("admin_dashboard"):
+                admin_dashboard(user)
+        else:
+            with section("employee_dashboard"):
+                employee_dashboard(user)
+
+# Admin debug panel, drawn after the rerun it reports on has been measured
+def debug_panel(stats):
+    with st.sidebar.expander("🛠️ Debug"):
+        st.toggle("Instrumentation (all sessions)", value=instrumentation_enabled(), key="debug_instrumentation",
+                  on_change=lambda: enable_instrumentation(st.session_state.debug_instrumentation))
+        if stats is None:
+            st.caption("Turn on to time data functions, SQL and page sections from the next rerun.")
         else:
-            employee_dashboard()
+            st.markdown(f"**Rerun:** {stats.seconds * 1000:.1f} ms")
+            st.markdown(f"**SQL:** {stats.sql_statements} statements, {stats.sql_seconds * 1000:.1f} ms")
+            if stats.lock_acquisitions:
+                st.markdown("**Lock waits:** " + ", ".join(
+                    f"{name} {stats.lock_seconds[name] * 1000:.1f} ms ({count}×)"
+                    for name, count in stats.lock_acquisitions.items()))
+            if stats.slowest_sql[1]:
+                st.caption(f"Slowest statement ({stats.slowest_sql[0] * 1000:.2f} ms):")
+                st.code(stats.slowest_sql[1], language="sql")
+            functions = pd.DataFrame(
+                [(name.split('.', 1)[-1], stats.calls[name], stats.function_seconds[name] * 1000,
+                  stats.dataframe_bytes[name] / 1024 if name in stats.dataframe_bytes else None)
+                 for name in stats.calls],
+                columns=['Function', 'Calls', 'ms', 'DataFrame KB'])
+            st.dataframe(functions.sort_values('ms', ascending=False), hide_index=True)
+            sections = pd.DataFrame([(name, seconds * 1000) for name, seconds in stats.sections.items()],
+                                    columns=['Section', 'ms'])
+            st.dataframe(sections, hide_index=True)
+        cache = cache_stats()
+        st.caption(f"Read cache: {cache['size']} entries, {cache['hit_ratio']:.0%} hits")
+        
+        col_a, col_b = st.columns(2)
+        with col_a:
+            if st.button("Prometheus", help="Write process totals in Prometheus text format"):
+                st.success(f"Wrote {write_prometheus()}")
+        with col_b:
+            if st.button("JSON lines", help="Append the recent reruns as JSON lines"):
+                st.success(f"Wrote {write_jsonl()}")
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        rerun_stats = end_rerun()
+    if st.session_state.user is not None and st.session_state.user.is_admin:
+        debug_panel(rerun_stats)
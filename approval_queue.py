@@ -0,0 +1,99 @@
+"""Approval queue grid shared by app.py and leave_management.py.
+
+A window of requests is drawn as one st.data_editor grid with a Select
+tick box and an Action column per row, in place of a widget tree per
+request. The grid is a canvas that paints only the rows scrolled into
+view, and the window bounds how many rows are sent to the browser at
+all; queue_window() moves it through the queue. Decisions made in the
+grid are handed together to the caller's write function, in one batch.
+"""
+import pandas as pd
+import streamlit as st
+
+ACTIONS = {'Approve': 'Approved', 'Reject': 'Rejected'}
+WINDOW_SIZES = (100, 250, 500, 1000)
+GRID_HEIGHT = 420  # px, about a dozen rows in view
+
+def queue_window(total, key):
+    """Rows-per-page and page controls over `total` requests; returns the slice to show"""
+    col_size, col_page, col_info = st.columns([1, 1, 2])
+    with col_size:
+        size = st.selectbox("Rows per page", WINDOW_SIZES, key=f"{key}_size")
+    pages = max(1, -(-total // size))
+    with col_page:
+        # Unkeyed, so it starts over at page 1 whenever the page count changes
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1)
+    start = (page - 1) * size
+    with col_info:
+        st.caption(f"Requests {start + 1:,}-{min(start + size, total):,} of {total:,}")
+    return slice(start, start + size)
+
+def _grid_key(key):
+    return f"{key}_{st.session_state.get(f'{key}_version', 0)}"
+
+def _decide(key, write, refresh, ids, pending, action):
+    """Button callback: write the grid's decisions, then redraw only the `refresh` fragments"""
+    edits = st.session_state[_grid_key(key)]['edited_rows']
+    if action is None:
+        decisions = {int(ids[int(row)]): ACTIONS[cells['Action']] for row, cells in edits.items()
+                     if cells.get('Action') in ACTIONS and pending[int(row)]}
+    else:
+        decisions = dict.fromkeys((int(ids[int(row)]) for row, cells in edits.items()
+                                   if cells.get('Select') and pending[int(row)]), ACTIONS[action])
+    if not decisions:
+        return
+    _, failures = write(decisions)
+    st.session_state[f"{key}_failures"] = failures
+    clear_queue(key)
+    if refresh:
+        st.rerun(list(refresh))
+
+def approval_queue(requests, key, id_column, write, column_config=None, refresh=None):
+    """Draw requests as the queue grid with its buttons.
+
+    A button press passes {request_id: status} to write(), which returns
+    (updated ids, {request_id: reason}) like the apps' batch updates. It
+    runs in the button's callback, before any script code, so the
+    @st.fragment keys in `refresh` can be rerun on their own afterwards
+    (default: whatever the click reruns). Ticks and actions on requests
+    that are not Pending are ignored.
+    """
+    for request_id, message in st.session_state.pop(f"{key}_failures", {}).items():
+        st.error(f"❌ Request {request_id}: {message}")
+    grid = requests.assign(Select=False, Action=pd.Series(None, index=requests.index, dtype=object))
+    edited = st.data_editor(
+        grid,
+        key=_grid_key(key),
+        column_order=('Select', 'Action', *requests.columns),
+        column_config={
+            'Select': st.column_config.CheckboxColumn("Select", width="small"),
+            'Action': st.column_config.SelectboxColumn("Action", options=list(ACTIONS), width="small"),
+            **(column_config or {}),
+        },
+        disabled=list(requests.columns),
+        hide_index=True,
+        height=GRID_HEIGHT,
+        use_container_width=True,
+    )
+    pending = (edited['status'] == 'Pending').to_numpy()
+    decided = edited['Action'].notna().to_numpy() & pending
+    selected = edited['Select'].to_numpy(dtype=bool) & pending
+    ids = edited[id_column].to_numpy()
+
+    col_a, col_b, col_c = st.columns(3)
+    for col, label, count, action in ((col_a, "💾 Submit decisions", decided.sum(), None),
+                                      (col_b, "✅ Approve selected", selected.sum(), 'Approve'),
+                                      (col_c, "❌ Reject selected", selected.sum(), 'Reject')):
+        with col:
+            st.button(f"{label} ({count})", key=f"{key}_{(action or 'submit').lower()}",
+                      disabled=not count, use_container_width=True,
+                      on_click=_decide, args=(key, write, refresh, ids, pending, action))
+
+def has_edits(key):
+    """Whether the grid holds ticks or actions that have not been written yet"""
+    state = st.session_state.get(_grid_key(key))
+    return bool(state and state['edited_rows'])
+
+def clear_queue(key):
+    """Drop the grid's edits once they are written: a new key gives a fresh grid"""
+    st.session_state[f"{key}_version"] = st.session_state.get(f"{key}_version", 0) + 1
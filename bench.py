@@ -0,0 +1,695 @@
+"""Micro-benchmarks for the leave management data layer.
+
+Usage: python bench.py <benchmark> [options]
+
+Every benchmark runs against a throwaway database in a temp directory,
+never against leave_management.db.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, timedelta
+
+# Point db.py at a scratch database before it is imported, and measure the
+# database rather than the read cache unless a benchmark opts back in
+os.environ.setdefault('LEAVE_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='leave_bench_'), 'bench.db'))
+os.environ.setdefault('LEAVE_CACHE_TTL', '0')
+
+import pandas as pd
+
+import credentials
+import db
+import instrumentation
+from leave_export import available_formats, export_leave_history
+from leave_store import LeaveStore
+from user_session import refresh, start_session
+
+# The read queries issued by one employee dashboard rerun
+RERUN_QUERIES = (
+    ("SELECT * FROM employees WHERE emp_id=?", ('EMP001',)),
+    ("SELECT total_leaves, used_leaves FROM employees WHERE emp_id=?", ('EMP001',)),
+    ("SELECT COUNT(*) FROM leave_requests WHERE emp_id=? AND status='Pending'", ('EMP001',)),
+    ("SELECT * FROM leave_requests WHERE emp_id=? ORDER BY applied_date DESC", ('EMP001',)),
+)
+
+def seed_leave_history(rows):
+    """Bulk-insert `rows` synthetic leave requests spread over the sample employees"""
+    db.bootstrap()
+    statuses = ('Pending', 'Approved', 'Rejected')
+    emp_ids = ('EMP001', 'EMP002', 'EMP003', 'EMP004', 'EMP005')
+    with db.transaction() as conn:
+        conn.executemany(
+            '''INSERT INTO leave_requests
+               (emp_id, leave_type, start_date, end_date, days, reason, status, applied_date)
+               VALUES (?, 'Vacation', ?, ?, 1, 'Synthetic', ?, ?)''',
+            ((emp_ids[i % 5], f"20{10 + i % 15}-0{1 + i % 9}-1{i % 10}",
+              f"20{10 + i % 15}-0{1 + i % 9}-1{i % 10}", statuses[i % 3],
+              f"20{10 + i % 15}-0{1 + i % 9}-1{i % 10} {i % 24:02d}:00:00")
+             for i in range(rows)))
+        db.rebuild_counters(conn)
+
+def synthetic_employees(employees):
+    return {1000 + e: {'emp_id': 1000 + e, 'name': f"Employee {e}", 'email': f"emp{e}@acme.com",
+                       'password': '', 'department': f"Dept {e % 20}", 'role': 'Employee',
+                       'total_leaves': 20, 'used_leaves': 0}
+            for e in range(employees)}
+
+def synthetic_requests(employees, rows):
+    """Request dicts with distinct string objects, as JSON replay produces them.
+
+    Reasons are free text, so each one is unique, as typed by employees.
+    """
+    statuses = ('Pending', 'Approved', 'Rejected')
+    occasions = ('Family event', 'Medical appointment', 'Travel', 'Moving house', 'Personal matters')
+    for r in range(rows):
+        day = f"2025-{1 + r % 12:02d}-{1 + r % 28:02d}"
+        yield {'request_id': r + 1, 'emp_id': 1000 + r % employees, 'leave_type': f"{'Casual'} Leave",
+               'start_date': day, 'end_date': f"{day}", 'days': 1, 'reason': f"{occasions[r % 5]} on {day} (request {r + 1})",
+               'status': f"{statuses[r % 3]}", 'applied_date': f"{day} 09:30:00", 'approved_by': None}
+
+def build_store(employees, rows):
+    """In-memory LeaveStore with synthetic employees and requests"""
+    store = LeaveStore()
+    store.seed(synthetic_employees(employees), synthetic_requests(employees, rows))
+    return store
+
+def timed(fn, repeat):
+    """Run fn `repeat` times and return per-call latencies in microseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+def report(label, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<32} mean {statistics.mean(samples):9.1f} us   "
+          f"p50 {samples[len(samples) // 2]:9.1f} us   p99 {p99:9.1f} us")
+
+# Benchmarks
+def bench_connections(args):
+    """Connection overhead per rerun: connect-per-query versus the shared pool"""
+    db.bootstrap()
+
+    def per_query_connect():
+        for sql, params in RERUN_QUERIES:
+            conn = sqlite3.connect(db.DB_PATH)
+            conn.execute(sql, params).fetchall()
+            conn.close()
+
+    def pooled():
+        for sql, params in RERUN_QUERIES:
+            with db.connection() as conn:
+                conn.execute(sql, params).fetchall()
+
+    report("connect per query (before)", timed(per_query_connect, args.repeat))
+    report("pooled connections (after)", timed(pooled, args.repeat))
+
+def bench_bootstrap(args):
+    """Cold start of bootstrap() and per-rerun cost before and after it"""
+    start = time.perf_counter()
+    db.bootstrap()
+    print(f"{'cold bootstrap':<32} {(time.perf_counter() - start) * 1e3:9.2f} ms")
+
+    def init_every_rerun():
+        # What app.py used to run at the top of every rerun
+        _, _, create_tables = db.MIGRATIONS[0]
+        for statement in create_tables:
+            conn = sqlite3.connect(db.DB_PATH)
+            conn.execute(statement)
+            conn.commit()
+            conn.close()
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute("SELECT COUNT(*) FROM employees").fetchone()
+        conn.close()
+
+    report("DDL on every rerun (before)", timed(init_every_rerun, args.repeat))
+    report("bootstrap() steady state (after)", timed(db.bootstrap, args.repeat))
+
+def bench_admin_list(args):
+    """Admin leave list: whole history filtered in pandas versus one SQL page"""
+    seed_leave_history(args.rows)
+
+    def full_history():
+        df = db.get_all_leaves()
+        return df[df['status'] == 'Pending']
+
+    def one_page():
+        return db.get_leaves_page(status='Pending', page_size=25)
+
+    report(f"get_all_leaves, {args.rows} rows", timed(full_history, args.repeat))
+    report("get_leaves_page, 25 rows", timed(one_page, args.repeat))
+
+def bench_dashboard_stats(args):
+    """Admin metric cards: four COUNT(*) queries versus the counters table"""
+    seed_leave_history(args.rows)
+
+    def four_counts():
+        with db.connection() as conn:
+            conn.execute("SELECT COUNT(*) FROM leave_requests WHERE status='Pending'").fetchone()
+            conn.execute("SELECT COUNT(*) FROM employees").fetchone()
+            conn.execute("SELECT COUNT(*) FROM leave_requests WHERE status='Approved'").fetchone()
+            conn.execute("SELECT COUNT(*) FROM leave_requests").fetchone()
+
+    report(f"four COUNT(*), {args.rows} rows", timed(four_counts, args.repeat))
+    report("leave_counters lookup", timed(db.get_dashboard_stats, args.repeat))
+
+def bench_read_cache(args):
+    """Dashboard readers with and without the read cache, plus its counters"""
+    seed_leave_history(args.rows)
+    db.read_cache.ttl = 30.0
+
+    def rerun(readers):
+        for reader in readers:
+            reader('EMP001')
+
+    uncached = (db.get_employee_info.uncached, db._employee_stats.uncached, db.get_employee_leaves.uncached)
+    cached = (db.get_employee_info, db._employee_stats, db.get_employee_leaves)
+    report("employee rerun, uncached", timed(lambda: rerun(uncached), args.repeat))
+    report("employee rerun, cached", timed(lambda: rerun(cached), args.repeat))
+    print(db.cache_stats())
+
+def bench_bulk_status(args):
+    """Approving N pending requests one call at a time versus one batch"""
+    db.bootstrap()
+    with db.transaction() as conn:
+        conn.execute("UPDATE employees SET total_leaves = ?", (args.rows * 2,))
+        conn.executemany(
+            '''INSERT INTO leave_requests (emp_id, leave_type, start_date, end_date, days, reason)
+               VALUES ('EMP001', 'Vacation', '2031-01-01', '2031-01-01', 1, 'Bulk')''',
+            [()] * (args.rows * 2))
+        db.rebuild_counters(conn)
+        ids = [row[0] for row in conn.execute("SELECT id FROM leave_requests WHERE reason='Bulk'")]
+    per_row, batch = ids[:args.rows], ids[args.rows:]
+
+    start = time.perf_counter()
+    for leave_id in per_row:
+        db.update_leave_status(leave_id, 'Approved', 'ADMIN')
+    row_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    db.update_leave_statuses(batch, 'Approved', 'ADMIN')
+    batch_elapsed = time.perf_counter() - start
+
+    print(f"{'per-row update_leave_status':<32} {row_elapsed * 1e3:9.1f} ms   {args.rows / row_elapsed:9.0f} req/s")
+    print(f"{'batch update_leave_statuses':<32} {batch_elapsed * 1e3:9.1f} ms   {args.rows / batch_elapsed:9.0f} req/s")
+
+def bench_store_lookups(args):
+    """LeaveStore lookups: linear scans of the old list of dicts versus the indexes"""
+    store = build_store(args.employees, args.rows)
+    legacy_requests = list(synthetic_requests(args.employees, args.rows))
+    email = f"emp{args.employees - 1}@acme.com"
+    emp_id = 1000 + args.employees - 1
+    request_id = args.rows
+
+    def scan_email():
+        return next(emp for emp in store.employees.values() if emp['email'] == email)
+
+    def scan_emp_requests():
+        return [req for req in legacy_requests if req['emp_id'] == emp_id]
+
+    def scan_request_id():
+        return next(req for req in legacy_requests if req['request_id'] == request_id)
+
+    repeat = max(1, args.repeat // 100)
+    print(f"{args.employees} employees, {args.rows} requests")
+    report("email scan (before)", timed(scan_email, repeat))
+    report("email index (after)", timed(lambda: store.find_employee_by_email(email), args.repeat))
+    report("employee requests scan (before)", timed(scan_emp_requests, repeat))
+    report("employee requests index (after)", timed(lambda: store.requests_frame(emp_id=emp_id), args.repeat))
+    report("request_id scan (before)", timed(scan_request_id, repeat))
+    report("request_id index (after)", timed(lambda: store.update_status(request_id, 'Approved', 1), args.repeat))
+
+def bench_store_memory(args):
+    """Memory per request and DataFrame build time: list of dicts versus columns"""
+    import tracemalloc
+
+    tracemalloc.start()
+    legacy_requests = list(synthetic_requests(args.employees, args.rows))
+    legacy_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Requests only, so employee dicts do not count against either side
+    tracemalloc.start()
+    store = LeaveStore()
+    store.seed({}, synthetic_requests(args.employees, args.rows))
+    store_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"{args.rows} requests")
+    print(f"{'list of dicts':<32} {legacy_bytes / args.rows:9.1f} bytes/request")
+    print(f"{'typed columns':<32} {store.requests.nbytes() / args.rows:9.1f} bytes/request "
+          f"({store_bytes / args.rows:.1f} with indexes)")
+
+    repeat = max(1, args.repeat // 100)
+    report("DataFrame(list of dicts)", timed(lambda: pd.DataFrame(legacy_requests), repeat))
+    report("requests_frame()", timed(store.requests_frame, args.repeat))
+
+def bench_manager_join(args):
+    """Manager approval list: per-row dict join then filter versus filtered merge"""
+    employees = synthetic_employees(args.employees)
+
+    for rows in (10_000, 100_000, 1_000_000):
+        store = LeaveStore()
+        store.seed(employees, synthetic_requests(args.employees, rows))
+        legacy_requests = list(synthetic_requests(args.employees, rows))
+        store.employees_frame()  # built once per employee change, not per rerun
+
+        def row_loop():
+            data = []
+            for req in legacy_requests:
+                emp = employees[req['emp_id']]
+                data.append({'request_id': req['request_id'], 'name': emp['name'],
+                             'department': emp['department'], 'leave_type': req['leave_type'],
+                             'start_date': req['start_date'], 'end_date': req['end_date'],
+                             'days': req['days'], 'reason': req['reason'],
+                             'status': req['status'], 'applied_date': req['applied_date']})
+            df = pd.DataFrame(data)
+            return df[df['status'] == 'Pending']
+
+        repeat = max(1, args.repeat // 1000)
+        print(f"{rows} requests, {args.employees} employees")
+        report("  row loop + filter (before)", timed(row_loop, repeat))
+        report("  merge, Pending pushed down", timed(lambda: store.requests_with_employees('Pending'), args.repeat // 10))
+        report("  merge, all statuses", timed(store.requests_with_employees, args.repeat // 10))
+
+def bench_working_days(args):
+    """Working days for a batch of ranges: day-by-day loop versus cumulative lookup"""
+    from working_days import WorkingDayCalendar
+
+    holidays = [date(year, month, day) for year in range(2020, 2031) for month, day in ((1, 1), (12, 25))]
+    calendar = WorkingDayCalendar(holidays=holidays)
+    holiday_set = set(holidays)
+    starts = [date(2025, 1, 1) + timedelta(days=r % 700) for r in range(args.rows)]
+    ends = [start + timedelta(days=r % 15) for r, start in enumerate(starts)]
+
+    def day_loop():
+        return [sum(1 for d in range((end - start).days + 1)
+                    if (start + timedelta(days=d)).weekday() < 5 and start + timedelta(days=d) not in holiday_set)
+                for start, end in zip(starts, ends)]
+
+    start_array = pd.to_datetime(starts).values.astype('datetime64[D]')
+    end_array = pd.to_datetime(ends).values.astype('datetime64[D]')
+    assert list(calendar.count_many(start_array, end_array)) == day_loop()
+
+    print(f"{args.rows} date ranges")
+    report("day-by-day loop (before)", timed(day_loop, max(1, args.repeat // 1000)))
+    report("count_many (after)", timed(lambda: calendar.count_many(start_array, end_array), args.repeat // 10))
+    report("count, single range", timed(lambda: calendar.count(starts[0], ends[0]), args.repeat))
+
+def bench_team_calendar(args):
+    """Who is out in one department over three weeks: full scans versus interval indexes"""
+    start, end = date(2024, 5, 10), date(2024, 5, 31)
+
+    seed_leave_history(args.rows)
+
+    def sql_scan():
+        df = db.get_all_leaves()
+        out = df[df['status'].isin(['Pending', 'Approved']) & (df['department'] == 'Engineering')]
+        return out[(out['start_date'] <= str(end)) & (out['end_date'] >= str(start))]
+
+    print(f"SQLite, {args.rows} requests")
+    report("  get_all_leaves + filter (before)", timed(sql_scan, max(1, args.repeat // 100)))
+    report("  get_team_absences (after)", timed(lambda: db.get_team_absences(start, end, 'Engineering'), args.repeat))
+
+    store = build_store(args.employees, args.rows)
+    legacy_requests = list(synthetic_requests(args.employees, args.rows))
+    employees = store.all_employees()
+    start, end = date(2025, 5, 10), date(2025, 5, 31)
+
+    def list_scan():
+        return [req for req in legacy_requests
+                if req['status'] in ('Pending', 'Approved') and employees[req['emp_id']]['department'] == 'Dept 7'
+                and req['start_date'] <= str(end) and req['end_date'] >= str(start)]
+
+    print(f"LeaveStore, {args.rows} requests, {args.employees} employees")
+    report("  list of dicts scan (before)", timed(list_scan, max(1, args.repeat // 100)))
+    report("  absences (after)", timed(lambda: store.absences(start, end, 'Dept 7'), args.repeat))
+
+def bench_overlap_check(args):
+    """Apply-time overlap check for an employee with a long history.
+
+    No request overlaps the probed range, so both checks read every active
+    request of the employee that starts before it: the worst case.
+    """
+    start, end = date(2030, 1, 7), date(2030, 1, 8)
+
+    seed_leave_history(args.rows)
+
+    with db.connection() as conn:
+        print(f"SQLite, {args.rows // 5} requests for the employee")
+        report("  find_overlap (active range index)", timed(lambda: db.find_overlap(conn, 'EMP001', start, end),
+                                                             max(1, args.repeat // 10)))
+
+    employees = 5
+    store = build_store(employees, args.rows)
+    legacy_requests = list(synthetic_requests(employees, args.rows))
+
+    def list_scan():
+        return next((req for req in legacy_requests
+                     if req['emp_id'] == 1000 and req['status'] in ('Pending', 'Approved')
+                     and req['start_date'] <= str(end) and req['end_date'] >= str(start)), None)
+
+    print(f"LeaveStore, {args.rows // employees} requests for the employee")
+    report("  list of dicts scan", timed(list_scan, max(1, args.repeat // 100)))
+    report("  find_overlap (sorted ranges)", timed(lambda: store.find_overlap(1000, start, end), args.repeat))
+
+def export_in_child(format_name, path):
+    """Export the whole history to path; returns seconds and peak RSS growth in MB.
+
+    Runs in a fresh process so each format's peak is measured on its own.
+    format_name None is the old path: one DataFrame, then to_csv.
+    """
+    import resource
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if format_name is None:
+        db.get_all_leaves().to_csv(path, index=False)
+    else:
+        with open(path, 'wb') as out:
+            export_leave_history(db.iter_leave_history(), format_name, out)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KB on Linux
+    return elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+
+def bench_export(args):
+    """Full history export: materialized DataFrame versus streamed chunks (try --rows 5000000)"""
+    seed_leave_history(args.rows)
+    out_dir = os.path.dirname(db.DB_PATH)
+
+    print(f"{args.rows} requests")
+    for label, format_name in [("get_all_leaves + to_csv (before)", None)] + \
+                              [(f"streamed {name}", name) for name in available_formats()]:
+        path = os.path.join(out_dir, f"export.{format_name or 'before'}")
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            elapsed, peak_mb = pool.submit(export_in_child, format_name, path).result()
+        print(f"{label:<32} {elapsed:7.1f} s   {args.rows / elapsed:10,.0f} rows/s   "
+              f"peak +{peak_mb:7.1f} MB   file {os.path.getsize(path) / 2**20:7.1f} MB")
+
+def bench_logins(args):
+    """Login storm: --logins concurrent logins, KDF on each script thread versus the bounded pool"""
+    db.bootstrap()
+    stored = credentials.hash_password('password123')
+
+    def rerun():
+        with db.connection() as conn:
+            for sql, params in RERUN_QUERIES:
+                conn.execute(sql, params).fetchall()
+
+    def storm(login):
+        """Login latencies, and dashboard rerun latencies in another session meanwhile"""
+        barrier = threading.Barrier(args.logins + 1)
+        logins, reruns = [], []
+
+        def one(i):
+            barrier.wait()
+            start = time.perf_counter()
+            login(f"EMP{i:06d}")
+            logins.append((time.perf_counter() - start) * 1e6)
+
+        with ThreadPoolExecutor(args.logins) as pool:
+            futures = [pool.submit(one, i) for i in range(args.logins)]
+            barrier.wait()
+            while not all(future.done() for future in futures):
+                reruns.extend(timed(rerun, 1))
+            for future in futures:
+                future.result()
+        return logins, reruns
+
+    print(f"{args.logins} concurrent logins, {credentials.PASSWORD_SCHEME}, "
+          f"{credentials.KDF_WORKERS} KDF worker(s)")
+    for label, login in (("KDF on script threads", lambda account: credentials.verify_password('password123', stored)),
+                         ("bounded KDF pool", lambda account: credentials.check_login(account, 'password123', stored))):
+        logins, reruns = storm(login)
+        print(label)
+        report("  login", logins)
+        report("  dashboard rerun meanwhile", reruns)
+
+def bench_session_rerun(args):
+    """Employee dashboard rerun: per-rerun stats and history reads versus the versioned session"""
+    seed_leave_history(args.rows)
+    emp_id = 'EMP004'
+
+    # A single-connection pool, so every statement passes through one trace hook
+    db._pool = db.ConnectionPool(db.DB_PATH, size=1)
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+
+    def per_rerun_reads():
+        db.get_dashboard_stats(emp_id)
+        db.get_employee_leaves(emp_id)
+
+    with db.connection() as conn:
+        user = conn.execute("SELECT * FROM employees WHERE emp_id=?", (emp_id,)).fetchone()
+    session = start_session(user)
+
+    def session_refresh():
+        refresh(session)
+
+    print(f"{args.rows // 5} requests for the employee")
+    for ttl in (0, 30):
+        db.read_cache.ttl = ttl
+        db.read_cache.clear()
+        print(f"read cache TTL {ttl}s")
+        for label, rerun in (("stats + history reads (before)", per_rerun_reads),
+                             ("session refresh (after)", session_refresh)):
+            rerun()
+            statements.clear()
+            samples = timed(rerun, max(1, args.repeat // 10))
+            queries = sum(not sql.startswith('--') for sql in statements) / len(samples)
+            report(f"  {label}", samples)
+            print(f"  {'':<32} {queries:.2f} queries per rerun")
+
+def bench_instrumentation(args):
+    """Overhead of the instrumentation hooks, off and on, on a cached read and a PK query"""
+    db.bootstrap()
+    plain = sqlite3.connect(db.DB_PATH, check_same_thread=False, isolation_level=None)
+
+    def pk_query(conn):
+        return conn.execute("SELECT row_version FROM employees WHERE emp_id=?", ('EMP001',)).fetchone()
+
+    def cached_read():
+        return db.get_employee_version('EMP001')
+
+    db.read_cache.ttl = 3600
+    with db.connection() as conn:
+        report("plain sqlite3 PK query", timed(lambda: pk_query(plain), args.repeat))
+        for on in (False, True):
+            instrumentation.enable(on)
+            instrumentation.begin_rerun('bench')
+            state = 'on' if on else 'off'
+            report(f"pooled PK query, {state}", timed(lambda: pk_query(conn), args.repeat))
+            report(f"cached data function, {state}", timed(cached_read, args.repeat))
+            instrumentation.end_rerun()
+    instrumentation.enable(False)
+
+def render_queue(rows, layout):
+    """Approval tab script for AppTest: `rows` pending requests as a widget tree per row, or the grid"""
+    import numpy as np
+    import pandas as pd
+    import streamlit as st
+
+    from approval_queue import approval_queue, queue_window
+
+    n = np.arange(rows)
+    requests = pd.DataFrame({
+        'request_id': n + 1,
+        'name': pd.Categorical.from_codes(n % 500, [f"Employee {e}" for e in range(500)]),
+        'department': pd.Categorical.from_codes(n % 8, [f"Dept {d}" for d in range(8)]),
+        'leave_type': 'Annual Leave',
+        'start_date': np.datetime64('2026-01-05') + n % 300,
+        'end_date': np.datetime64('2026-01-06') + n % 300,
+        'days': 2,
+        'reason': 'Family vacation',
+        'status': 'Pending',
+        'applied_date': np.datetime64('2025-12-01T09:30:00') + n,
+    })
+    if layout == 'grid':
+        window = queue_window(len(requests), key="bench_queue")
+        approval_queue(requests.iloc[window], key="bench_queue", id_column='request_id',
+                       write=lambda decisions: (list(decisions), {}))
+        return
+    # The approve tab's previous layout
+    for idx, row in requests.iterrows():
+        with st.container():
+            col1, col2, col3, col4 = st.columns([2, 2, 3, 2])
+            with col1:
+                st.write(f"**{row['name']}**")
+                st.caption(f"{row['department']}")
+            with col2:
+                st.write(f"**{row['leave_type']}**")
+                st.caption(f"{row['days']} days")
+            with col3:
+                st.write(f"{row['start_date']:%Y-%m-%d} to {row['end_date']:%Y-%m-%d}")
+                st.caption(f"Reason: {row['reason']}")
+            with col4:
+                col_a, col_b = st.columns(2)
+                with col_a:
+                    st.button("✅", key=f"approve_{row['request_id']}", use_container_width=True)
+                with col_b:
+                    st.button("❌", key=f"reject_{row['request_id']}", use_container_width=True)
+            st.divider()
+
+def bench_approval_queue(args):
+    """Approval tab payload and script time versus queue length: widget tree per request versus the grid"""
+    from streamlit import config as streamlit_config
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+
+    streamlit_config.set_option('logger.level', 'error')
+    set_log_level('error')
+    print(f"{'requests':>9} {'layout':<6} {'elements':>9} {'payload KB':>11} {'run ms':>9}")
+    for rows in (100, 1_000, 5_000, 20_000):
+        for layout in ('tree', 'grid'):
+            if layout == 'tree' and rows > 5_000:
+                print(f"{rows:>9,} {layout:<6} {'skipped: minutes per run':>31}")
+                continue
+            at = AppTest.from_function(render_queue, args=(rows, layout), default_timeout=600)
+            at.run()  # warm up imports and caches
+            start = time.perf_counter()
+            at.run()
+            elapsed = time.perf_counter() - start
+            nodes = [node for node in at._tree if getattr(node, 'proto', None) is not None]
+            payload = sum(node.proto.ByteSize() for node in nodes)
+            print(f"{rows:>9,} {layout:<6} {len(nodes):>9,} {payload / 1024:>11,.1f} {elapsed * 1000:>9,.0f}")
+
+def bench_fragment_reruns(args):
+    """Work per interaction on app.py: full reruns versus the fragment reruns of an approval or application"""
+    import loadtest
+    from streamlit.testing.v1 import AppTest
+    from working_days import working_days
+
+    loadtest.quiet_streamlit()
+    employees, _ = loadtest.seed_organization(loadtest.APP, args.employees, args.rows, seed=1)
+    # The app's own read cache TTL, so reruns get the cache hits they would in production
+    db.read_cache.ttl = 30
+    instrumentation.enable(True)
+    # An employee with the balance for every application below
+    emp_id = next(emp_id for emp_id in employees if db.get_dashboard_stats(emp_id)['available_leaves'] >= 10)
+    department = db.get_employee_info(emp_id)[4]
+
+    def work(label, interact, prepare=lambda: None, rounds=5):
+        """Mean reruns, script time, SQL statements and data function calls per interaction.
+
+        Taken from the process totals, so a write made in a button callback
+        between reruns is counted too. prepare() runs untimed before each
+        interaction; wall time includes AppTest's own overhead.
+        """
+        samples = []
+        for _ in range(rounds):
+            prepared = prepare()
+            before = instrumentation.process_totals()
+            start = time.perf_counter()
+            interact(prepared)
+            wall = time.perf_counter() - start
+            after = instrumentation.process_totals()
+            samples.append((after['reruns'] - before['reruns'], after['rerun_seconds'] - before['rerun_seconds'],
+                            after['sql_statements'] - before['sql_statements'],
+                            sum(after['calls'].values()) - sum(before['calls'].values()), wall))
+        reruns, script, sql, calls, wall = (statistics.mean(column) for column in zip(*samples))
+        print(f"{label:<40} {reruns:>6.1f} {script * 1000:>10.1f} {sql:>6.1f} {calls:>6.1f} {wall * 1000:>9.1f}")
+
+    print(f"{args.employees:,} employees, {args.rows:,} requests")
+    print(f"{'interaction':<40} {'reruns':>6} {'script ms':>10} {'SQL':>6} {'calls':>6} {'wall ms':>9}")
+
+    admin = AppTest.from_file('app.py', default_timeout=600).run()
+    loadtest.log_in(admin, 'ADMIN', loadtest.ADMIN_PASSWORD)
+    loadtest.widget(admin.selectbox, "Filter by Status").set_value("Pending").run()
+
+    def decide():
+        # Editing the grid is a fragment rerun of its own in the browser; not timed
+        grid = loadtest.approval_grid(admin)
+        edits = {row: {'Action': 'Approve'} for row in range(min(3, len(grid.value)))}
+        loadtest.run_with_grid_edits(admin, grid, edits)
+        return edits
+
+    def submit(edits):
+        admin.button(key='admin_queue_submit').click()
+        loadtest.run_with_grid_edits(admin, loadtest.approval_grid(admin), edits)
+
+    work("full rerun, requests tab", lambda _: admin.run())
+    work("approve click: stats + queue fragments", submit, decide)
+    for tab in ("Employee Overview", "Team Calendar"):
+        loadtest.open_tab(admin, tab)
+        work(f"full rerun, {tab.lower()} tab", lambda _: admin.run())
+
+    employee = AppTest.from_file('app.py', default_timeout=600).run()
+    loadtest.log_in(employee, emp_id, loadtest.PASSWORD)
+    # One working day at a time, past the generated history
+    days = iter(day for day in (date.today() + timedelta(days=n) for n in range(400, 800))
+                if working_days(day, day, department))
+
+    def apply(day):
+        employee.date_input(key='apply_start').set_value(day)
+        employee.date_input(key='apply_end').set_value(day)
+        employee.text_area(key='apply_reason').input("Benchmark")
+        employee.button[0].click().run()
+
+    work("full rerun, apply tab", lambda _: employee.run())
+    work("apply click: stats + form fragments", apply, lambda: next(days))
+
+def bench_change_feed(args):
+    """Live-update polling: MAX(seq) on the change log versus the reads a dashboard refresh makes"""
+    seed_leave_history(args.rows)
+    emp_ids = ('EMP001', 'EMP002', 'EMP003', 'EMP004', 'EMP005')
+    # One change per request, as if each had been applied through the app
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO leave_changes (leave_id, emp_id, status) "
+                     "SELECT id, emp_id, status FROM leave_requests")
+        for sql, params in (("SELECT COALESCE(MAX(seq), 0) FROM leave_changes", ()),
+                            ("SELECT COALESCE(MAX(seq), 0) FROM leave_changes WHERE emp_id=?", ('EMP001',))):
+            print(f"{sql}\n    {'; '.join(db.explain_query_plan(conn, sql, params))}")
+
+    report(f"poll, any change ({args.rows} rows)", timed(db.latest_change, args.repeat))
+    report("poll, one employee", timed(lambda: db.latest_change(emp_ids[0]), args.repeat))
+    report("admin refresh reads", timed(lambda: (db.get_dashboard_stats(), db.get_leaves_page(status='Pending')),
+                                        max(1, args.repeat // 10)))
+    report("employee refresh reads", timed(lambda: db.get_employee_snapshot(emp_ids[0]),
+                                           max(1, args.repeat // 10)))
+
+BENCHMARKS = {
+    'admin_list': bench_admin_list,
+    'approval_queue': bench_approval_queue,
+    'bootstrap': bench_bootstrap,
+    'bulk_status': bench_bulk_status,
+    'change_feed': bench_change_feed,
+    'connections': bench_connections,
+    'dashboard_stats': bench_dashboard_stats,
+    'export': bench_export,
+    'fragment_reruns': bench_fragment_reruns,
+    'instrumentation': bench_instrumentation,
+    'logins': bench_logins,
+    'manager_join': bench_manager_join,
+    'overlap_check': bench_overlap_check,
+    'read_cache': bench_read_cache,
+    'session_rerun': bench_session_rerun,
+    'store_lookups': bench_store_lookups,
+    'store_memory': bench_store_memory,
+    'team_calendar': bench_team_calendar,
+    'working_days': bench_working_days,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--employees', type=int, default=100_000)
+    parser.add_argument('--rows', type=int, default=200_000,
+                        help="synthetic leave requests for benchmarks that need history")
+    args = parser.parse_args(argv)
+    return BENCHMARKS[args.benchmark](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
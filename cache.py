@@ -0,0 +1,110 @@
+import copy
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+class QueryCache:
+    """Bounded LRU cache with a TTL, invalidated by tags on writes.
+
+    Each entry carries tags such as "employee:EMP001"; invalidate() drops
+    every entry holding one of the given tags. Loads that race with an
+    invalidation of their tags are returned but not stored.
+    """
+
+    def __init__(self, max_size=1024, ttl=30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, tags, value)
+        self._keys_by_tag = defaultdict(set)
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key, tags, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.copy(entry[2])
+            if entry:
+                self._drop(key)
+            self.misses += 1
+            generations = [self._generations[tag] for tag in tags]
+
+        value = loader()
+
+        with self._lock:
+            if generations == [self._generations[tag] for tag in tags]:
+                self._entries[key] = (now + self.ttl, tags, value)
+                for tag in tags:
+                    self._keys_by_tag[tag].add(key)
+                while len(self._entries) > self.max_size:
+                    self._drop(next(iter(self._entries)))
+                    self.evictions += 1
+        return copy.copy(value)
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of the given tags"""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] += 1
+                for key in self._keys_by_tag.pop(tag, ()):
+                    if key in self._entries:
+                        self._drop(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            for tag in self._generations:
+                self._generations[tag] += 1
+
+    def _drop(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def cached(self, *tags):
+        """Cache a reader by its arguments.
+
+        Tags are format strings over the reader's parameters, e.g.
+        "employee:{emp_id}".
+        """
+        def decorator(fn):
+            signature = inspect.signature(fn)
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = (fn.__qualname__, tuple(bound.arguments.items()))
+                entry_tags = tuple(tag.format(**bound.arguments) for tag in tags)
+                return self.get_or_load(key, entry_tags, lambda: fn(*args, **kwargs))
+
+            wrapper.uncached = fn
+            return wrapper
+        return decorator
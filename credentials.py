@@ -0,0 +1,182 @@
+"""Salted password hashing, verified off the Streamlit script threads.
+
+Hashes are stored as self-describing strings with base64 salt and key:
+
+    scrypt$<log2 N>$<r>$<p>$<salt>$<key>
+    pbkdf2_sha256$<iterations>$<salt>$<key>
+
+so the work factor can be raised later without invalidating old hashes.
+Unsalted hex digests from before (MD5 in app.py, SHA-256 in
+leave_management.py) still verify; check_login() replaces them, and
+hashes with outdated parameters, on the next successful login.
+
+Key derivation runs in a bounded thread pool: hashlib releases the GIL
+while deriving, so KDF_WORKERS logins are hashed in parallel and the
+rest wait in a bounded queue, instead of every script thread running
+scrypt (and holding its 16 MB) at once during a login storm. Accounts
+with too many recent failures are turned away before reaching the pool.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# scrypt needs OpenSSL 1.1+; PBKDF2 is always available
+PASSWORD_SCHEME = os.environ.get('LEAVE_PASSWORD_SCHEME', 'scrypt' if hasattr(hashlib, 'scrypt') else 'pbkdf2_sha256')
+SCRYPT_LOG2_N = int(os.environ.get('LEAVE_SCRYPT_LOG2_N', '14'))
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = int(os.environ.get('LEAVE_PBKDF2_ITERATIONS', '600000'))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+KDF_WORKERS = int(os.environ.get('LEAVE_KDF_WORKERS', str(os.cpu_count() or 1)))
+# Logins allowed to wait for a worker; more than this are refused at once
+KDF_QUEUE = int(os.environ.get('LEAVE_KDF_QUEUE', '256'))
+
+# Per-account limit on failed logins within a sliding window
+LOGIN_MAX_FAILURES = int(os.environ.get('LEAVE_LOGIN_MAX_FAILURES', '5'))
+LOGIN_WINDOW = float(os.environ.get('LEAVE_LOGIN_WINDOW', '300'))  # seconds
+
+class LoginThrottled(Exception):
+    """The login was refused without checking the password; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many login attempts, try again in {int(retry_after) + 1} seconds")
+        self.retry_after = retry_after
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+def _derive(password, salt, scheme, params):
+    if scheme == 'scrypt':
+        log2_n, r, p = params
+        n = 1 << log2_n
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=2 * 128 * r * n * p, dklen=KEY_BYTES)
+    if scheme == 'pbkdf2_sha256':
+        iterations, = params
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations, dklen=KEY_BYTES)
+    raise ValueError(f"Unknown password scheme: {scheme}")
+
+def _current_params(scheme):
+    return (SCRYPT_LOG2_N, SCRYPT_R, SCRYPT_P) if scheme == 'scrypt' else (PBKDF2_ITERATIONS,)
+
+def hash_password(password):
+    """New salted hash of password under the current scheme and parameters"""
+    salt = os.urandom(SALT_BYTES)
+    params = _current_params(PASSWORD_SCHEME)
+    key = _derive(password, salt, PASSWORD_SCHEME, params)
+    return '$'.join([PASSWORD_SCHEME, *map(str, params), _b64(salt), _b64(key)])
+
+def verify_password(password, stored):
+    """True if password matches the stored hash, salted or legacy hex digest"""
+    if '$' not in stored:
+        legacy = {32: hashlib.md5, 64: hashlib.sha256}.get(len(stored))
+        return legacy is not None and hmac.compare_digest(legacy(password.encode()).hexdigest(), stored)
+    scheme, *params, salt, key = stored.split('$')
+    key = base64.b64decode(key)
+    derived = _derive(password, base64.b64decode(salt), scheme, tuple(map(int, params)))
+    return hmac.compare_digest(derived, key)
+
+def needs_rehash(stored):
+    """True for legacy digests and for hashes made with other than the current parameters"""
+    if '$' not in stored:
+        return True
+    scheme, *params = stored.split('$')[:-2]
+    return scheme != PASSWORD_SCHEME or tuple(map(int, params)) != _current_params(scheme)
+
+
+class LoginRateLimiter:
+    """Failed login timestamps per account over a sliding window"""
+
+    def __init__(self, max_failures=LOGIN_MAX_FAILURES, window=LOGIN_WINDOW):
+        self.max_failures = max_failures
+        self.window = window
+        self._lock = threading.Lock()
+        self._failures = defaultdict(deque)
+
+    def retry_after(self, account):
+        """Seconds until account may try again, 0 if it may try now"""
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(account)
+            if not failures:
+                return 0
+            while failures and failures[0] <= now - self.window:
+                failures.popleft()
+            if len(failures) < self.max_failures:
+                return 0
+            return failures[0] + self.window - now
+
+    def record_failure(self, account):
+        now = time.monotonic()
+        with self._lock:
+            self._failures[account].append(now)
+            if len(self._failures) > 10_000:
+                # Forget accounts whose failures have all aged out
+                for stale in [key for key, times in self._failures.items() if times[-1] <= now - self.window]:
+                    del self._failures[stale]
+
+    def reset(self, account):
+        with self._lock:
+            self._failures.pop(account, None)
+
+
+login_limiter = LoginRateLimiter()
+
+_pool = None
+_pool_slots = threading.BoundedSemaphore(KDF_WORKERS + KDF_QUEUE)
+_pool_lock = threading.Lock()
+_dummy_hash = None
+
+def get_kdf_pool():
+    """Process-wide KDF worker pool, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(KDF_WORKERS, thread_name_prefix='kdf')
+    return _pool
+
+def _check(password, stored):
+    global _dummy_hash
+    if stored is None:
+        # Unknown account: spend the same time as a real check so the
+        # response does not reveal which accounts exist
+        if _dummy_hash is None:
+            _dummy_hash = hash_password(os.urandom(16).hex())
+        verify_password(password, _dummy_hash)
+        return False, None
+    if not verify_password(password, stored):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored) else None
+
+def check_login(account, password, stored):
+    """Check a login attempt in the KDF pool, blocking the caller until it is done.
+
+    stored is the account's password hash, or None if there is no such
+    account. Returns (ok, new_hash); new_hash is a replacement for a
+    legacy or outdated stored hash that the caller should save, else None.
+    Raises LoginThrottled if the account is rate limited or the pool's
+    queue is full.
+    """
+    retry_after = login_limiter.retry_after(account)
+    if retry_after:
+        raise LoginThrottled(retry_after)
+    if not _pool_slots.acquire(blocking=False):
+        raise LoginThrottled(1)
+    try:
+        ok, new_hash = get_kdf_pool().submit(_check, password, stored).result()
+    finally:
+        _pool_slots.release()
+    if ok:
+        login_limiter.reset(account)
+    else:
+        login_limiter.record_failure(account)
+    return ok, new_hash
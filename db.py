@@ -0,0 +1,923 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import pandas as pd
+
+from cache import QueryCache
+from credentials import check_login, hash_password
+from instrumentation import InstrumentedConnection, lock_wait, timed
+from team_calendar import ABSENT_STATUSES, coverage_warning, to_day
+from working_days import get_calendars, working_days
+
+DB_PATH = os.environ.get('LEAVE_DB_PATH', 'leave_management.db')
+POOL_SIZE = int(os.environ.get('LEAVE_DB_POOL_SIZE', '8'))
+# Sessions only compare the newest change seq with the one they were
+# drawn at, so the change log keeps just its most recent rows
+CHANGE_LOG_ROWS = int(os.environ.get('LEAVE_CHANGE_LOG_ROWS', '10000'))
+
+# Read cache in front of the dashboard queries. Entries are tagged
+# "employee:<emp_id>" (one employee's rows) or "org" (org-wide views)
+# and dropped by the writes that touch them; the TTL bounds staleness
+# from writers outside this process.
+read_cache = QueryCache(max_size=int(os.environ.get('LEAVE_CACHE_SIZE', '1024')),
+                        ttl=float(os.environ.get('LEAVE_CACHE_TTL', '30')))
+
+# Applied to every pooled connection once, when it is opened
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Connection pool
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by all Streamlit script threads"""
+
+    def __init__(self, path, size=POOL_SIZE, timeout=10.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # isolation_level=None leaves transaction control to transaction();
+        # cached_statements keeps the hot queries prepared across reruns;
+        # InstrumentedConnection times statements while instrumentation is on
+        conn = sqlite3.connect(self.path, check_same_thread=False, factory=InstrumentedConnection,
+                               isolation_level=None, cached_statements=256)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening a new one while under the size limit"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            with lock_wait('db_pool'):
+                return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available after {self.timeout}s")
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any unfinished transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Process-wide connection pool, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+def connection():
+    return get_pool().connection()
+
+# Retry policy for taking the write lock when busy_timeout alone is not enough
+BUSY_RETRIES = 6
+BUSY_BACKOFF = 0.05  # seconds, doubled per attempt with jitter
+
+def begin_immediate(conn):
+    """Take the database write lock up front, backing off while it is busy"""
+    delay = BUSY_BACKOFF
+    with lock_wait('db_write'):
+        for attempt in range(BUSY_RETRIES):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                busy = getattr(e, 'sqlite_errorcode', None) in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+                if not busy or attempt == BUSY_RETRIES - 1:
+                    raise
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay *= 2
+
+@contextmanager
+def transaction():
+    """Pooled connection wrapped in a single write transaction.
+
+    The write lock is taken at BEGIN, so reads inside the block see the
+    state that the writes are applied to.
+    """
+    with connection() as conn:
+        begin_immediate(conn)
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+# leave_counters holds one row per employee plus GLOBAL_SCOPE for the whole
+# org, so dashboard metrics never have to count leave_requests
+GLOBAL_SCOPE = '*'
+STATUS_COUNTERS = {'Pending': 'pending', 'Approved': 'approved', 'Rejected': 'rejected'}
+
+def day_number(column):
+    """SQL for a date column as days since 1970-01-01, matching team_calendar.to_day"""
+    return f"CAST(julianday({column}) - 2440587.5 AS INTEGER)"
+
+# Index every active request; bulk loads append "AND id > ?" to fill in
+# only the rows they added
+FILL_LEAVE_INTERVALS_SQL = f'''INSERT INTO leave_intervals (id, start_day, end_day)
+            SELECT id, {day_number('start_date')}, {day_number('end_date')}
+            FROM leave_requests WHERE status IN ('Pending', 'Approved')'''
+
+# One aggregate pass over leave_requests, used to (re)build the counters.
+# pending_days is the balance reserved by requests awaiting approval.
+REBUILD_COUNTERS_SQL = f'''
+    INSERT INTO leave_counters (scope, pending, approved, rejected, total, pending_days)
+    SELECT emp_id,
+           SUM(status = 'Pending'), SUM(status = 'Approved'), SUM(status = 'Rejected'), COUNT(*),
+           SUM(CASE WHEN status = 'Pending' THEN days ELSE 0 END)
+    FROM leave_requests GROUP BY emp_id
+    UNION ALL
+    SELECT '{GLOBAL_SCOPE}',
+           COALESCE(SUM(status = 'Pending'), 0), COALESCE(SUM(status = 'Approved'), 0),
+           COALESCE(SUM(status = 'Rejected'), 0), COUNT(*),
+           COALESCE(SUM(CASE WHEN status = 'Pending' THEN days ELSE 0 END), 0)
+    FROM leave_requests'''
+
+# Schema migrations, applied in order and recorded in schema_migrations.
+# Never edit a shipped migration; append a new version instead.
+MIGRATIONS = [
+    (1, "create employees and leave_requests", [
+        '''CREATE TABLE IF NOT EXISTS employees
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            emp_id TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            department TEXT NOT NULL,
+            position TEXT NOT NULL,
+            password TEXT NOT NULL,
+            total_leaves INTEGER DEFAULT 20,
+            used_leaves INTEGER DEFAULT 0)''',
+        '''CREATE TABLE IF NOT EXISTS leave_requests
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            emp_id TEXT NOT NULL,
+            leave_type TEXT NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            days INTEGER NOT NULL,
+            reason TEXT,
+            status TEXT DEFAULT 'Pending',
+            applied_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            approved_by TEXT,
+            approved_date TIMESTAMP,
+            FOREIGN KEY (emp_id) REFERENCES employees(emp_id))''',
+    ]),
+    (2, "index leave_requests hot access paths", [
+        # Employee history, newest first
+        "CREATE INDEX IF NOT EXISTS idx_leave_requests_emp_applied ON leave_requests (emp_id, applied_date)",
+        # Per-employee status counts (covering)
+        "CREATE INDEX IF NOT EXISTS idx_leave_requests_emp_status ON leave_requests (emp_id, status)",
+        # Status counts and status-filtered lists, newest first
+        "CREATE INDEX IF NOT EXISTS idx_leave_requests_status_applied ON leave_requests (status, applied_date)",
+        # Unfiltered admin list, newest first
+        "CREATE INDEX IF NOT EXISTS idx_leave_requests_applied ON leave_requests (applied_date)",
+        "ANALYZE",
+    ]),
+    (3, "materialized leave counters", [
+        '''CREATE TABLE IF NOT EXISTS leave_counters
+           (scope TEXT PRIMARY KEY,
+            pending INTEGER NOT NULL DEFAULT 0,
+            approved INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID''',
+        "DELETE FROM leave_counters",
+        '''INSERT INTO leave_counters (scope, pending, approved, rejected, total)
+           SELECT emp_id,
+                  SUM(status = 'Pending'), SUM(status = 'Approved'), SUM(status = 'Rejected'), COUNT(*)
+           FROM leave_requests GROUP BY emp_id
+           UNION ALL
+           SELECT '*',
+                  COALESCE(SUM(status = 'Pending'), 0), COALESCE(SUM(status = 'Approved'), 0),
+                  COALESCE(SUM(status = 'Rejected'), 0), COUNT(*)
+           FROM leave_requests''',
+    ]),
+    (4, "reserve pending days against leave balance", [
+        "ALTER TABLE leave_counters ADD COLUMN pending_days INTEGER NOT NULL DEFAULT 0",
+        "DELETE FROM leave_counters",
+        REBUILD_COUNTERS_SQL,
+    ]),
+    (5, "interval index over pending and approved leave", [
+        # 1-D R*Tree of day numbers; triggers keep it in step with
+        # leave_requests, including writes from other processes
+        "CREATE VIRTUAL TABLE IF NOT EXISTS leave_intervals USING rtree_i32(id, start_day, end_day)",
+        "DELETE FROM leave_intervals",
+        FILL_LEAVE_INTERVALS_SQL,
+        f'''CREATE TRIGGER IF NOT EXISTS leave_intervals_insert
+            AFTER INSERT ON leave_requests WHEN NEW.status IN ('Pending', 'Approved')
+            BEGIN
+                INSERT INTO leave_intervals (id, start_day, end_day)
+                VALUES (NEW.id, {day_number('NEW.start_date')}, {day_number('NEW.end_date')});
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS leave_intervals_update
+            AFTER UPDATE OF status, start_date, end_date ON leave_requests
+            WHEN (OLD.status IN ('Pending', 'Approved')) != (NEW.status IN ('Pending', 'Approved'))
+                 OR OLD.start_date IS NOT NEW.start_date OR OLD.end_date IS NOT NEW.end_date
+            BEGIN
+                DELETE FROM leave_intervals WHERE id = OLD.id;
+                INSERT INTO leave_intervals (id, start_day, end_day)
+                SELECT NEW.id, {day_number('NEW.start_date')}, {day_number('NEW.end_date')}
+                WHERE NEW.status IN ('Pending', 'Approved');
+            END''',
+        '''CREATE TRIGGER IF NOT EXISTS leave_intervals_delete
+           AFTER DELETE ON leave_requests
+           BEGIN
+               DELETE FROM leave_intervals WHERE id = OLD.id;
+           END''',
+    ]),
+    (6, "index active leave ranges per employee", [
+        # Overlap check at apply time; the WHERE must match find_overlap's
+        # status predicate exactly for the planner to use this index
+        '''CREATE INDEX IF NOT EXISTS idx_leave_requests_emp_active_range
+           ON leave_requests (emp_id, start_date, end_date)
+           WHERE status IN ('Pending', 'Approved')''',
+    ]),
+    (7, "version employee rows for session caching", [
+        # Bumped on any change to the employee's row or leave counters, and
+        # so on every new request or status change; sessions reload their
+        # cached profile, balance and history only when it moves
+        "ALTER TABLE employees ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0",
+        '''CREATE TRIGGER IF NOT EXISTS employees_row_version
+           AFTER UPDATE OF name, email, department, position, password, total_leaves, used_leaves ON employees
+           BEGIN
+               UPDATE employees SET row_version = row_version + 1 WHERE id = NEW.id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS leave_counters_row_version_insert
+           AFTER INSERT ON leave_counters
+           BEGIN
+               UPDATE employees SET row_version = row_version + 1 WHERE emp_id = NEW.scope;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS leave_counters_row_version_update
+           AFTER UPDATE ON leave_counters
+           BEGIN
+               UPDATE employees SET row_version = row_version + 1 WHERE emp_id = NEW.scope;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS leave_counters_row_version_delete
+           AFTER DELETE ON leave_counters
+           BEGIN
+               UPDATE employees SET row_version = row_version + 1 WHERE emp_id = OLD.scope;
+           END''',
+    ]),
+    (8, "change log for live updates", [
+        # One row per new request or status change, written in the same
+        # transaction; sessions poll MAX(seq) to notice writes. AUTOINCREMENT
+        # keeps seq increasing even after old rows are deleted.
+        '''CREATE TABLE IF NOT EXISTS leave_changes
+           (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            leave_id INTEGER NOT NULL,
+            emp_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        # An employee's latest change is one probe at the end of their range
+        "CREATE INDEX IF NOT EXISTS idx_leave_changes_emp_seq ON leave_changes (emp_id, seq)",
+    ]),
+]
+
+def schema_version(conn):
+    """Highest applied migration version, 0 for a fresh database"""
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_migrations
+                    (version INTEGER PRIMARY KEY,
+                     description TEXT NOT NULL,
+                     applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations, each in its own write transaction"""
+    for version, description, statements in MIGRATIONS:
+        if version <= schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            if conn.execute("SELECT 1 FROM schema_migrations WHERE version=?", (version,)).fetchone():
+                conn.execute("ROLLBACK")
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                         (version, description))
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+def defer_leave_indexes(conn, keep=()):
+    """Drop the secondary indexes and triggers on leave_requests ahead of a bulk load.
+
+    Indexes named in `keep` stay. Returns the definitions of the rest for
+    restore_leave_indexes(). Until then the leave_intervals index and the
+    counters are not maintained; fill them with FILL_LEAVE_INTERVALS_SQL
+    and rebuild_counters() afterwards.
+    """
+    deferred = [row for row in conn.execute(
+        """SELECT type, name, sql FROM sqlite_master
+           WHERE tbl_name = 'leave_requests' AND type IN ('index', 'trigger') AND sql IS NOT NULL""")
+                if row[1] not in keep]
+    for kind, name, _ in deferred:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    return deferred
+
+def restore_leave_indexes(conn, deferred):
+    """Recreate what defer_leave_indexes() dropped"""
+    for _, _, sql in deferred:
+        conn.execute(sql)
+
+def explain_query_plan(conn, sql, params=()):
+    """Detail lines of EXPLAIN QUERY PLAN for a statement"""
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+def bootstrap():
+    """Migrate the schema and seed sample data, once per process"""
+    global _bootstrapped
+    if _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return
+        with connection() as conn:
+            migrate(conn)
+        insert_sample_data()
+        _bootstrapped = True
+
+# Insert sample data
+def insert_sample_data():
+    with transaction() as conn:
+        c = conn.cursor()
+
+        # Check if data already exists
+        c.execute("SELECT COUNT(*) FROM employees")
+        if c.fetchone()[0] == 0:
+            # Sample employees
+            employees = [
+                ('EMP001', 'John Doe', 'john.doe@acme.com', 'Engineering', 'Senior Developer', hash_password('password123'), 20, 5),
+                ('EMP002', 'Jane Smith', 'jane.smith@acme.com', 'Marketing', 'Marketing Manager', hash_password('password123'), 20, 3),
+                ('EMP003', 'Mike Johnson', 'mike.johnson@acme.com', 'HR', 'HR Specialist', hash_password('password123'), 20, 8),
+                ('EMP004', 'Sarah Williams', 'sarah.williams@acme.com', 'Engineering', 'Junior Developer', hash_password('password123'), 20, 2),
+                ('EMP005', 'Robert Brown', 'robert.brown@acme.com', 'Sales', 'Sales Executive', hash_password('password123'), 20, 10),
+                ('ADMIN', 'Admin User', 'admin@acme.com', 'Management', 'Administrator', hash_password('admin123'), 20, 0),
+            ]
+
+            c.executemany('''INSERT INTO employees
+                            (emp_id, name, email, department, position, password, total_leaves, used_leaves)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', employees)
+
+            # Sample leave requests
+            leave_requests = [
+                ('EMP001', 'Sick Leave', '2025-11-15', '2025-11-17', 3, 'Medical appointment', 'Approved', 'ADMIN'),
+                ('EMP001', 'Vacation', '2025-12-20', '2025-12-22', 2, 'Family vacation', 'Pending', None),
+                ('EMP002', 'Personal Leave', '2025-11-20', '2025-11-22', 3, 'Personal matters', 'Approved', 'ADMIN'),
+                ('EMP003', 'Sick Leave', '2025-11-10', '2025-11-17', 8, 'Flu recovery', 'Approved', 'ADMIN'),
+                ('EMP004', 'Vacation', '2025-12-15', '2025-12-16', 2, 'Short trip', 'Pending', None),
+                ('EMP005', 'Sick Leave', '2025-11-01', '2025-11-05', 5, 'Surgery recovery', 'Approved', 'ADMIN'),
+                ('EMP005', 'Vacation', '2025-12-10', '2025-12-14', 5, 'Year-end vacation', 'Rejected', 'ADMIN'),
+            ]
+
+            c.executemany('''INSERT INTO leave_requests
+                            (emp_id, leave_type, start_date, end_date, days, reason, status, approved_by)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', leave_requests)
+
+            rebuild_counters(conn)
+
+def rebuild_counters(conn):
+    """Recompute leave_counters from scratch, after bulk loads"""
+    conn.execute("DELETE FROM leave_counters")
+    conn.execute(REBUILD_COUNTERS_SQL)
+
+COUNTER_COLUMNS = ('pending', 'approved', 'rejected', 'total', 'pending_days')
+
+def counter_deltas(old_status=None, new_status=None, days=0):
+    """Counter column changes for one request moving from old_status to new_status.
+
+    old_status=None records a new request. Days of Pending requests are
+    tracked in pending_days, which reserves them against the balance.
+    """
+    delta = Counter()
+    if old_status in STATUS_COUNTERS:
+        delta[STATUS_COUNTERS[old_status]] -= 1
+    if new_status in STATUS_COUNTERS:
+        delta[STATUS_COUNTERS[new_status]] += 1
+    if old_status is None:
+        delta['total'] += 1
+    if old_status == 'Pending':
+        delta['pending_days'] -= days
+    if new_status == 'Pending':
+        delta['pending_days'] += days
+    return delta
+
+def add_to_counters(conn, deltas_by_emp):
+    """Apply per-employee counter deltas, and their sum to the global row"""
+    totals = defaultdict(Counter)
+    for emp_id, delta in deltas_by_emp.items():
+        totals[emp_id].update(delta)
+        totals[GLOBAL_SCOPE].update(delta)
+    rows = [(*(delta[column] for column in COUNTER_COLUMNS), scope)
+            for scope, delta in totals.items() if any(delta.values())]
+    if not rows:
+        return
+
+    conn.executemany("INSERT INTO leave_counters (scope) VALUES (?) ON CONFLICT (scope) DO NOTHING",
+                     [(row[-1],) for row in rows])
+    conn.executemany(
+        f"UPDATE leave_counters SET {', '.join(f'{column} = {column} + ?' for column in COUNTER_COLUMNS)} "
+        "WHERE scope=?", rows)
+
+def adjust_counters(conn, emp_id, old_status=None, new_status=None, days=0):
+    """Move one request between status counters, for its employee and globally"""
+    add_to_counters(conn, {emp_id: counter_deltas(old_status, new_status, days)})
+
+def record_changes(conn, changes):
+    """Append (leave_id, emp_id, status) rows to the change log, in the caller's transaction.
+
+    Rows older than the last CHANGE_LOG_ROWS are dropped by seq, a rowid
+    range. An employee whose rows are all gone reads as 0 until their next
+    change, which only ever holds back a refresh, never causes one.
+    """
+    conn.executemany("INSERT INTO leave_changes (leave_id, emp_id, status) VALUES (?, ?, ?)", changes)
+    conn.execute("DELETE FROM leave_changes WHERE seq <= (SELECT MAX(seq) FROM leave_changes) - ?",
+                 (CHANGE_LOG_ROWS,))
+
+def available_balance(conn, emp_id):
+    """Days an employee can still request: total - used - reserved by pending requests"""
+    return conn.execute(
+        """SELECT e.total_leaves - e.used_leaves - COALESCE(c.pending_days, 0)
+           FROM employees e
+           LEFT JOIN leave_counters c ON c.scope = e.emp_id
+           WHERE e.emp_id=?""", (emp_id,)).fetchone()[0]
+
+def find_overlap(conn, emp_id, start_date, end_date):
+    """The employee's Pending or Approved request sharing a day with the range, or None.
+
+    A range predicate over the employee's active requests, so it holds
+    even when imported history overlaps itself. Start and end dates both
+    come from the partial index, so only a match reads its table row.
+    """
+    return conn.execute(
+        """SELECT id, start_date, end_date, status FROM leave_requests
+           WHERE emp_id = ? AND status IN ('Pending', 'Approved')
+             AND start_date <= ? AND end_date >= ?
+           ORDER BY start_date DESC LIMIT 1""", (emp_id, str(end_date), str(start_date))).fetchone()
+
+def overlap_message(clash):
+    _, start_date, end_date, status = clash
+    return f"These dates overlap your {status.lower()} leave from {start_date} to {end_date}"
+
+# Authentication functions
+@timed
+def authenticate_user(emp_id, password):
+    """Employee row if the password matches, else None.
+
+    Legacy MD5 hashes are replaced with salted ones on a successful login.
+    Raises credentials.LoginThrottled when the account is rate limited.
+    """
+    with connection() as conn:
+        user = conn.execute("SELECT * FROM employees WHERE emp_id=?", (emp_id,)).fetchone()
+    ok, new_hash = check_login(emp_id, password, user[6] if user else None)
+    if not ok:
+        return None
+    if new_hash:
+        # Only if no concurrent login upgraded it first
+        with transaction() as conn:
+            conn.execute("UPDATE employees SET password=? WHERE emp_id=? AND password=?",
+                         (new_hash, emp_id, user[6]))
+        read_cache.invalidate(f"employee:{emp_id}")
+    return user
+
+@timed
+@read_cache.cached("employee:{emp_id}")
+def get_employee_info(emp_id):
+    with connection() as conn:
+        return conn.execute("SELECT * FROM employees WHERE emp_id=?", (emp_id,)).fetchone()
+
+@timed
+@read_cache.cached("employee:{emp_id}")
+def get_employee_version(emp_id):
+    """The employee's row_version, or None if there is no such employee"""
+    with connection() as conn:
+        row = conn.execute("SELECT row_version FROM employees WHERE emp_id=?", (emp_id,)).fetchone()
+    return row[0] if row else None
+
+@timed
+def get_employee_snapshot(emp_id):
+    """row_version, profile, balance stats and leave history of one employee.
+
+    Read in one transaction, so the version stamps exactly the data
+    returned. None if there is no such employee.
+    """
+    with connection() as conn:
+        conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT row_version, name, department FROM employees WHERE emp_id=?", (emp_id,)).fetchone()
+            if row is None:
+                return None
+            version, name, department = row
+            stats = employee_stats(conn, emp_id)
+            leaves = employee_leaves(conn, emp_id)
+        finally:
+            conn.execute("COMMIT")
+    return version, {'name': name, 'department': department}, stats, leaves
+
+# Leave management functions
+@timed
+def apply_leave(emp_id, leave_type, start_date, end_date, reason):
+    # Balance check and insert share one write transaction, so concurrent
+    # submissions are serialized and cannot both spend the same days
+    with transaction() as conn:
+        row = conn.execute("SELECT department FROM employees WHERE emp_id=?", (emp_id,)).fetchone()
+        # Only working days under the employee's calendar count against the balance
+        days = working_days(start_date, end_date, row[0] if row else None)
+        if days == 0:
+            return False, "The selected dates contain no working days"
+
+        clash = find_overlap(conn, emp_id, start_date, end_date)
+        if clash:
+            return False, overlap_message(clash)
+
+        available_leaves = available_balance(conn, emp_id)
+
+        if days > available_leaves:
+            return False, f"Insufficient leave balance. Available: {available_leaves} days"
+
+        leave_id = conn.execute('''INSERT INTO leave_requests
+                                   (emp_id, leave_type, start_date, end_date, days, reason)
+                                   VALUES (?, ?, ?, ?, ?, ?)''',
+                                (emp_id, leave_type, start_date, end_date, days, reason)).lastrowid
+        adjust_counters(conn, emp_id, new_status='Pending', days=days)
+        record_changes(conn, [(leave_id, emp_id, 'Pending')])
+
+    read_cache.invalidate(f"employee:{emp_id}", "org")
+    return True, f"Leave application submitted successfully for {days} working day(s)!"
+
+def employee_leaves(conn, emp_id):
+    return pd.read_sql_query(
+        "SELECT * FROM leave_requests WHERE emp_id=? ORDER BY applied_date DESC",
+        conn, params=(emp_id,))
+
+@timed
+@read_cache.cached("employee:{emp_id}")
+def get_employee_leaves(emp_id):
+    with connection() as conn:
+        return employee_leaves(conn, emp_id)
+
+@timed
+@read_cache.cached("org")
+def get_all_leaves():
+    with connection() as conn:
+        return pd.read_sql_query(
+            """SELECT lr.*, e.name, e.department
+               FROM leave_requests lr
+               JOIN employees e ON lr.emp_id = e.emp_id
+               ORDER BY lr.applied_date DESC""", conn)
+
+def leave_filters(status=None, department=None, start_date=None, end_date=None):
+    """WHERE clauses and parameters for the admin leave filters, over lr and e"""
+    clauses, params = [], []
+    if status:
+        clauses.append("lr.status = ?")
+        params.append(status)
+    if department:
+        clauses.append("e.department = ?")
+        params.append(department)
+    # Leaves overlapping the requested date range. Every Pending and
+    # Approved request is in the interval index, so for those it picks out
+    # the overlapping ids instead of reading the whole status
+    if status in ABSENT_STATUSES and (start_date or end_date):
+        clauses.append("lr.id IN (SELECT id FROM leave_intervals WHERE start_day <= ? AND end_day >= ?)")
+        params.extend([to_day(end_date) if end_date else 2**31 - 1,
+                       to_day(start_date) if start_date else -2**31])
+    if start_date:
+        clauses.append("lr.end_date >= ?")
+        params.append(str(start_date))
+    if end_date:
+        clauses.append("lr.start_date <= ?")
+        params.append(str(end_date))
+    return clauses, params
+
+@timed
+@read_cache.cached("org")
+def get_leaves_page(status=None, department=None, start_date=None, end_date=None,
+                    after=None, page_size=25):
+    """One page of leave requests, newest first, filtered in SQL.
+
+    `after` is the (applied_date, id) keyset of the last row on the previous
+    page. Returns the page and the keyset for the next one (None on the last page).
+    """
+    clauses, params = leave_filters(status, department, start_date, end_date)
+    if after:
+        clauses.append("(lr.applied_date, lr.id) < (?, ?)")
+        params.extend(after)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with connection() as conn:
+        df = pd.read_sql_query(
+            f"""SELECT lr.*, e.name, e.department
+                FROM leave_requests lr
+                JOIN employees e ON lr.emp_id = e.emp_id
+                {where}
+                ORDER BY lr.applied_date DESC, lr.id DESC
+                LIMIT ?""", conn, params=(*params, page_size + 1))
+
+    if len(df) <= page_size:
+        return df, None
+    df = df.iloc[:page_size]
+    last = df.iloc[-1]
+    return df, (last['applied_date'], int(last['id']))
+
+EXPORT_COLUMNS = ('id', 'emp_id', 'name', 'department', 'leave_type', 'start_date', 'end_date',
+                  'days', 'reason', 'status', 'applied_date', 'approved_by', 'approved_date')
+
+def iter_leave_history(status=None, department=None, start_date=None, end_date=None, chunk_size=50_000):
+    """Filtered leave history in request order, as DataFrames of up to chunk_size rows.
+
+    Rows are fetched from one open cursor as the caller consumes them, so
+    memory is bounded by chunk_size however long the history is. The single
+    SELECT reads one snapshot; in WAL mode it does not block writers.
+    """
+    clauses, params = leave_filters(status, department, start_date, end_date)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    columns = ", ".join(f"e.{column}" if column in ('name', 'department') else f"lr.{column}"
+                        for column in EXPORT_COLUMNS)
+    with connection() as conn:
+        cursor = conn.execute(
+            f"""SELECT {columns}
+                FROM leave_requests lr
+                JOIN employees e ON lr.emp_id = e.emp_id
+                {where}
+                ORDER BY lr.id""", params)
+        try:
+            rows = cursor.fetchmany(chunk_size)
+            # The first chunk comes even when empty, so exports always carry the columns
+            yield pd.DataFrame.from_records(rows, columns=EXPORT_COLUMNS)
+            while rows:
+                rows = cursor.fetchmany(chunk_size)
+                if rows:
+                    yield pd.DataFrame.from_records(rows, columns=EXPORT_COLUMNS)
+        finally:
+            # Ends the read if the consumer stops early, before the connection is reused
+            cursor.close()
+
+@timed
+@read_cache.cached("directory")
+def get_departments():
+    with connection() as conn:
+        return [row[0] for row in conn.execute("SELECT DISTINCT department FROM employees ORDER BY department")]
+
+@timed
+@read_cache.cached("org")
+def get_employees_overview():
+    with connection() as conn:
+        return pd.read_sql_query(
+            "SELECT emp_id, name, email, department, position, total_leaves, used_leaves FROM employees WHERE emp_id != 'ADMIN'",
+            conn)
+
+@timed
+@read_cache.cached("org")
+def get_team_absences(start_date, end_date, department=None):
+    """Pending and approved leave overlapping [start_date, end_date], via the interval index"""
+    sql = '''SELECT lr.id, lr.emp_id, e.name, e.department, lr.leave_type,
+                    lr.start_date, lr.end_date, lr.days, lr.status
+             FROM leave_intervals li
+             JOIN leave_requests lr ON lr.id = li.id
+             JOIN employees e ON e.emp_id = lr.emp_id
+             WHERE li.start_day <= ? AND li.end_day >= ?'''
+    params = [to_day(end_date), to_day(start_date)]
+    if department:
+        sql += " AND e.department = ?"
+        params.append(department)
+    with connection() as conn:
+        return pd.read_sql_query(sql + " ORDER BY lr.start_date", conn, params=params,
+                                 parse_dates=['start_date', 'end_date'])
+
+@timed
+@read_cache.cached("directory")
+def get_headcount(department=None):
+    """Employees in a department, or in the whole organization"""
+    sql, params = "SELECT COUNT(*) FROM employees WHERE emp_id != 'ADMIN'", ()
+    if department:
+        sql, params = sql + " AND department = ?", (department,)
+    with connection() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+@timed
+def check_team_coverage(emp_id, department, start_date, end_date):
+    """Warning text if this leave would leave the department short-staffed, else None"""
+    return coverage_warning(get_team_absences(start_date, end_date, department),
+                            get_headcount(department), emp_id, start_date, end_date,
+                            get_calendars().for_department(department))
+
+@timed
+def update_leave_status(leave_id, status, approved_by):
+    updated, failures = update_leave_statuses([leave_id], status, approved_by)
+    if leave_id in failures:
+        return False, failures[leave_id]
+    return True, f"Leave {status.lower()}!"
+
+# SQLite caps the number of bound parameters per statement
+ID_CHUNK = 500
+
+@timed
+def update_leave_statuses(leave_ids, status, approved_by):
+    """Set the status of many leave requests in one transaction"""
+    return set_leave_statuses(dict.fromkeys(leave_ids, status), approved_by)
+
+@timed
+def set_leave_statuses(statuses, approved_by):
+    """Apply {leave_id: status} decisions, which may differ per request, in one transaction.
+
+    Approved and Rejected apply to Pending requests only, so a decision
+    made from a stale page cannot overturn one made since. Pending reopens
+    a decided request. Returns the ids that were updated and a dict of
+    id -> reason for the ones that were not.
+    """
+    leave_ids = list(statuses)
+    failures = {}
+    updated = []
+    used_deltas = Counter()
+    counter_changes = defaultdict(Counter)
+
+    with transaction() as conn:
+        # Get leave details
+        leaves = {}
+        for i in range(0, len(leave_ids), ID_CHUNK):
+            chunk = leave_ids[i:i + ID_CHUNK]
+            leaves.update((row[0], row[1:]) for row in conn.execute(
+                f"SELECT id, emp_id, days, status, start_date, end_date FROM leave_requests WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk))
+
+        balances = {}
+        reactivated = defaultdict(list)  # emp_id -> ranges brought back in this batch
+        for leave_id in leave_ids:
+            if leave_id not in leaves:
+                failures[leave_id] = "Leave request not found"
+                continue
+            emp_id, days, old_status, start_date, end_date = leaves[leave_id]
+            status = statuses[leave_id]
+
+            if status not in STATUS_COUNTERS:
+                failures[leave_id] = f"Unknown status {status!r}"
+                continue
+            if status == 'Pending' and old_status == 'Pending':
+                failures[leave_id] = "Leave request is already pending"
+                continue
+            if status != 'Pending' and old_status != 'Pending':
+                failures[leave_id] = f"Leave request already decided ({old_status})"
+                continue
+
+            # A rejected request coming back must not double-book days taken
+            # since, or by another request in this batch, and has to fit in
+            # the remaining balance; Approved requests already hold their days
+            if old_status == 'Rejected':
+                clash = find_overlap(conn, emp_id, start_date, end_date)
+                if clash:
+                    failures[leave_id] = overlap_message(clash)
+                    continue
+                if any(start_date <= other_end and end_date >= other_start
+                       for other_start, other_end in reactivated[emp_id]):
+                    failures[leave_id] = "Overlaps another request in this batch"
+                    continue
+                if emp_id not in balances:
+                    balances[emp_id] = available_balance(conn, emp_id)
+                if days > balances[emp_id]:
+                    failures[leave_id] = f"Insufficient leave balance. Available: {balances[emp_id]} days"
+                    continue
+                balances[emp_id] -= days
+
+            # Employee's used leaves change when entering or leaving Approved
+            if status == 'Approved' and old_status != 'Approved':
+                used_deltas[emp_id] += days
+            elif status != 'Approved' and old_status == 'Approved':
+                used_deltas[emp_id] -= days
+
+            counter_changes[emp_id].update(counter_deltas(old_status, status, days))
+            if old_status == 'Rejected':
+                reactivated[emp_id].append((start_date, end_date))
+            updated.append(leave_id)
+
+        conn.executemany('''UPDATE leave_requests
+                            SET status=?, approved_by=?, approved_date=CURRENT_TIMESTAMP
+                            WHERE id=?''', [(statuses[leave_id], approved_by, leave_id) for leave_id in updated])
+        conn.executemany("UPDATE employees SET used_leaves = used_leaves + ? WHERE emp_id=?",
+                         [(delta, emp_id) for emp_id, delta in used_deltas.items() if delta])
+        add_to_counters(conn, counter_changes)
+        record_changes(conn, [(leave_id, leaves[leave_id][0], statuses[leave_id]) for leave_id in updated])
+
+    if updated:
+        affected = {leaves[leave_id][0] for leave_id in updated}
+        read_cache.invalidate(*(f"employee:{emp_id}" for emp_id in affected), "org")
+    return updated, failures
+
+@timed
+def latest_change(emp_id=None):
+    """seq of the newest change to one employee's requests, or to any; 0 if none.
+
+    Not read-cached: polling it is how sessions notice new writes. Both
+    forms are a single index probe.
+    """
+    sql, params = "SELECT COALESCE(MAX(seq), 0) FROM leave_changes", ()
+    if emp_id:
+        sql, params = sql + " WHERE emp_id=?", (emp_id,)
+    with connection() as conn:
+        return conn.execute(sql, params).fetchone()[0]
+
+@timed
+def get_dashboard_stats(emp_id=None):
+    if emp_id:
+        return _employee_stats(emp_id)
+    return _org_stats()
+
+@read_cache.cached("employee:{emp_id}")
+def _employee_stats(emp_id):
+    with connection() as conn:
+        return employee_stats(conn, emp_id)
+
+def employee_stats(conn, emp_id):
+    total_leaves, used_leaves, pending_requests, pending_days = conn.execute(
+        """SELECT e.total_leaves, e.used_leaves, COALESCE(c.pending, 0), COALESCE(c.pending_days, 0)
+           FROM employees e
+           LEFT JOIN leave_counters c ON c.scope = e.emp_id
+           WHERE e.emp_id=?""", (emp_id,)).fetchone()
+
+    return {
+        'total_leaves': total_leaves,
+        'used_leaves': used_leaves,
+        'available_leaves': total_leaves - used_leaves - pending_days,
+        'pending_requests': pending_requests
+    }
+
+@read_cache.cached("org")
+def _org_stats():
+    with connection() as conn:
+        pending_requests, approved_leaves, total_requests, total_employees = conn.execute(
+            """SELECT pending, approved, total, (SELECT COUNT(*) FROM employees)
+               FROM leave_counters WHERE scope=?""", (GLOBAL_SCOPE,)).fetchone()
+
+    return {
+        'pending_requests': pending_requests,
+        'total_employees': total_employees,
+        'approved_leaves': approved_leaves,
+        'total_requests': total_requests
+    }
+
+def cache_stats():
+    """Hit/miss counters of the read cache, for monitoring"""
+    return read_cache.stats()
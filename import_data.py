@@ -0,0 +1,305 @@
+"""Bulk import of employees and leave history into the SQLite database.
+
+Usage: python import_data.py {employees,leaves} FILE [options]
+
+FILE is CSV or Parquet (.parquet, needs pyarrow) and is read in chunks,
+so memory stays bounded whatever the file size. Each chunk is validated
+as a whole and written with executemany in one transaction. Rows that
+fail validation are skipped and can be written to --rejects.
+
+employees columns: emp_id, name, email, department, position, and
+optionally password_hash (as made by credentials.hash_password, or a
+legacy MD5 hex digest that is upgraded on first login), total_leaves and
+used_leaves. Rows whose emp_id already exists are left untouched.
+
+leaves columns: emp_id, leave_type, start_date, end_date, and optionally
+days (working days are computed when missing), reason, status (default
+Pending), applied_date, approved_by and approved_date. Import employees
+first: every emp_id must already exist. A Pending or Approved row that
+overlaps another one of the same employee, already in the database or
+earlier in the file, is rejected: the apply-time overlap check treats
+active requests as the days an employee has booked.
+"""
+import argparse
+import os
+import sys
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import pandas as pd
+
+import db
+from credentials import hash_password
+from team_calendar import ABSENT_STATUSES
+from working_days import get_calendars
+
+EMPLOYEE_COLUMNS = ('emp_id', 'name', 'email', 'department', 'position')
+LEAVE_COLUMNS = ('emp_id', 'leave_type', 'start_date', 'end_date')
+
+def read_chunks(path, chunk_size):
+    """Total row count (None if unknown up front) and an iterator of DataFrame chunks"""
+    if os.path.splitext(path)[1].lower() in ('.parquet', '.pq'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet import needs pyarrow: pip install pyarrow")
+        parquet = pq.ParquetFile(path)
+        chunks = (batch.to_pandas() for batch in parquet.iter_batches(batch_size=chunk_size))
+        return parquet.metadata.num_rows, chunks
+    return None, pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False, na_values=[''])
+
+def text(chunk, column, default=None):
+    """A column as stripped strings with None for blanks, or the default if it is absent"""
+    if column not in chunk:
+        return pd.Series(default, index=chunk.index, dtype=object)
+    values = chunk[column].astype('string').str.strip()
+    return values.astype(object).where(values.notna() & (values != ''), default)
+
+def overlapping(emp_ids, starts, ends):
+    """Positions of ranges overlapping an earlier kept range of the same emp_id.
+
+    Swept in (emp_id, start) order, keeping each range that starts after
+    the end of the last one kept, so the kept ranges are disjoint.
+    """
+    clashes, last_emp, last_end = [], None, None
+    for i in sorted(range(len(emp_ids)), key=lambda i: (emp_ids[i], starts[i])):
+        if emp_ids[i] == last_emp and starts[i] <= last_end:
+            clashes.append(i)
+        else:
+            last_emp, last_end = emp_ids[i], ends[i]
+    return clashes
+
+def reject(rejected, chunk, mask, reason):
+    """Move rows matching mask out of the chunk and into the rejects, with a reason"""
+    if mask.any():
+        rejected.append(chunk[mask].assign(error=reason))
+    return chunk[~mask]
+
+class Importer(ABC):
+    """Streams one file into one table and reports progress as it goes.
+
+    Subclasses write each validated chunk in import_chunk().
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.rows = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+        self._wrote_rejects = False
+
+    def run(self):
+        total, chunks = read_chunks(self.args.file, self.args.chunk_size)
+        for chunk in chunks:
+            rejected = []
+            self.inserted += self.import_chunk(chunk, rejected)
+            self.rows += len(chunk)
+            self.write_rejects(rejected)
+            self.progress(total)
+        print()
+        self.finish()
+        elapsed = time.perf_counter() - self.started
+        print(f"Done: {self.rows:,} rows in {elapsed:.1f}s ({self.rows / max(elapsed, 1e-9):,.0f} rows/s), "
+              f"{self.inserted:,} inserted, {self.rejected:,} rejected")
+        return 1 if self.rejected and self.args.strict else 0
+
+    @abstractmethod
+    def import_chunk(self, chunk, rejected):
+        """Validate and insert one chunk; returns rows inserted, appending rejects to `rejected`"""
+
+    def finish(self):
+        pass
+
+    def progress(self, total):
+        elapsed = time.perf_counter() - self.started
+        done = f"{self.rows:,}/{total:,} ({self.rows / total:.0%})" if total else f"{self.rows:,}"
+        print(f"\r{self.args.table}: {done} rows | {self.inserted:,} inserted, {self.rejected:,} rejected | "
+              f"{self.rows / max(elapsed, 1e-9):,.0f} rows/s", end='', flush=True)
+
+    def write_rejects(self, rejected):
+        if not rejected:
+            return
+        rows = pd.concat(rejected)
+        self.rejected += len(rows)
+        if self.args.rejects:
+            rows.to_csv(self.args.rejects, mode='a' if self._wrote_rejects else 'w',
+                        header=not self._wrote_rejects, index=False)
+            self._wrote_rejects = True
+
+
+class EmployeeImporter(Importer):
+
+    def __init__(self, args):
+        super().__init__(args)
+        # Hashed once: every employee given the default shares it anyway
+        self.default_hash = hash_password(args.default_password) if args.default_password else None
+
+    def import_chunk(self, chunk, rejected):
+        chunk = chunk.assign(**{column: text(chunk, column) for column in EMPLOYEE_COLUMNS})
+        missing = [column for column in EMPLOYEE_COLUMNS if column not in chunk]
+        chunk = reject(rejected, chunk, chunk[list(EMPLOYEE_COLUMNS)].isna().any(axis=1),
+                       "missing " + "/".join(missing or EMPLOYEE_COLUMNS))
+        chunk = reject(rejected, chunk, chunk['emp_id'].duplicated(), "duplicate emp_id in file")
+        passwords = text(chunk, 'password_hash', self.default_hash)
+        total = pd.to_numeric(text(chunk, 'total_leaves', '20'), errors='coerce')
+        used = pd.to_numeric(text(chunk, 'used_leaves', '0'), errors='coerce')
+        for bad, reason in ((passwords.isna(), "no password_hash and no --default-password"),
+                            (total.isna() | (total < 0), "invalid total_leaves"),
+                            (used.isna() | (used < 0), "invalid used_leaves")):
+            chunk = reject(rejected, chunk, bad.loc[chunk.index], reason)
+        passwords, total, used = passwords.loc[chunk.index], total.loc[chunk.index], used.loc[chunk.index]
+
+        # Plain lists: iterating arrow-backed columns row by row is slow
+        rows = zip(*(chunk[column].tolist() for column in EMPLOYEE_COLUMNS),
+                   passwords.tolist(), total.astype(int).tolist(), used.astype(int).tolist())
+        with db.transaction() as conn:
+            return conn.executemany('''INSERT OR IGNORE INTO employees
+                                (emp_id, name, email, department, position, password, total_leaves, used_leaves)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows).rowcount
+
+
+class LeaveImporter(Importer):
+    """Leave history import with index maintenance deferred to the end.
+
+    Secondary indexes and triggers on leave_requests are dropped for the
+    duration and recreated afterwards, so rows are appended to the table
+    b-tree only; the interval index and counters are rebuilt in one pass.
+    The active range index stays, for the overlap check of each chunk.
+    """
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.deferred = []
+        self.first_new_id = None
+        self.imported_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def run(self):
+        with db.transaction() as conn:
+            self.first_new_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM leave_requests").fetchone()[0]
+            if self.args.defer_indexes:
+                self.deferred = db.defer_leave_indexes(conn, keep=('idx_leave_requests_emp_active_range',))
+        try:
+            return super().run()
+        finally:
+            self.restore_indexes()
+
+    def import_chunk(self, chunk, rejected):
+        chunk = chunk.assign(**{column: text(chunk, column) for column in LEAVE_COLUMNS})
+        chunk = reject(rejected, chunk, chunk[list(LEAVE_COLUMNS)].isna().any(axis=1),
+                       "missing " + "/".join(LEAVE_COLUMNS))
+        starts = pd.to_datetime(chunk['start_date'], errors='coerce', format='ISO8601')
+        ends = pd.to_datetime(chunk['end_date'], errors='coerce', format='ISO8601')
+        status = text(chunk, 'status', 'Pending').str.title()
+        for bad, reason in ((starts.isna() | ends.isna() | (ends < starts), "invalid dates"),
+                            (~status.isin(list(db.STATUS_COUNTERS)), "invalid status")):
+            chunk = reject(rejected, chunk, bad.loc[chunk.index], reason)
+
+        with db.transaction() as conn:
+            # Foreign keys for the whole chunk in one join
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_emp_ids (emp_id TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM import_emp_ids")
+            conn.executemany("INSERT INTO import_emp_ids (emp_id) VALUES (?)",
+                             ((emp_id,) for emp_id in chunk['emp_id'].unique()))
+            departments = dict(conn.execute(
+                """SELECT i.emp_id, e.department FROM import_emp_ids i
+                   LEFT JOIN employees e ON e.emp_id = i.emp_id"""))
+            department = chunk['emp_id'].map(departments)
+            chunk = reject(rejected, chunk, department.isna(), "unknown emp_id")
+            starts, ends, status, department = (series.loc[chunk.index] for series in (starts, ends, status, department))
+
+            days = pd.to_numeric(text(chunk, 'days'), errors='coerce')
+            missing_days = days.isna()
+            if missing_days.any():
+                # Working days, one vectorized lookup per department calendar
+                calendars = get_calendars()
+                for name, rows in department[missing_days].groupby(department[missing_days]).groups.items():
+                    days.loc[rows] = calendars.for_department(name).count_many(
+                        starts[rows].to_numpy().astype('datetime64[D]'), ends[rows].to_numpy().astype('datetime64[D]'))
+
+            starts, ends = starts.dt.strftime('%Y-%m-%d'), ends.dt.strftime('%Y-%m-%d')
+            chunk = self.reject_overlaps(conn, rejected, chunk, starts, ends, status)
+            starts, ends, status, days = (series.loc[chunk.index] for series in (starts, ends, status, days))
+
+            rows = zip(chunk['emp_id'].tolist(), chunk['leave_type'].tolist(),
+                       starts.tolist(), ends.tolist(), days.astype(int).tolist(), text(chunk, 'reason').tolist(), status.tolist(),
+                       text(chunk, 'applied_date', self.imported_at).tolist(),
+                       text(chunk, 'approved_by').tolist(), text(chunk, 'approved_date').tolist())
+            # rowcount leaves out the rows the triggers write
+            return conn.executemany('''INSERT INTO leave_requests
+                                (emp_id, leave_type, start_date, end_date, days, reason, status,
+                                 applied_date, approved_by, approved_date)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows).rowcount
+
+    def reject_overlaps(self, conn, rejected, chunk, starts, ends, status):
+        """Reject active rows overlapping an active request in the database or earlier in the chunk"""
+        active = status.isin(ABSENT_STATUSES)
+        emp_ids, starts, ends = (series[active].tolist() for series in (chunk['emp_id'], starts, ends))
+        index = chunk.index[active]
+        # One statement probes the active range index for every row
+        conn.execute("""CREATE TEMP TABLE IF NOT EXISTS import_active
+                        (row INTEGER PRIMARY KEY, emp_id TEXT, start_date TEXT, end_date TEXT)""")
+        conn.execute("DELETE FROM import_active")
+        conn.executemany("INSERT INTO import_active VALUES (?, ?, ?, ?)",
+                         zip(range(len(emp_ids)), emp_ids, starts, ends))
+        stored = {row for row, in conn.execute(
+            """SELECT i.row FROM import_active i
+               WHERE EXISTS (SELECT 1 FROM leave_requests lr
+                             WHERE lr.emp_id = i.emp_id AND lr.status IN ('Pending', 'Approved')
+                               AND lr.start_date <= i.end_date AND lr.end_date >= i.start_date)""")}
+        chunk = reject(rejected, chunk, chunk.index.isin(index[sorted(stored)]),
+                       "overlaps an active request in the database")
+        rest = [i for i in range(len(emp_ids)) if i not in stored]
+        clashes = overlapping([emp_ids[i] for i in rest], [starts[i] for i in rest], [ends[i] for i in rest])
+        return reject(rejected, chunk, chunk.index.isin(index[[rest[i] for i in clashes]]),
+                      "overlaps an earlier active request in the file")
+
+    def restore_indexes(self):
+        if not self.deferred:
+            return
+        print("Rebuilding indexes...", flush=True)
+        with db.transaction() as conn:
+            db.restore_leave_indexes(conn, self.deferred)
+        self.deferred = []
+
+    def finish(self):
+        self.restore_indexes()
+        with db.transaction() as conn:
+            if self.args.defer_indexes:
+                # Triggers were off during the load
+                conn.execute(db.FILL_LEAVE_INTERVALS_SQL + " AND id > ?", (self.first_new_id,))
+            db.rebuild_counters(conn)
+        with db.connection() as conn:
+            # Sampled statistics are enough for the planner and keep this fast
+            conn.execute("PRAGMA analysis_limit = 1000")
+            conn.execute("ANALYZE")
+
+
+IMPORTERS = {
+    'employees': EmployeeImporter,
+    'leaves': LeaveImporter,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('table', choices=sorted(IMPORTERS))
+    parser.add_argument('file')
+    parser.add_argument('--db', help="database path (default: LEAVE_DB_PATH or leave_management.db)")
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    parser.add_argument('--rejects', help="write rows that fail validation to this CSV")
+    parser.add_argument('--strict', action='store_true', help="exit with status 1 if any row is rejected")
+    parser.add_argument('--default-password', help="password for employees without a password_hash column")
+    parser.add_argument('--no-defer-indexes', dest='defer_indexes', action='store_false',
+                        help="keep leave_requests indexes live during the load, e.g. while the app is running")
+    args = parser.parse_args(argv)
+
+    # The connection pool opens DB_PATH on first use
+    if args.db:
+        db.DB_PATH = args.db
+    with db.connection() as conn:
+        db.migrate(conn)
+    return IMPORTERS[args.table](args).run()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""Per-rerun timing of data functions, SQL statements and page sections.
+
+Off unless LEAVE_INSTRUMENT=1 or switched on at runtime with enable().
+While off, every hook is a single flag check, so the decorators and the
+pooled connection class can stay in place in production.
+
+While on, each Streamlit rerun collects, between begin_rerun() and
+end_rerun() on its script thread:
+
+- calls and seconds per @timed function, and the in-memory size of the
+  DataFrames they return,
+- the number and duration of SQL statements run through an
+  InstrumentedConnection (time spent inside execute()),
+- seconds per section() of the page,
+- time spent waiting for locks: the database write lock, a free pooled
+  connection, or the leave_management.py store (lock_wait() and TimedLock).
+
+A fragment rerun, which runs one @st.fragment body and none of the
+script around it, is measured as a rerun of its own by fragment_rerun().
+
+Finished reruns are kept in memory (the last RECENT_RERUNS), summed into
+process-wide totals for prometheus_text(), and appended to
+LEAVE_INSTRUMENT_LOG as JSON lines when that is set.
+"""
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+LOG_PATH = os.environ.get('LEAVE_INSTRUMENT_LOG')
+JSONL_PATH = LOG_PATH or 'leave_reruns.jsonl'
+PROMETHEUS_PATH = os.environ.get('LEAVE_METRICS_PATH', 'leave_metrics.prom')
+RECENT_RERUNS = 200
+
+_enabled = os.environ.get('LEAVE_INSTRUMENT', '0') == '1'
+_lock = threading.Lock()
+_local = threading.local()
+_recent = deque(maxlen=RECENT_RERUNS)
+_totals = {
+    'reruns': 0,
+    'rerun_seconds': 0.0,
+    'calls': Counter(),
+    'seconds': Counter(),
+    'sql_statements': 0,
+    'sql_seconds': 0.0,
+    'dataframe_bytes': {},
+    'lock_acquisitions': Counter(),
+    'lock_seconds': Counter(),
+}
+
+def enabled():
+    return _enabled
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+class RerunStats:
+    """What one rerun spent, by function, SQL and section"""
+
+    def __init__(self, script):
+        self.script = script
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.seconds = None
+        self.calls = Counter()
+        self.function_seconds = Counter()
+        self.dataframe_bytes = {}
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.slowest_sql = (0.0, None)
+        self.sections = Counter()
+        self.lock_acquisitions = Counter()
+        self.lock_seconds = Counter()
+
+    def to_dict(self):
+        return {
+            'script': self.script,
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'functions': {name: {'calls': self.calls[name], 'seconds': self.function_seconds[name],
+                                 'dataframe_bytes': self.dataframe_bytes.get(name)}
+                          for name in self.calls},
+            'sql_statements': self.sql_statements,
+            'sql_seconds': self.sql_seconds,
+            'slowest_sql': {'seconds': self.slowest_sql[0], 'sql': self.slowest_sql[1]},
+            'sections': dict(self.sections),
+            'locks': {name: {'acquisitions': self.lock_acquisitions[name], 'seconds': self.lock_seconds[name]}
+                      for name in self.lock_acquisitions},
+        }
+
+
+def begin_rerun(script):
+    """Start collecting for the rerun running on this thread"""
+    _local.rerun = RerunStats(script) if _enabled else None
+
+def end_rerun():
+    """Stop collecting; returns the finished RerunStats, or None when off"""
+    stats = getattr(_local, 'rerun', None)
+    _local.rerun = None
+    if stats is None:
+        return None
+    stats.seconds = time.perf_counter() - stats._start
+    with _lock:
+        _recent.append(stats)
+        _totals['reruns'] += 1
+        _totals['rerun_seconds'] += stats.seconds
+    if LOG_PATH:
+        with _lock, open(LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(stats.to_dict()) + '\n')
+    return stats
+
+def _current():
+    return getattr(_local, 'rerun', None)
+
+def _dataframe_bytes(result):
+    if isinstance(result, tuple):
+        result = next((item for item in result if isinstance(item, pd.DataFrame)), None)
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    return None
+
+def timed(fn):
+    """Count calls and time of fn, and the size of a DataFrame it returns"""
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        size = _dataframe_bytes(result)
+        stats = _current()
+        if stats is not None:
+            stats.calls[name] += 1
+            stats.function_seconds[name] += elapsed
+            if size is not None:
+                stats.dataframe_bytes[name] = size
+        with _lock:
+            _totals['calls'][name] += 1
+            _totals['seconds'][name] += elapsed
+            if size is not None:
+                _totals['dataframe_bytes'][name] = size
+        return result
+    return wrapper
+
+@contextmanager
+def section(name):
+    """Time a block of the page, e.g. one dashboard or the CSS"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current()
+        if stats is not None:
+            stats.sections[name] += time.perf_counter() - start
+
+@contextmanager
+def fragment_rerun(script, name):
+    """Time a @st.fragment body: as section `name` of the full rerun drawing
+    it, or as a rerun of its own, script "<script>#<name>", when Streamlit
+    reruns just the fragment"""
+    if not _enabled or _current() is not None:
+        with section(name):
+            yield
+        return
+    begin_rerun(f"{script}#{name}")
+    try:
+        yield
+    finally:
+        end_rerun()
+
+def _record_sql(sql, elapsed):
+    stats = _current()
+    if stats is not None:
+        stats.sql_statements += 1
+        stats.sql_seconds += elapsed
+        if elapsed > stats.slowest_sql[0]:
+            stats.slowest_sql = (elapsed, ' '.join(sql.split()))
+    with _lock:
+        _totals['sql_statements'] += 1
+        _totals['sql_seconds'] += elapsed
+
+def _record_lock_wait(name, elapsed):
+    stats = _current()
+    if stats is not None:
+        stats.lock_acquisitions[name] += 1
+        stats.lock_seconds[name] += elapsed
+    with _lock:
+        _totals['lock_acquisitions'][name] += 1
+        _totals['lock_seconds'][name] += elapsed
+
+@contextmanager
+def lock_wait(name):
+    """Time a block that waits for the lock `name`, such as BEGIN IMMEDIATE"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_lock_wait(name, time.perf_counter() - start)
+
+
+class TimedLock:
+    """Reentrant lock that reports how long `with` waited to acquire it while instrumentation is on"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        if not _enabled:
+            self._lock.acquire()
+            return self
+        start = time.perf_counter()
+        self._lock.acquire()
+        _record_lock_wait(self.name, time.perf_counter() - start)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statement time while instrumentation is on"""
+
+    def execute(self, sql, parameters=()):
+        if not _enabled:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _enabled:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_sql(sql, time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection factory whose statements are timed while instrumentation is on"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        if not _enabled:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not _enabled:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def recent_reruns():
+    with _lock:
+        return list(_recent)
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def process_totals():
+    """Copy of the process-wide totals since start"""
+    with _lock:
+        return {key: value.copy() if hasattr(value, 'copy') else value for key, value in _totals.items()}
+
+def prometheus_text():
+    """Process-wide totals in the Prometheus text exposition format"""
+    totals = process_totals()
+    lines = [
+        "# HELP leave_reruns_total Instrumented script reruns",
+        "# TYPE leave_reruns_total counter",
+        f"leave_reruns_total {totals['reruns']}",
+        "# HELP leave_rerun_seconds_total Wall time of instrumented reruns",
+        "# TYPE leave_rerun_seconds_total counter",
+        f"leave_rerun_seconds_total {totals['rerun_seconds']:.6f}",
+        "# HELP leave_sql_statements_total SQL statements executed",
+        "# TYPE leave_sql_statements_total counter",
+        f"leave_sql_statements_total {totals['sql_statements']}",
+        "# HELP leave_sql_seconds_total Time spent in SQL execute()",
+        "# TYPE leave_sql_seconds_total counter",
+        f"leave_sql_seconds_total {totals['sql_seconds']:.6f}",
+        "# HELP leave_function_calls_total Calls to instrumented data functions",
+        "# TYPE leave_function_calls_total counter",
+    ]
+    lines += [f'leave_function_calls_total{{function="{_escape(name)}"}} {calls}'
+              for name, calls in sorted(totals['calls'].items())]
+    lines += ["# HELP leave_function_seconds_total Time spent in instrumented data functions",
+              "# TYPE leave_function_seconds_total counter"]
+    lines += [f'leave_function_seconds_total{{function="{_escape(name)}"}} {seconds:.6f}'
+              for name, seconds in sorted(totals['seconds'].items())]
+    lines += ["# HELP leave_dataframe_bytes Memory of the last DataFrame returned by a data function",
+              "# TYPE leave_dataframe_bytes gauge"]
+    lines += [f'leave_dataframe_bytes{{function="{_escape(name)}"}} {size}'
+              for name, size in sorted(totals['dataframe_bytes'].items())]
+    lines += ["# HELP leave_lock_acquisitions_total Timed lock acquisitions",
+              "# TYPE leave_lock_acquisitions_total counter"]
+    lines += [f'leave_lock_acquisitions_total{{lock="{_escape(name)}"}} {count}'
+              for name, count in sorted(totals['lock_acquisitions'].items())]
+    lines += ["# HELP leave_lock_wait_seconds_total Time spent waiting to acquire timed locks",
+              "# TYPE leave_lock_wait_seconds_total counter"]
+    lines += [f'leave_lock_wait_seconds_total{{lock="{_escape(name)}"}} {seconds:.6f}'
+              for name, seconds in sorted(totals['lock_seconds'].items())]
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(path=PROMETHEUS_PATH):
+    """Write prometheus_text() to path atomically, for a node_exporter textfile collector"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return path
+
+def write_jsonl(path=JSONL_PATH, reruns=None):
+    """Append reruns (default: the recent ones) to path as JSON lines"""
+    reruns = recent_reruns() if reruns is None else reruns
+    with open(path, 'a', encoding='utf-8') as f:
+        for stats in reruns:
+            f.write(json.dumps(stats.to_dict()) + '\n')
+    return path
@@ -0,0 +1,100 @@
+"""Streaming export of leave history to CSV, Parquet and Excel.
+
+Each writer consumes an iterator of DataFrame chunks (db.iter_leave_history)
+and appends them to a binary file one chunk at a time, so only one chunk
+is in memory while the file is built. Parquet needs pyarrow and Excel
+needs openpyxl; formats whose library is missing are left out of
+available_formats().
+"""
+import importlib.util
+import tempfile
+
+EXCEL_MAX_ROWS = 1_048_576  # per sheet, including the header row
+
+# Column types for Parquet, fixed up front so every chunk writes the same
+# schema even when a chunk has, say, no approved_by values at all
+INTEGER_COLUMNS = ('id', 'days')
+
+def write_csv(chunks, out):
+    header = True
+    for chunk in chunks:
+        out.write(chunk.to_csv(index=False, header=header).encode('utf-8'))
+        header = False
+
+def write_parquet(chunks, out):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.schema([(column, pa.int64() if column in INTEGER_COLUMNS else pa.string())
+                                    for column in chunk.columns])
+                writer = pq.ParquetWriter(out, schema, compression='zstd')
+            # One row group per chunk
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def write_excel(chunks, out):
+    from openpyxl import Workbook
+
+    # Write-only mode streams rows to disk instead of building cell objects
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows = None, 0
+
+    def new_sheet(header):
+        sheet = workbook.create_sheet(f"Leave history {len(workbook.worksheets) + 1}")
+        sheet.append(header)
+        return sheet, 1
+
+    for chunk in chunks:
+        if sheet is None:
+            sheet, sheet_rows = new_sheet(list(chunk.columns))
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            if sheet_rows == EXCEL_MAX_ROWS:
+                sheet, sheet_rows = new_sheet(list(chunk.columns))
+            sheet.append(row)
+            sheet_rows += 1
+    workbook.save(out)
+
+
+class ExportFormat:
+    def __init__(self, extension, mime, writer, module=None):
+        self.extension = extension
+        self.mime = mime
+        self.writer = writer
+        self.module = module
+
+    @property
+    def available(self):
+        return self.module is None or importlib.util.find_spec(self.module) is not None
+
+
+EXPORT_FORMATS = {
+    'CSV': ExportFormat('csv', 'text/csv', write_csv),
+    'Parquet': ExportFormat('parquet', 'application/vnd.apache.parquet', write_parquet, 'pyarrow'),
+    'Excel': ExportFormat('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                          write_excel, 'openpyxl'),
+}
+
+def available_formats():
+    """Names of the export formats whose libraries are installed"""
+    return [name for name, export_format in EXPORT_FORMATS.items() if export_format.available]
+
+def export_leave_history(chunks, format_name, out):
+    """Write DataFrame chunks to the binary file `out` in the named format"""
+    EXPORT_FORMATS[format_name].writer(chunks, out)
+
+def export_bytes(chunks, format_name):
+    """The finished export as bytes, for st.download_button.
+
+    The file is built on disk chunk by chunk and read back once, so the
+    only full copy in memory is the one Streamlit serves.
+    """
+    with tempfile.TemporaryFile() as out:
+        export_leave_history(chunks, format_name, out)
+        out.seek(0)
+        return out.read()
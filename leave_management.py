@@ -1,38 +1,53 @@
+import os
 import streamlit as st
-import pandas as pd
 from datetime import datetime, timedelta
-import hashlib
 
-# Initialize session state data
-def init_data():
-    """Initialize demo data in session state"""
-    if 'employees' not in st.session_state:
-        st.session_state.employees = {
+from approval_queue import approval_queue, queue_window
+from credentials import LoginThrottled, check_login, hash_password
+from instrumentation import begin_rerun, end_rerun, fragment_rerun, section, timed
+from leave_store import LEAVE_TYPES, BalanceError, JsonlLeaveStore, OverlapError
+from live_updates import live_updates, mark_drawn
+from team_calendar import coverage_warning, daily_absences
+from working_days import get_calendars, working_days
+
+STORE_PATH = os.environ.get('LEAVE_STORE_PATH', 'leave_store.jsonl')
+
+# Shared data store
+@st.cache_resource
+def get_store():
+    """Process-wide store shared by every session, seeded with demo data on first start"""
+    store = JsonlLeaveStore(STORE_PATH)
+    init_data(store)
+    return store
+
+def init_data(store):
+    """Seed demo data into an empty store"""
+    if store.is_empty():
+        employees = {
             1001: {'emp_id': 1001, 'name': 'John Doe', 'email': 'john.doe@acme.com', 
-                   'password': hashlib.sha256('password123'.encode()).hexdigest(), 
+                   'password': hash_password('password123'), 
                    'department': 'Engineering', 'role': 'Employee', 'total_leaves': 20, 'used_leaves': 5},
             1002: {'emp_id': 1002, 'name': 'Jane Smith', 'email': 'jane.smith@acme.com', 
-                   'password': hashlib.sha256('password123'.encode()).hexdigest(), 
+                   'password': hash_password('password123'), 
                    'department': 'Engineering', 'role': 'Manager', 'total_leaves': 20, 'used_leaves': 3},
             1003: {'emp_id': 1003, 'name': 'Bob Johnson', 'email': 'bob.johnson@acme.com', 
-                   'password': hashlib.sha256('password123'.encode()).hexdigest(), 
+                   'password': hash_password('password123'), 
                    'department': 'HR', 'role': 'Employee', 'total_leaves': 20, 'used_leaves': 8},
             1004: {'emp_id': 1004, 'name': 'Alice Williams', 'email': 'alice.williams@acme.com', 
-                   'password': hashlib.sha256('password123'.encode()).hexdigest(), 
+                   'password': hash_password('password123'), 
                    'department': 'Marketing', 'role': 'Employee', 'total_leaves': 20, 'used_leaves': 2},
             1005: {'emp_id': 1005, 'name': 'Charlie Brown', 'email': 'charlie.brown@acme.com', 
-                   'password': hashlib.sha256('password123'.encode()).hexdigest(), 
+                   'password': hash_password('password123'), 
                    'department': 'Sales', 'role': 'Manager', 'total_leaves': 20, 'used_leaves': 4},
             1006: {'emp_id': 1006, 'name': 'Diana Prince', 'email': 'diana.prince@acme.com', 
-                   'password': hashlib.sha256('password123'.encode()).hexdigest(), 
+                   'password': hash_password('password123'), 
                    'department': 'Engineering', 'role': 'Employee', 'total_leaves': 20, 'used_leaves': 6},
             1007: {'emp_id': 1007, 'name': 'Eve Davis', 'email': 'eve.davis@acme.com', 
-                   'password': hashlib.sha256('password123'.encode()).hexdigest(), 
+                   'password': hash_password('password123'), 
                    'department': 'HR', 'role': 'Manager', 'total_leaves': 20, 'used_leaves': 1},
         }
     
-    if 'leave_requests' not in st.session_state:
-        st.session_state.leave_requests = [
+        leave_requests = [
             {'request_id': 1, 'emp_id': 1001, 'leave_type': 'Sick Leave', 'start_date': '2025-11-15', 
              'end_date': '2025-11-17', 'days': 3, 'reason': 'Medical appointment', 
              'status': 'Approved', 'applied_date': '2025-11-10 09:30:00', 'approved_by': 1002},
@@ -52,28 +67,34 @@ def init_data():
              'end_date': '2025-12-17', 'days': 3, 'reason': 'Personal work', 
              'status': 'Pending', 'applied_date': '2025-12-10 10:30:00', 'approved_by': None},
         ]
-        st.session_state.next_request_id = 7
+        store.seed(employees, leave_requests)
 
 # Authentication functions
-def hash_password(password):
-    """Hash password using SHA256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
+@timed
 def authenticate_user(email, password):
-    """Authenticate user credentials"""
-    hashed_password = hash_password(password)
-    for emp_id, emp in st.session_state.employees.items():
-        if emp['email'] == email and emp['password'] == hashed_password:
-            return emp.copy()
-    return None
+    """Authenticate user credentials, upgrading a legacy SHA-256 hash on success"""
+    emp = get_store().find_employee_by_email(email)
+    ok, new_hash = check_login(email, password, emp['password'] if emp else None)
+    if not ok:
+        return None
+    if new_hash:
+        get_store().set_password(emp['emp_id'], new_hash, emp['password'])
+    return emp
 
 # Leave management functions
+@timed
+def count_working_days(emp_id, start_date, end_date):
+    """Working days in a date range under the employee's department calendar"""
+    return working_days(start_date, end_date, get_store().get_employee(emp_id)['department'])
+
+@timed
 def apply_leave(emp_id, leave_type, start_date, end_date, reason):
     """Apply for a new leave"""
-    days = (end_date - start_date).days + 1
+    days = count_working_days(emp_id, start_date, end_date)
+    if days == 0:
+        return False, "The selected dates contain no working days!"
     
     new_request = {
-        'request_id': st.session_state.next_request_id,
         'emp_id': emp_id,
         'leave_type': leave_type,
         'start_date': start_date.strftime('%Y-%m-%d'),
@@ -85,56 +106,336 @@ def apply_leave(emp_id, leave_type, start_date, end_date, reason):
         'approved_by': None
     }
     
-    st.session_state.leave_requests.append(new_request)
-    st.session_state.next_request_id += 1
-    return True
+    try:
+        get_store().add_request(new_request)
+    except OverlapError as e:
+        existing = e.existing
+        return False, (f"These dates overlap your {existing['status'].lower()} leave "
+                       f"from {existing['start_date']} to {existing['end_date']}!")
+    except BalanceError as e:
+        return False, f"Insufficient leave balance! You have only {e.available} days available."
+    return True, f"Leave request submitted successfully for {days} working days!"
 
+@timed
 def get_employee_leaves(emp_id):
     """Get all leave requests for an employee"""
-    leaves = [req for req in st.session_state.leave_requests if req['emp_id'] == emp_id]
-    return pd.DataFrame(leaves) if leaves else pd.DataFrame()
+    return get_store().requests_frame(emp_id=emp_id)
 
-def get_all_leave_requests():
-    """Get all leave requests (for managers)"""
-    data = []
-    for req in st.session_state.leave_requests:
-        emp = st.session_state.employees[req['emp_id']]
-        data.append({
-            'request_id': req['request_id'],
-            'name': emp['name'],
-            'department': emp['department'],
-            'leave_type': req['leave_type'],
-            'start_date': req['start_date'],
-            'end_date': req['end_date'],
-            'days': req['days'],
-            'reason': req['reason'],
-            'status': req['status'],
-            'applied_date': req['applied_date']
-        })
-    return pd.DataFrame(data) if data else pd.DataFrame()
+@timed
+def count_leave_requests(status=None):
+    return get_store().count_requests(status)
 
+@timed
+def get_all_leave_requests(status=None, rows=None):
+    """Get all leave requests (for managers), optionally only one status and a slice of those"""
+    df = get_store().requests_with_employees(status=status, rows=rows)
+    return df[['request_id', 'name', 'department', 'leave_type', 'start_date', 'end_date',
+               'days', 'reason', 'status', 'applied_date']]
+
+@timed
+def get_team_absences(start_date, end_date, department=None):
+    """Pending and approved leave overlapping a date range, optionally for one department"""
+    return get_store().absences(start_date, end_date, department)
+
+@timed
+def check_team_coverage(emp_id, start_date, end_date):
+    """Warning text if this leave would leave the employee's department short-staffed"""
+    store = get_store()
+    department = store.get_employee(emp_id)['department']
+    return coverage_warning(get_team_absences(start_date, end_date, department),
+                            store.headcount(department), emp_id, start_date, end_date,
+                            get_calendars().for_department(department))
+
+@timed
 def update_leave_status(request_id, status, manager_id):
-    """Update leave request status"""
-    for req in st.session_state.leave_requests:
-        if req['request_id'] == request_id:
-            req['status'] = status
-            req['approved_by'] = manager_id
-            
-            # If approved, update employee's used leaves
-            if status == 'Approved':
-                emp_id = req['emp_id']
-                st.session_state.employees[emp_id]['used_leaves'] += req['days']
-            break
+    """Update one leave request's status; returns (success, message)"""
+    updated, failures = update_leave_statuses({request_id: status}, manager_id)
+    if int(request_id) in failures:
+        return False, failures[int(request_id)]
+    return True, f"Leave {status.lower()}!"
 
+@timed
+def update_leave_statuses(statuses, manager_id):
+    """Apply {request_id: status} decisions in one batch; returns (updated ids, {request_id: reason})"""
+    return get_store().update_statuses(statuses, manager_id)
+
+@timed
 def get_leave_statistics(emp_id):
     """Get leave statistics for an employee"""
-    emp = st.session_state.employees[emp_id]
+    emp = get_store().get_employee(emp_id)
     return {
         'total': emp['total_leaves'],
         'used': emp['used_leaves'],
-        'available': emp['total_leaves'] - emp['used_leaves']
+        'available': get_store().available_balance(emp_id)
     }
 
+@timed
+def latest_change(emp_id=None):
+    """Sequence number of the newest change to one employee's requests, or to any"""
+    return get_store().latest_change(emp_id)
+
+# Live updates: managers watch every request, employees their own
+def watched_emp_id(user):
+    return None if user['role'] == 'Manager' else user['emp_id']
+
+def mark_watched_drawn():
+    mark_drawn(latest_change, watched_emp_id(st.session_state.user))
+
+# Page sections. Each is a fragment: a widget inside one reruns only that
+# fragment, not the whole script. The user comes from session state, as a
+# fragment rerun does not run main().
+@st.fragment(key="leave_stats")
+def leave_stats():
+    with fragment_rerun("leave_management.py", "leave_stats"):
+        stats = get_leave_statistics(st.session_state.user['emp_id'])
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.markdown(f"""
+                <div class="stat-card" style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">
+                    <div class="stat-value">{stats['total']}</div>
+                    <div class="stat-label">Total Leaves</div>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown(f"""
+                <div class="stat-card" style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);">
+                    <div class="stat-value">{stats['used']}</div>
+                    <div class="stat-label">Used Leaves</div>
+                </div>
+            """, unsafe_allow_html=True)
+        
+        with col3:
+            st.markdown(f"""
+                <div class="stat-card" style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);">
+                    <div class="stat-value">{stats['available']}</div>
+                    <div class="stat-label">Available Leaves</div>
+                </div>
+            """, unsafe_allow_html=True)
+
+def recent_requests():
+    st.subheader("📅 Recent Leave Requests")
+    leaves_df = get_employee_leaves(st.session_state.user['emp_id'])
+    
+    if not leaves_df.empty:
+        display_df = leaves_df.copy()
+        display_df = display_df.sort_values('applied_date', ascending=False)
+        
+        st.dataframe(
+            display_df[['request_id', 'leave_type', 'start_date', 'end_date', 'days', 'reason', 'status']],
+            column_config={
+                "request_id": "Request ID",
+                "leave_type": "Leave Type",
+                "start_date": st.column_config.DateColumn("Start Date"),
+                "end_date": st.column_config.DateColumn("End Date"),
+                "days": "Days",
+                "reason": "Reason",
+                "status": "Status"
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("No leave requests found.")
+
+@st.fragment(key="apply_leave_form")
+def apply_leave_form():
+    with fragment_rerun("leave_management.py", "apply_leave_form"):
+        user = st.session_state.user
+        st.header("➕ Apply for Leave")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            leave_type = st.selectbox(
+                "Leave Type",
+                list(LEAVE_TYPES)
+            )
+            start_date = st.date_input("Start Date", min_value=datetime.now().date())
+        
+        with col2:
+            end_date = st.date_input("End Date", min_value=datetime.now().date())
+        
+        reason = st.text_area("Reason for Leave", placeholder="Please provide a reason for your leave request...")
+        
+        if start_date <= end_date:
+            coverage = check_team_coverage(user['emp_id'], start_date, end_date)
+            if coverage:
+                st.warning(f"⚠️ {coverage}")
+        
+        # The dashboard tab is not drawn meanwhile, and reads the new
+        # balance when it is opened, so only this fragment reruns
+        if st.button("Submit Leave Request", type="primary", use_container_width=True):
+            if start_date > end_date:
+                st.error("❌ End date must be after start date!")
+            elif not reason.strip():
+                st.error("❌ Please provide a reason for your leave request!")
+            else:
+                # The balance is checked by the store under its lock
+                success, message = apply_leave(user['emp_id'], leave_type, start_date, end_date, reason)
+                if success:
+                    # Our own request needs no live refresh
+                    mark_watched_drawn()
+                    st.success(f"✅ {message}")
+                    st.balloons()
+                else:
+                    st.error(f"❌ {message}")
+
+@st.fragment(key="leave_history")
+def leave_history():
+    with fragment_rerun("leave_management.py", "leave_history"):
+        st.header("📋 My Leave History")
+        
+        leaves_df = get_employee_leaves(st.session_state.user['emp_id'])
+        
+        if not leaves_df.empty:
+            # Filter options
+            col1, col2 = st.columns(2)
+            with col1:
+                status_filter = st.multiselect(
+                    "Filter by Status",
+                    options=['Pending', 'Approved', 'Rejected'],
+                    default=['Pending', 'Approved', 'Rejected']
+                )
+            
+            with col2:
+                leave_type_filter = st.multiselect(
+                    "Filter by Leave Type",
+                    options=leaves_df['leave_type'].unique().tolist(),
+                    default=leaves_df['leave_type'].unique().tolist()
+                )
+            
+            # Apply filters
+            filtered_df = leaves_df[
+                (leaves_df['status'].isin(status_filter)) &
+                (leaves_df['leave_type'].isin(leave_type_filter))
+            ]
+            
+            filtered_df = filtered_df.sort_values('applied_date', ascending=False)
+            
+            st.dataframe(
+                filtered_df[['request_id', 'leave_type', 'start_date', 'end_date', 'days', 'reason', 'status', 'applied_date']],
+                column_config={
+                    "request_id": "Request ID",
+                    "leave_type": "Leave Type",
+                    "start_date": st.column_config.DateColumn("Start Date"),
+                    "end_date": st.column_config.DateColumn("End Date"),
+                    "days": "Days",
+                    "reason": "Reason",
+                    "status": "Status",
+                    "applied_date": "Applied On"
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+            
+            st.info(f"📊 Showing {len(filtered_df)} of {len(leaves_df)} leave requests")
+        else:
+            st.info("No leave requests found.")
+
+@st.fragment(key="approve_leaves")
+def approve_leaves():
+    with fragment_rerun("leave_management.py", "approve_leaves"):
+        mark_watched_drawn()
+        user = st.session_state.user
+        st.header("✅ Approve Leave Requests")
+        
+        # Counts come from the store's indexes; only the window of
+        # requests on screen is joined and sent to the grid
+        pending_count = count_leave_requests(status='Pending')
+        
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            st.subheader(f"Pending Requests ({pending_count})")
+        with col2:
+            show_all = st.checkbox("Show All Requests")
+        
+        status = None if show_all else 'Pending'
+        total = count_leave_requests(status=status) if show_all else pending_count
+        
+        if total:
+            rows = queue_window(total, key="manager_queue")
+            approval_queue(
+                get_all_leave_requests(status=status, rows=rows),
+                key="manager_queue",
+                id_column='request_id',
+                write=lambda decisions: update_leave_statuses(decisions, user['emp_id']),
+                refresh=("approve_leaves",),
+                column_config={
+                    "request_id": "Request ID",
+                    "name": "Employee",
+                    "department": "Department",
+                    "leave_type": "Leave Type",
+                    "start_date": st.column_config.DateColumn("Start Date"),
+                    "end_date": st.column_config.DateColumn("End Date"),
+                    "days": "Days",
+                    "reason": "Reason",
+                    "status": "Status",
+                    "applied_date": st.column_config.DatetimeColumn("Applied On")
+                }
+            )
+        else:
+            st.info("No leave requests found." if show_all else "No pending leave requests.")
+
+@st.fragment(key="team_calendar")
+def team_calendar():
+    with fragment_rerun("leave_management.py", "team_calendar"):
+        user = st.session_state.user
+        st.header("📅 Team Calendar")
+        
+        store = get_store()
+        departments = store.departments()
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            department = st.selectbox(
+                "Department",
+                options=["All Departments"] + departments,
+                index=departments.index(user['department']) + 1 if user['department'] in departments else 0
+            )
+        with col2:
+            calendar_from = st.date_input("From", value=datetime.now().date(), key="calendar_from")
+        with col3:
+            calendar_to = st.date_input("To", value=datetime.now().date() + timedelta(days=30), key="calendar_to")
+        
+        if calendar_from > calendar_to:
+            st.error("❌ End date must be after start date!")
+        else:
+            department = None if department == "All Departments" else department
+            absences_df = get_team_absences(calendar_from, calendar_to, department)
+            out = daily_absences(absences_df, calendar_from, calendar_to,
+                                 get_calendars().for_department(department))
+            headcount = store.headcount(department)
+            
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Headcount", headcount)
+            col2.metric("Most Out on One Day", int(out.max()) if not out.empty else 0)
+            col3.metric("Lowest Coverage", f"{1 - out.max() / headcount:.0%}" if headcount and not out.empty else "-")
+            
+            if not out.empty:
+                st.bar_chart(out.rename("People out"))
+            
+            if not absences_df.empty:
+                st.dataframe(
+                    absences_df[['name', 'department', 'leave_type', 'start_date', 'end_date', 'days', 'status']]
+                        .sort_values('start_date'),
+                    column_config={
+                        "name": "Employee",
+                        "department": "Department",
+                        "leave_type": "Leave Type",
+                        "start_date": st.column_config.DateColumn("Start Date"),
+                        "end_date": st.column_config.DateColumn("End Date"),
+                        "days": "Days",
+                        "status": "Status"
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+            else:
+                st.info("Nobody is out in this period.")
+
 # Streamlit UI
 def main():
     st.set_page_config(
@@ -143,11 +444,12 @@ def main():
         layout="wide"
     )
     
-    # Initialize data
-    init_data()
+    # Shared data store
+    get_store()
     
     # Custom CSS
-    st.markdown("""
+    with section("css"):
+        st.markdown("""
         <style>
         .main-header {
             font-size: 2.5rem;
@@ -196,7 +498,11 @@ def main():
                 
                 if submit:
                     if email and password:
-                        user = authenticate_user(email, password)
+                        try:
+                            user = authenticate_user(email, password)
+                        except LoginThrottled as e:
+                            st.error(f"❌ {e}.")
+                            st.stop()
                         if user:
                             st.session_state.logged_in = True
                             st.session_state.user = user
@@ -226,214 +532,49 @@ def main():
         
         st.divider()
         
-        # Navigation tabs
+        # The open tab is drawn at this change sequence
+        mark_watched_drawn()
+        live_updates(latest_change, "manager_queue", "leave_management.py", watched_emp_id(user))
+        
+        # Navigation tabs; only the open tab's sections run
         if user['role'] == 'Manager':
-            tab1, tab2, tab3, tab4 = st.tabs(["📊 Dashboard", "➕ Apply Leave", "📋 My Leaves", "✅ Approve Leaves"])
+            tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Dashboard", "➕ Apply Leave", "📋 My Leaves", "✅ Approve Leaves", "📅 Team Calendar"],
+                                                   key="dashboard_tab", on_change="rerun")
         else:
-            tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "➕ Apply Leave", "📋 My Leaves"])
+            tab1, tab2, tab3 = st.tabs(["📊 Dashboard", "➕ Apply Leave", "📋 My Leaves"],
+                                       key="dashboard_tab", on_change="rerun")
         
         # Dashboard Tab
-        with tab1:
-            st.header("📊 Leave Dashboard")
-            
-            stats = get_leave_statistics(user['emp_id'])
-            
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.markdown(f"""
-                    <div class="stat-card" style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);">
-                        <div class="stat-value">{stats['total']}</div>
-                        <div class="stat-label">Total Leaves</div>
-                    </div>
-                """, unsafe_allow_html=True)
-            
-            with col2:
-                st.markdown(f"""
-                    <div class="stat-card" style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);">
-                        <div class="stat-value">{stats['used']}</div>
-                        <div class="stat-label">Used Leaves</div>
-                    </div>
-                """, unsafe_allow_html=True)
-            
-            with col3:
-                st.markdown(f"""
-                    <div class="stat-card" style="background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);">
-                        <div class="stat-value">{stats['available']}</div>
-                        <div class="stat-label">Available Leaves</div>
-                    </div>
-                """, unsafe_allow_html=True)
-            
-            st.markdown("---")
-            
-            # Recent leave requests
-            st.subheader("📅 Recent Leave Requests")
-            leaves_df = get_employee_leaves(user['emp_id'])
-            
-            if not leaves_df.empty:
-                display_df = leaves_df.copy()
-                display_df = display_df.sort_values('applied_date', ascending=False)
-                
-                st.dataframe(
-                    display_df[['request_id', 'leave_type', 'start_date', 'end_date', 'days', 'reason', 'status']],
-                    column_config={
-                        "request_id": "Request ID",
-                        "leave_type": "Leave Type",
-                        "start_date": "Start Date",
-                        "end_date": "End Date",
-                        "days": "Days",
-                        "reason": "Reason",
-                        "status": "Status"
-                    },
-                    hide_index=True,
-                    use_container_width=True
-                )
-            else:
-                st.info("No leave requests found.")
+        if tab1.open:
+            with tab1:
+                st.header("📊 Leave Dashboard")
+                leave_stats()
+                st.markdown("---")
+                recent_requests()
         
         # Apply Leave Tab
-        with tab2:
-            st.header("➕ Apply for Leave")
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                leave_type = st.selectbox(
-                    "Leave Type",
-                    ["Casual Leave", "Sick Leave", "Annual Leave", "Maternity Leave", "Paternity Leave"]
-                )
-                start_date = st.date_input("Start Date", min_value=datetime.now().date())
-            
-            with col2:
-                end_date = st.date_input("End Date", min_value=datetime.now().date())
-                
-            reason = st.text_area("Reason for Leave", placeholder="Please provide a reason for your leave request...")
-            
-            if st.button("Submit Leave Request", type="primary", use_container_width=True):
-                if start_date > end_date:
-                    st.error("❌ End date must be after start date!")
-                elif not reason.strip():
-                    st.error("❌ Please provide a reason for your leave request!")
-                else:
-                    days_requested = (end_date - start_date).days + 1
-                    stats = get_leave_statistics(user['emp_id'])
-                    
-                    if days_requested > stats['available']:
-                        st.error(f"❌ Insufficient leave balance! You have only {stats['available']} days available.")
-                    else:
-                        apply_leave(user['emp_id'], leave_type, start_date, end_date, reason)
-                        st.success(f"✅ Leave request submitted successfully for {days_requested} days!")
-                        st.balloons()
+        if tab2.open:
+            with tab2:
+                apply_leave_form()
         
         # My Leaves Tab
-        with tab3:
-            st.header("📋 My Leave History")
-            
-            leaves_df = get_employee_leaves(user['emp_id'])
-            
-            if not leaves_df.empty:
-                # Filter options
-                col1, col2 = st.columns(2)
-                with col1:
-                    status_filter = st.multiselect(
-                        "Filter by Status",
-                        options=['Pending', 'Approved', 'Rejected'],
-                        default=['Pending', 'Approved', 'Rejected']
-                    )
-                
-                with col2:
-                    leave_type_filter = st.multiselect(
-                        "Filter by Leave Type",
-                        options=leaves_df['leave_type'].unique(),
-                        default=leaves_df['leave_type'].unique()
-                    )
-                
-                # Apply filters
-                filtered_df = leaves_df[
-                    (leaves_df['status'].isin(status_filter)) &
-                    (leaves_df['leave_type'].isin(leave_type_filter))
-                ]
-                
-                filtered_df = filtered_df.sort_values('applied_date', ascending=False)
-                
-                st.dataframe(
-                    filtered_df[['request_id', 'leave_type', 'start_date', 'end_date', 'days', 'reason', 'status', 'applied_date']],
-                    column_config={
-                        "request_id": "Request ID",
-                        "leave_type": "Leave Type",
-                        "start_date": "Start Date",
-                        "end_date": "End Date",
-                        "days": "Days",
-                        "reason": "Reason",
-                        "status": "Status",
-                        "applied_date": "Applied On"
-                    },
-                    hide_index=True,
-                    use_container_width=True
-                )
-                
-                st.info(f"📊 Showing {len(filtered_df)} of {len(leaves_df)} leave requests")
-            else:
-                st.info("No leave requests found.")
+        if tab3.open:
+            with tab3:
+                leave_history()
         
-        # Approve Leaves Tab (Manager only)
+        # Manager only tabs
         if user['role'] == 'Manager':
-            with tab4:
-                st.header("✅ Approve Leave Requests")
-                
-                all_leaves_df = get_all_leave_requests()
-                
-                if not all_leaves_df.empty:
-                    # Filter for pending requests
-                    pending_df = all_leaves_df[all_leaves_df['status'] == 'Pending']
-                    
-                    col1, col2 = st.columns([2, 1])
-                    with col1:
-                        st.subheader(f"Pending Requests ({len(pending_df)})")
-                    with col2:
-                        show_all = st.checkbox("Show All Requests")
-                    
-                    display_df = all_leaves_df if show_all else pending_df
-                    
-                    if not display_df.empty:
-                        for idx, row in display_df.iterrows():
-                            with st.container():
-                                col1, col2, col3, col4 = st.columns([2, 2, 3, 2])
-                                
-                                with col1:
-                                    st.write(f"**{row['name']}**")
-                                    st.caption(f"{row['department']}")
-                                
-                                with col2:
-                                    st.write(f"**{row['leave_type']}**")
-                                    st.caption(f"{row['days']} days")
-                                
-                                with col3:
-                                    st.write(f"{row['start_date']} to {row['end_date']}")
-                                    st.caption(f"Reason: {row['reason']}")
-                                
-                                with col4:
-                                    if row['status'] == 'Pending':
-                                        col_a, col_b = st.columns(2)
-                                        with col_a:
-                                            if st.button("✅", key=f"approve_{row['request_id']}", use_container_width=True):
-                                                update_leave_status(row['request_id'], 'Approved', user['emp_id'])
-                                                st.success("Approved!")
-                                                st.rerun()
-                                        with col_b:
-                                            if st.button("❌", key=f"reject_{row['request_id']}", use_container_width=True):
-                                                update_leave_status(row['request_id'], 'Rejected', user['emp_id'])
-                                                st.error("Rejected!")
-                                                st.rerun()
-                                    else:
-                                        status_color = "green" if row['status'] == 'Approved' else "red"
-                                        st.markdown(f":{status_color}[{row['status']}]")
-                                
-                                st.divider()
-                    else:
-                        st.info("No pending leave requests.")
-                else:
-                    st.info("No leave requests found.")
+            if tab4.open:
+                with tab4:
+                    approve_leaves()
+            
+            if tab5.open:
+                with tab5:
+                    team_calendar()
 
 if __name__ == "__main__":
-    main()
+    begin_rerun("leave_management.py")
+    try:
+        main()
+    finally:
+        end_rerun()
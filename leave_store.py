@@ -0,0 +1,611 @@
+import bisect
+import json
+import os
+from array import array
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import TimedLock
+from team_calendar import ABSENT_STATUSES, IntervalIndex, to_day
+
+# Registered up front, so the categories of a frame never grow after it
+# is returned; other values are still accepted and appended
+STATUSES = ('Pending', 'Approved', 'Rejected')
+LEAVE_TYPES = ('Casual Leave', 'Sick Leave', 'Annual Leave', 'Maternity Leave', 'Paternity Leave')
+
+class OverlapError(ValueError):
+    """A Pending or Approved request would share days with another one"""
+
+    def __init__(self, existing):
+        self.existing = existing
+        super().__init__(f"Overlaps request {existing['request_id']} "
+                         f"({existing['start_date']} to {existing['end_date']})")
+
+
+class StatusError(ValueError):
+    """A decision on a request that is no longer Pending, or a no-op reopen"""
+
+
+class BalanceError(ValueError):
+    """A request needs more days than the employee has left"""
+
+    def __init__(self, available):
+        self.available = available
+        super().__init__(f"Insufficient leave balance. Available: {available} days")
+
+
+class _Codes:
+    """Categorical column: integer codes plus the list of distinct labels.
+
+    Codes start as int8 and widen as labels are added, always matching the
+    width pandas picks for that many categories, so categorical() can wrap
+    them without a copy.
+    """
+
+    def __init__(self, capacity, labels=()):
+        self.codes = np.empty(capacity, np.int8)
+        self.labels = []
+        self._lookup = {}
+        self._dtype = None
+        for label in labels:
+            self.encode(label)
+
+    def encode(self, value):
+        if value is None:
+            return -1
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.labels)
+            self.labels.append(value)
+            if code > np.iinfo(self.codes.dtype).max:
+                wider = np.int16 if self.codes.dtype == np.int8 else np.int32
+                self.codes = self.codes.astype(wider)
+        return code
+
+    def code_of(self, value):
+        """Existing code of a label, or None if it has never been seen"""
+        return self._lookup.get(value)
+
+    def decode(self, code):
+        return None if code < 0 else self.labels[code]
+
+    def grow(self, capacity):
+        self.codes = np.resize(self.codes, capacity)
+
+    def categorical(self, codes):
+        # The dtype is rebuilt only when new labels appear; validate=False
+        # keeps the codes a view instead of a checked copy
+        if self._dtype is None or len(self._dtype.categories) != len(self.labels):
+            self._dtype = pd.CategoricalDtype(self.labels)
+        return pd.Categorical.from_codes(codes, dtype=self._dtype, validate=False)
+
+
+class RequestColumns:
+    """Leave requests as growable typed columns.
+
+    Ids are int32, dates datetime64[s], status and leave type categorical
+    codes, so a request costs tens of bytes instead of a dict of Python
+    strings. The reason is free text, nearly always unique, so it stays a
+    plain object column rather than a category per request.
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.capacity = capacity
+        self.request_id = np.empty(capacity, np.int32)
+        self.emp_id = np.empty(capacity, np.int32)
+        self.start_date = np.empty(capacity, 'datetime64[s]')
+        self.end_date = np.empty(capacity, 'datetime64[s]')
+        self.days = np.empty(capacity, np.int16)
+        self.applied_date = np.empty(capacity, 'datetime64[s]')
+        self.approved_by = np.empty(capacity, np.int32)
+        self.approved_missing = np.empty(capacity, np.bool_)
+        self.reason = np.empty(capacity, object)
+        self.leave_type = _Codes(capacity, LEAVE_TYPES)
+        self.status = _Codes(capacity, STATUSES)
+
+    def _grow(self):
+        self.capacity *= 2
+        for name in ('request_id', 'emp_id', 'start_date', 'end_date', 'days',
+                     'applied_date', 'approved_by', 'approved_missing', 'reason'):
+            setattr(self, name, np.resize(getattr(self, name), self.capacity))
+        for codes in (self.leave_type, self.status):
+            codes.grow(self.capacity)
+
+    def append(self, req):
+        """Append one request dict; returns its row position"""
+        if self.size == self.capacity:
+            self._grow()
+        pos = self.size
+        self.request_id[pos] = req['request_id']
+        self.emp_id[pos] = req['emp_id']
+        self.start_date[pos] = np.datetime64(req['start_date'], 's')
+        self.end_date[pos] = np.datetime64(req['end_date'], 's')
+        self.days[pos] = req['days']
+        self.applied_date[pos] = np.datetime64(req['applied_date'], 's')
+        self.set_approved_by(pos, req.get('approved_by'))
+        self.leave_type.codes[pos] = self.leave_type.encode(req['leave_type'])
+        self.status.codes[pos] = self.status.encode(req['status'])
+        self.reason[pos] = req.get('reason')
+        self.size += 1
+        return pos
+
+    def set_approved_by(self, pos, manager_id):
+        self.approved_missing[pos] = manager_id is None
+        self.approved_by[pos] = 0 if manager_id is None else manager_id
+
+    def position(self, request_id):
+        """Row of a request_id; ids are appended in increasing order"""
+        n = self.size
+        pos = int(np.searchsorted(self.request_id[:n], np.int32(request_id)))
+        if pos < n and self.request_id[pos] == request_id:
+            return pos
+        return None
+
+    def row(self, pos):
+        """One request as a plain dict of JSON-friendly values"""
+        return {
+            'request_id': int(self.request_id[pos]),
+            'emp_id': int(self.emp_id[pos]),
+            'leave_type': self.leave_type.decode(self.leave_type.codes[pos]),
+            'start_date': str(self.start_date[pos].astype('datetime64[D]')),
+            'end_date': str(self.end_date[pos].astype('datetime64[D]')),
+            'days': int(self.days[pos]),
+            'reason': self.reason[pos],
+            'status': self.status.decode(self.status.codes[pos]),
+            'applied_date': str(self.applied_date[pos]).replace('T', ' '),
+            'approved_by': None if self.approved_missing[pos] else int(self.approved_by[pos]),
+        }
+
+    def frame(self, positions=None):
+        """DataFrame over all rows or the given positions.
+
+        Columns that are only ever appended to are wrapped without copying.
+        Status and approved_by are rewritten in place by status changes, so
+        those are copied: a frame never changes after it is returned.
+        """
+        n = self.size
+        if positions is None:
+            take = lambda column: column[:n]
+            snapshot = lambda column: column[:n].copy()
+        else:
+            positions = np.asarray(positions, dtype=np.intp)
+            take = snapshot = lambda column: column[:n][positions]
+        return pd.DataFrame({
+            'request_id': take(self.request_id),
+            'emp_id': take(self.emp_id),
+            'leave_type': self.leave_type.categorical(take(self.leave_type.codes)),
+            'start_date': take(self.start_date),
+            'end_date': take(self.end_date),
+            'days': take(self.days),
+            # An explicit object dtype skips pandas inferring a string column
+            'reason': pd.Series(take(self.reason), dtype=object, copy=False),
+            'status': self.status.categorical(snapshot(self.status.codes)),
+            'applied_date': take(self.applied_date),
+            'approved_by': pd.arrays.IntegerArray(snapshot(self.approved_by), snapshot(self.approved_missing)),
+        }, copy=False)
+
+    def nbytes(self):
+        """Memory held by the column buffers, reason strings and category labels"""
+        arrays = (self.request_id, self.emp_id, self.start_date, self.end_date, self.days,
+                  self.applied_date, self.approved_by, self.approved_missing, self.reason,
+                  self.leave_type.codes, self.status.codes)
+        strings = self.leave_type.labels + self.status.labels + [
+            reason for reason in self.reason[:self.size] if reason is not None]
+        return sum(a.nbytes for a in arrays) + sum(len(string) + 49 for string in strings)
+
+
+class LeaveStore:
+    """Process-wide employees and leave requests, shared by every session.
+
+    All access goes through the lock; readers get copies or DataFrames
+    over the request columns, never the mutable employee dicts. This base
+    class keeps everything in memory; subclasses persist by overriding
+    _record() and _load().
+
+    Lookups go through indexes kept in step with every write: email and
+    employee hash maps, request_id by binary search over the id column, and
+    a set of still-Pending rows with the days they reserve per employee.
+    Other status filters are vectorized scans of the int8 status codes,
+    which costs less than a per-row index.
+    Pending and Approved date ranges are held in one interval index per
+    department for team calendar overlap queries, and in a sorted list
+    per employee for the apply-time overlap check.
+
+    Every new request and status change also takes the next change
+    sequence number, overall and per employee, so sessions can poll
+    latest_change() to notice writes without reading any requests.
+    """
+
+    def __init__(self):
+        self._lock = TimedLock('store')
+        self.employees = {}
+        self.requests = RequestColumns()
+        self.next_request_id = 1
+        # Indexes
+        self._emp_by_email = {}
+        self._positions_by_emp = defaultdict(lambda: array('i'))
+        self._open_positions = set()  # rows still Pending
+        self._pending_days_by_emp = defaultdict(int)  # days reserved by Pending rows
+        self._employees_frame = None  # rebuilt when an employee is added
+        self._absences_by_dept = defaultdict(IntervalIndex)  # row positions by date range
+        self._headcount = defaultdict(int)
+        self._active_ranges_by_emp = defaultdict(list)  # sorted (start_day, end_day, pos)
+        self._change_seq = 0
+        self._latest_change_by_emp = {}
+        self._load()
+
+    # Persistence hooks
+    def _load(self):
+        pass
+
+    def _record(self, *events):
+        pass
+
+    # Writes
+    def is_empty(self):
+        with self._lock:
+            return not self.employees
+
+    def seed(self, employees, leave_requests):
+        """Load initial data into an empty store"""
+        with self._lock:
+            for emp in employees.values():
+                self._put_employee(dict(emp))
+                self._record({'op': 'employee', **emp})
+            for req in leave_requests:
+                self._put_request(req)
+                self._record({'op': 'request', **req})
+
+    def add_request(self, request):
+        """Store a new request, assigning its request_id; returns a copy.
+
+        Raises OverlapError if a Pending or Approved request would share
+        days with another of the employee's, and BalanceError if it needs
+        more days than the employee has left. Both checks run under the
+        lock, so concurrent submissions cannot spend the same days.
+        """
+        with self._lock:
+            if request['status'] in ABSENT_STATUSES:
+                self._check_overlap(request['emp_id'], request['start_date'], request['end_date'])
+                self._check_balance(request['emp_id'], request['days'])
+            request = dict(request, request_id=self.next_request_id)
+            self._put_request(request)
+            self._record({'op': 'request', **request})
+            return request
+
+    def update_status(self, request_id, status, manager_id):
+        """Set a request's status, charging approved days to the employee.
+
+        Returns False if the request is missing or the change was refused.
+        """
+        updated, failures = self.update_statuses({request_id: status}, manager_id)
+        return bool(updated)
+
+    def update_statuses(self, statuses, manager_id):
+        """Apply {request_id: status} under one lock, journaled in one write.
+
+        Approved and Rejected apply to Pending requests only, so a decision
+        made from a stale page cannot overturn one made since; Pending
+        reopens a decided request. Returns the request ids that were updated and a dict of
+        request_id -> reason for the ones that were not.
+        """
+        updated, failures, events = [], {}, []
+        with self._lock:
+            for request_id, status in statuses.items():
+                request_id = int(request_id)
+                pos = self.requests.position(request_id)
+                if pos is None:
+                    failures[request_id] = "Leave request not found"
+                    continue
+                try:
+                    self._change_status(pos, status, manager_id)
+                except (OverlapError, StatusError, BalanceError) as e:
+                    failures[request_id] = str(e)
+                    continue
+                updated.append(request_id)
+                events.append({'op': 'status', 'request_id': request_id,
+                               'status': status, 'approved_by': manager_id})
+            if events:
+                self._record(*events)
+        return updated, failures
+
+    def set_password(self, emp_id, password, expected):
+        """Replace an employee's password hash if it is still `expected`"""
+        with self._lock:
+            emp = self.employees.get(emp_id)
+            if emp is None or emp['password'] != expected:
+                return False
+            emp['password'] = password
+            self._record({'op': 'password', 'emp_id': emp_id, 'password': password})
+            return True
+
+    # Reads
+    def get_employee(self, emp_id):
+        with self._lock:
+            emp = self.employees.get(emp_id)
+            return dict(emp) if emp else None
+
+    def find_employee_by_email(self, email):
+        with self._lock:
+            emp_id = self._emp_by_email.get(email)
+            return dict(self.employees[emp_id]) if emp_id is not None else None
+
+    def requests_frame(self, emp_id=None, status=None, rows=None):
+        """Leave requests as a DataFrame, optionally for one employee or status.
+
+        rows, a slice, keeps only that window of the matching requests.
+        """
+        with self._lock:
+            positions = self._matching(emp_id, status)
+            if rows is not None:
+                positions = (np.arange(*rows.indices(self.requests.size)) if positions is None
+                             else positions[rows])
+            return self.requests.frame(positions)
+
+    def count_requests(self, status=None):
+        with self._lock:
+            if status == 'Pending':
+                return len(self._open_positions)
+            positions = self._matching(None, status)
+            return self.requests.size if positions is None else len(positions)
+
+    def _matching(self, emp_id, status):
+        """Row positions of the requests of emp_id and/or status, or None for all rows"""
+        if emp_id is None and status is None:
+            return None
+        positions = None
+        if emp_id is not None:
+            positions = np.array(self._positions_by_emp.get(emp_id, ()), dtype=np.intp)
+        if status is not None:
+            # Pending rows come from the index while they are a small share
+            # of history; otherwise a vectorized scan of the status codes
+            # beats sorting the set
+            if status == 'Pending' and len(self._open_positions) * 16 < self.requests.size:
+                with_status = np.fromiter(sorted(self._open_positions), dtype=np.intp,
+                                          count=len(self._open_positions))
+            else:
+                code = self.requests.status.code_of(status)
+                codes = self.requests.status.codes[:self.requests.size]
+                with_status = np.flatnonzero(codes == code) if code is not None else np.empty(0, np.intp)
+            positions = with_status if positions is None else np.intersect1d(positions, with_status)
+        return positions
+
+    def employees_frame(self):
+        """emp_id, name and department of every employee as a DataFrame"""
+        with self._lock:
+            if self._employees_frame is None:
+                employees = list(self.employees.values())
+                self._employees_frame = pd.DataFrame({
+                    'emp_id': np.fromiter((emp['emp_id'] for emp in employees), dtype=np.int32,
+                                          count=len(employees)),
+                    'name': [emp['name'] for emp in employees],
+                    'department': pd.Categorical([emp['department'] for emp in employees]),
+                })
+            return self._employees_frame.copy(deep=False)
+
+    def requests_with_employees(self, status=None, rows=None):
+        """Requests joined to their employee's name and department.
+
+        The status filter and the rows window are applied to the request
+        columns before the join, so the merge only touches those rows.
+        """
+        requests = self.requests_frame(status=status, rows=rows)
+        return requests.merge(self.employees_frame(), how='left', on='emp_id', sort=False)
+
+    def absences(self, start_date, end_date, department=None):
+        """Pending and Approved requests overlapping [start_date, end_date], with employees"""
+        with self._lock:
+            departments = [department] if department is not None else list(self._absences_by_dept)
+            positions = np.concatenate([np.empty(0, np.intp)] + [
+                self._absences_by_dept[dept].overlapping(start_date, end_date)
+                for dept in departments if dept in self._absences_by_dept])
+            requests = self.requests.frame(np.sort(positions))
+            return requests.merge(self.employees_frame(), how='left', on='emp_id', sort=False)
+
+    def headcount(self, department=None):
+        with self._lock:
+            if department is None:
+                return len(self.employees)
+            return self._headcount.get(department, 0)
+
+    def departments(self):
+        with self._lock:
+            return sorted(dept for dept, count in self._headcount.items() if count)
+
+    def find_overlap(self, emp_id, start_date, end_date):
+        """The employee's Pending or Approved request sharing a day with the range, or None.
+
+        A binary search finds the ranges starting on or before end_date;
+        any of them may reach start_date, as loaded history can overlap
+        itself, so they are checked from the latest start back.
+        """
+        with self._lock:
+            ranges = self._active_ranges_by_emp.get(emp_id)
+            if not ranges:
+                return None
+            first_day = to_day(start_date)
+            i = bisect.bisect_right(ranges, (to_day(end_date), float('inf')))
+            for j in range(i - 1, -1, -1):
+                if ranges[j][1] >= first_day:
+                    return self.requests.row(ranges[j][2])
+            return None
+
+    def _check_overlap(self, emp_id, start_date, end_date):
+        existing = self.find_overlap(emp_id, start_date, end_date)
+        if existing is not None:
+            raise OverlapError(existing)
+
+    def available_balance(self, emp_id):
+        """Days an employee can still request: total - used - reserved by pending requests"""
+        with self._lock:
+            return self._available(emp_id)
+
+    def latest_change(self, emp_id=None):
+        """Sequence number of the newest change to one employee's requests, or to any; 0 if none"""
+        with self._lock:
+            if emp_id is None:
+                return self._change_seq
+            return self._latest_change_by_emp.get(emp_id, 0)
+
+    def all_employees(self):
+        with self._lock:
+            return {emp_id: dict(emp) for emp_id, emp in self.employees.items()}
+
+    # Internal state changes, shared by the public writes and replay.
+    # These are the only places that touch the indexes.
+    def _put_employee(self, emp):
+        old = self.employees.get(emp['emp_id'])
+        if old is not None:
+            self._emp_by_email.pop(old['email'], None)
+            self._headcount[old['department']] -= 1
+        self.employees[emp['emp_id']] = emp
+        self._headcount[emp['department']] += 1
+        self._emp_by_email[emp['email']] = emp['emp_id']
+        self._employees_frame = None
+
+    def _put_request(self, req):
+        pos = self.requests.append(req)
+        self.next_request_id = max(self.next_request_id, req['request_id'] + 1)
+        self._positions_by_emp[req['emp_id']].append(pos)
+        if req['status'] == 'Pending':
+            self._open_positions.add(pos)
+            self._pending_days_by_emp[req['emp_id']] += req['days']
+        if req['status'] in ABSENT_STATUSES:
+            self._absences_for(req['emp_id']).add(pos, req['start_date'], req['end_date'])
+            bisect.insort(self._active_ranges_by_emp[req['emp_id']],
+                          (to_day(req['start_date']), to_day(req['end_date']), pos))
+        self._changed(req['emp_id'])
+
+    def _change_status(self, pos, status, manager_id):
+        """_set_status for a decision on a Pending request or a reopen.
+
+        Raises StatusError for a decision on an already decided request,
+        and OverlapError or BalanceError if reopening a Rejected one would
+        clash with another active request or exceed the balance.
+        """
+        columns = self.requests
+        old_status = columns.status.decode(columns.status.codes[pos])
+        if status == 'Pending' and old_status == 'Pending':
+            raise StatusError("Leave request is already pending")
+        if status != 'Pending' and old_status != 'Pending':
+            raise StatusError(f"Leave request already decided ({old_status})")
+        if old_status not in ABSENT_STATUSES:
+            emp_id = int(columns.emp_id[pos])
+            self._check_overlap(emp_id, columns.start_date[pos], columns.end_date[pos])
+            self._check_balance(emp_id, int(columns.days[pos]))
+        self._set_status(pos, status, manager_id)
+
+    def _available(self, emp_id):
+        emp = self.employees[emp_id]
+        return emp['total_leaves'] - emp['used_leaves'] - self._pending_days_by_emp.get(emp_id, 0)
+
+    def _check_balance(self, emp_id, days):
+        available = self._available(emp_id)
+        if days > available:
+            raise BalanceError(available)
+
+    def _absences_for(self, emp_id):
+        emp = self.employees.get(emp_id)
+        return self._absences_by_dept[emp['department'] if emp else None]
+
+    def _set_status(self, pos, status, manager_id):
+        columns = self.requests
+        old_code = int(columns.status.codes[pos])
+        new_code = columns.status.encode(status)
+        was_absent = columns.status.decode(old_code) in ABSENT_STATUSES
+        if was_absent != (status in ABSENT_STATUSES):
+            emp_id = int(columns.emp_id[pos])
+            active_range = (to_day(columns.start_date[pos]), to_day(columns.end_date[pos]), pos)
+            ranges = self._active_ranges_by_emp[emp_id]
+            if was_absent:
+                self._absences_for(emp_id).discard(pos)
+                i = bisect.bisect_left(ranges, active_range)
+                if i < len(ranges) and ranges[i] == active_range:
+                    del ranges[i]
+            else:
+                self._absences_for(emp_id).add(pos, columns.start_date[pos], columns.end_date[pos])
+                bisect.insort(ranges, active_range)
+        # Approved days are charged to used_leaves, Pending ones reserved
+        emp_id, days = int(columns.emp_id[pos]), int(columns.days[pos])
+        old_status = columns.status.decode(old_code)
+        if old_status != status:
+            if status == 'Approved':
+                self.employees[emp_id]['used_leaves'] += days
+            elif old_status == 'Approved':
+                self.employees[emp_id]['used_leaves'] -= days
+            if status == 'Pending':
+                self._pending_days_by_emp[emp_id] += days
+            elif old_status == 'Pending':
+                self._pending_days_by_emp[emp_id] -= days
+        if status == 'Pending':
+            self._open_positions.add(pos)
+        else:
+            self._open_positions.discard(pos)
+        columns.status.codes[pos] = new_code
+        columns.set_approved_by(pos, manager_id)
+        self._changed(int(columns.emp_id[pos]))
+
+    def _changed(self, emp_id):
+        self._change_seq += 1
+        self._latest_change_by_emp[emp_id] = self._change_seq
+
+
+class JsonlLeaveStore(LeaveStore):
+    """LeaveStore persisted as an append-only JSON-lines journal.
+
+    Every write appends one event, so a write costs O(1) regardless of
+    history size. On start the journal is replayed and then compacted to
+    one line per employee and request.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._journal = None
+        super().__init__()
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        self._replay(json.loads(line))
+            self.compact()
+        self._journal = open(self.path, 'a', encoding='utf-8')
+
+    def _replay(self, event):
+        op = event.pop('op')
+        if op == 'employee':
+            self._put_employee(event)
+        elif op == 'request':
+            self._put_request(event)
+        elif op == 'password':
+            if event['emp_id'] in self.employees:
+                self.employees[event['emp_id']]['password'] = event['password']
+        elif op == 'status':
+            pos = self.requests.position(event['request_id'])
+            if pos is not None:
+                self._set_status(pos, event['status'], event['approved_by'])
+
+    def _record(self, *events):
+        if self._journal is None:
+            return
+        self._journal.writelines(json.dumps(event) + '\n' for event in events)
+        self._journal.flush()
+
+    def compact(self):
+        """Rewrite the journal as a snapshot of the current state"""
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for emp in self.employees.values():
+                    f.write(json.dumps({'op': 'employee', **emp}) + '\n')
+                for pos in range(self.requests.size):
+                    f.write(json.dumps({'op': 'request', **self.requests.row(pos)}) + '\n')
+            if self._journal is not None:
+                self._journal.close()
+            os.replace(tmp_path, self.path)
+            if self._journal is not None:
+                self._journal = open(self.path, 'a', encoding='utf-8')
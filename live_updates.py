@@ -0,0 +1,40 @@
+"""Live dashboard updates shared by app.py and leave_management.py.
+
+Every new request and status change takes the next number in a change
+sequence, which each app reads with its own latest_change(emp_id). The
+page records the number it is drawn at with mark_drawn(), and the
+live_updates() fragment polls it every LIVE_POLL_SECONDS, rerunning the
+page only once it moves past that: for emp_id, changes to that
+employee's requests; for None, any change.
+"""
+import os
+
+import streamlit as st
+
+from approval_queue import has_edits
+from instrumentation import fragment_rerun
+
+LIVE_POLL_SECONDS = float(os.environ.get('LEAVE_POLL_SECONDS', '10'))
+
+def mark_drawn(latest_change, emp_id=None):
+    """Record the change sequence, before the data about to be drawn is read"""
+    st.session_state.drawn_at_change = latest_change(emp_id)
+
+@st.fragment(key="live_updates", run_every=LIVE_POLL_SECONDS)
+def live_updates(latest_change, queue_key, script, emp_id=None):
+    """Rerun the page once the changes it watches move past what it was drawn at.
+
+    Held back while the approval grid `queue_key` has unsaved decisions:
+    they are keyed by row position and would land on other requests once
+    new rows arrive. `script` names the app in the instrumentation.
+    """
+    with fragment_rerun(script, "live_updates"):
+        seq = latest_change(emp_id)
+        if seq <= st.session_state.drawn_at_change:
+            return
+        if has_edits(queue_key):
+            if st.session_state.get('announced_change') != seq:
+                st.session_state.announced_change = seq
+                st.toast("New leave activity; the page refreshes once your decisions are saved.", icon="🔔")
+            return
+        st.rerun()
@@ -0,0 +1,310 @@
+"""Headless load test of app.py and leave_management.py.
+
+Usage: python loadtest.py <app|store> [options]
+
+Runs --users concurrent sessions, each a Streamlit AppTest that logs in
+and then performs --actions interactions picked from a weighted mix:
+employees view their dashboard and apply for leave, approvers (the admin
+in app.py, managers in leave_management.py) view, filter and approve
+requests.
+
+The app runs against a synthetic organisation of --employees employees
+and --rows leave requests from synthetic_data.py, written to a throwaway
+database or store in a temp directory, never to leave_management.db or
+leave_store.jsonl.
+
+Reports throughput, p50/p95/p99 latency per action and overall, and the
+time spent waiting for the database write lock, a pooled connection or
+the store lock (from instrumentation.py, switched on for the run).
+--max-p95 exits with status 1 if the overall p95 exceeds that many
+milliseconds, so the run can gate a release.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+# Point both apps at scratch data before db.py and leave_management.py read their paths
+SCRATCH_DIR = tempfile.mkdtemp(prefix='leave_load_')
+os.environ.setdefault('LEAVE_DB_PATH', os.path.join(SCRATCH_DIR, 'load.db'))
+os.environ.setdefault('LEAVE_STORE_PATH', os.path.join(SCRATCH_DIR, 'load_store.jsonl'))
+
+import numpy as np
+from streamlit import config as streamlit_config
+from streamlit.logger import set_log_level
+from streamlit.proto.Dataframe_pb2 import Dataframe as DataframeProto
+from streamlit.testing.v1 import AppTest
+
+import instrumentation
+import synthetic_data
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'password123'
+ADMIN_PASSWORD = 'admin123'  # app.py's sample admin
+# Synthetic data
+def leave_span(rng, first_day, span_days):
+    """A Monday-to-Friday leave of 1-5 days starting within span_days of first_day"""
+    start = first_day + timedelta(days=rng.randrange(span_days))
+    if start.weekday() >= 5:
+        start += timedelta(days=7 - start.weekday())
+    days = rng.randint(1, 5 - start.weekday())
+    return start, start + timedelta(days=days - 1), days
+
+def seed_organization(target, employees, rows, seed):
+    """Generate and write the target's synthetic data; returns (employee accounts, approver accounts)"""
+    rng = np.random.default_rng(seed)
+    org = synthetic_data.Organization(employees, rng)
+    history = synthetic_data.generate_history(org, rows, target.leave_types, rng)
+    if target is APP:
+        synthetic_data.write_sqlite(org, history, PASSWORD)
+        return org.app_ids().tolist(), ['ADMIN']
+    synthetic_data.write_store(os.environ['LEAVE_STORE_PATH'], org, history, PASSWORD)
+    return ([email for email, manager in zip(org.emails, org.is_manager) if not manager],
+            [email for email, manager in zip(org.emails, org.is_manager) if manager])
+
+# Interactions. Each runs the script at least once and returns the name
+# it is reported under.
+def widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+def log_in(at, account, password):
+    at.text_input[0].input(account)
+    at.text_input[1].input(password)
+    widget(at.button, "Login").click().run()
+    if any(w.label == "Password" for w in at.text_input):
+        raise RuntimeError(f"Could not log in as {account}")
+    return 'login'
+
+def open_tab(at, *names):
+    """Switch to the dashboard tab whose label ends with one of names, if another one is open"""
+    if at.session_state['dashboard_tab'].endswith(names):
+        return
+    if not at.tabs:
+        # After a run that redrew only fragments AppTest holds just those
+        at.run()
+    at.session_state['dashboard_tab'] = next(tab.label for tab in at.tabs if tab.label.endswith(names))
+    at.run()
+
+def view(at, rng):
+    at.run()
+    return 'view'
+
+def apply(at, rng):
+    open_tab(at, "Apply Leave")
+    start, end, _ = leave_span(rng, date.today() + timedelta(days=1), 365)
+    widget(at.date_input, "Start Date").set_value(start)
+    widget(at.date_input, "End Date").set_value(end)
+    at.text_area[0].input("Load test")
+    widget(at.button, "Submit Leave Request").click().run()
+    return 'apply'
+
+def approval_grid(at):
+    return next((grid for grid in at.dataframe
+                 if grid.proto.editing_mode != DataframeProto.EditingMode.READ_ONLY), None)
+
+def run_with_grid_edits(at, grid, edited_rows):
+    """Run with cells of a data_editor grid edited.
+
+    AppTest has no data_editor widget, so the grid's state is added to
+    the other widgets' states here, in the form the browser sends it.
+    """
+    states = at._tree.get_widget_states()
+    state = states.widgets.add()
+    state.id = grid.proto.id
+    state.string_value = json.dumps({'edited_rows': edited_rows, 'added_rows': [], 'deleted_rows': []})
+    at._run(states)
+
+def approve(at, rng):
+    open_tab(at, "All Leave Requests", "Approve Leaves")
+    grid = approval_grid(at)
+    pending = [] if grid is None else np.flatnonzero(grid.value['status'].to_numpy() == 'Pending').tolist()
+    if not pending:
+        return view(at, rng)
+    # Decide a few rows, then submit them as one batch: two reruns, as in
+    # the browser, which reruns on each edit
+    edits = {row: {'Action': rng.choice(["Approve", "Reject"])} for row in rng.sample(pending, min(3, len(pending)))}
+    run_with_grid_edits(at, grid, edits)
+    next(button for button in at.button if button.key and button.key.endswith('_queue_submit')).click()
+    run_with_grid_edits(at, approval_grid(at), edits)
+    return 'approve'
+
+def filter_status(at, rng):
+    widget(at.selectbox, "Filter by Status").set_value(rng.choice(["All", "Pending", "Approved", "Rejected"])).run()
+    return 'filter'
+
+
+class Target:
+    """A script under test: how to seed it and the action mix per role"""
+
+    def __init__(self, script, leave_types, employee_mix, approver_mix):
+        self.script = os.path.join(HERE, script)
+        self.leave_types = leave_types
+        self.mixes = {'employee': employee_mix, 'approver': approver_mix}
+
+
+APP = Target('app.py', synthetic_data.APP_LEAVE_TYPES,
+             employee_mix={view: 6, apply: 1},
+             approver_mix={view: 3, filter_status: 1, approve: 2})
+STORE = Target('leave_management.py', synthetic_data.STORE_LEAVE_TYPES,
+               employee_mix={view: 6, apply: 1},
+               approver_mix={view: 3, approve: 2})
+TARGETS = {'app': APP, 'store': STORE}
+
+def accounts(target_name, args):
+    """(account, password, role) per simulated user, after seeding the target's data"""
+    rng = random.Random(args.seed)
+    approvers = max(1, round(args.users * args.approver_share))
+    employees, managers = seed_organization(TARGETS[target_name], args.employees, args.rows, args.seed)
+    manager_password = ADMIN_PASSWORD if target_name == 'app' else PASSWORD
+    return ([(managers[i % len(managers)], manager_password, 'approver') for i in range(approvers)] +
+            [(account, PASSWORD, 'employee') for account in rng.sample(employees, args.users - approvers)])
+
+# Load generation. AppTest keeps per-run state in module globals (the
+# Runtime singleton), so sessions cannot share a process: each simulated
+# user runs in its own spawned process, and they meet at a barrier before
+# the first interaction. app.py sessions share the SQLite database as
+# separate server processes would. leave_management.py keeps its store in
+# process memory, so each of its sessions works on a private copy of the
+# seeded journal.
+_start_barrier = None
+
+def init_session_process(barrier):
+    global _start_barrier
+    _start_barrier = barrier
+    quiet_streamlit()
+    instrumentation.enable(True)
+
+def quiet_streamlit():
+    # Deprecation warnings would otherwise be logged on every rerun of every session
+    streamlit_config.set_option('logger.level', 'error')
+    set_log_level('error')
+
+def run_session(target_name, account, password, role, index, args):
+    """One simulated user: open the app, log in, then perform args.actions interactions.
+
+    Returns (samples, instrumentation totals of the process); a sample is
+    (action, start time, seconds, error or None).
+    """
+    target = TARGETS[target_name]
+    rng = random.Random(args.seed * 100_003 + index)
+    mix = target.mixes[role]
+    actions, weights = list(mix), list(mix.values())
+    samples = []
+    if target_name == 'store':
+        path = f"{os.environ['LEAVE_STORE_PATH']}.{index}"
+        shutil.copyfile(os.environ['LEAVE_STORE_PATH'], path)
+        os.environ['LEAVE_STORE_PATH'] = path
+    at = AppTest.from_file(target.script, default_timeout=args.timeout)
+    _start_barrier.wait(timeout=600)
+    time.sleep(args.ramp * index / args.users)
+
+    def record(label, perform):
+        started_at, start = time.time(), time.perf_counter()
+        try:
+            name = perform()
+        except Exception as e:
+            samples.append((label, started_at, time.perf_counter() - start, repr(e)))
+            return False
+        error = at.exception[0].message if at.exception else None
+        samples.append((name, started_at, time.perf_counter() - start, error))
+        return error is None
+
+    if record('open', lambda: at.run() and 'open') and record('login', lambda: log_in(at, account, password)):
+        for _ in range(args.actions):
+            if args.think:
+                time.sleep(rng.expovariate(1 / args.think))
+            action = rng.choices(actions, weights)[0]
+            if not record(action.__name__, lambda: action(at, rng)):
+                break
+    return samples, instrumentation.process_totals()
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+def summarize(samples):
+    """Per-action and overall count, errors and latency percentiles in ms"""
+    by_action = {}
+    for name, _, seconds, error in samples:
+        by_action.setdefault(name, []).append((seconds, error))
+    by_action['all'] = [(seconds, error) for _, _, seconds, error in samples]
+    summary = {}
+    for name, rows in by_action.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in rows)
+        summary[name] = {'count': len(rows), 'errors': sum(error is not None for _, error in rows),
+                         'p50_ms': percentile(latencies, 0.50), 'p95_ms': percentile(latencies, 0.95),
+                         'p99_ms': percentile(latencies, 0.99)}
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('target', choices=sorted(TARGETS), help="app: app.py on SQLite, store: leave_management.py")
+    parser.add_argument('--users', type=int, default=8, help="concurrent sessions, one process each")
+    parser.add_argument('--actions', type=int, default=20, help="interactions per session after logging in")
+    parser.add_argument('--approver-share', type=float, default=0.2, help="share of sessions that approve requests")
+    parser.add_argument('--employees', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=20_000, help="seeded leave requests")
+    parser.add_argument('--think', type=float, default=0.0, help="mean seconds between a session's interactions")
+    parser.add_argument('--ramp', type=float, default=0.0, help="seconds over which sessions start")
+    parser.add_argument('--timeout', type=float, default=120.0, help="seconds allowed per script run")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the summary to this file")
+    parser.add_argument('--max-p95', type=float, help="exit with status 1 if overall p95 exceeds this many ms")
+    args = parser.parse_args(argv)
+    quiet_streamlit()
+
+    start = time.perf_counter()
+    sessions = accounts(args.target, args)
+    print(f"Seeded {args.employees:,} employees and {args.rows:,} requests in {time.perf_counter() - start:.1f} s")
+
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(len(sessions))
+    with ProcessPoolExecutor(len(sessions), mp_context=context,
+                             initializer=init_session_process, initargs=(barrier,)) as pool:
+        futures = [pool.submit(run_session, args.target, *session, i, args) for i, session in enumerate(sessions)]
+        results = [future.result() for future in futures]
+    samples = [sample for session_samples, _ in results for sample in session_samples]
+    totals = [session_totals for _, session_totals in results]
+    elapsed = max(started_at + seconds for _, started_at, seconds, _ in samples) - min(s[1] for s in samples)
+
+    summary = summarize(samples)
+    print(f"{os.path.basename(TARGETS[args.target].script)}: {len(sessions)} sessions, {len(samples)} interactions "
+          f"in {elapsed:.1f} s, {len(samples) / elapsed:.1f} interactions/s")
+    print(f"{'action':<10} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in summary.items():
+        print(f"{name:<10} {row['count']:>7} {row['errors']:>7} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    reruns = sum(t['reruns'] for t in totals)
+    if reruns:
+        print(f"script reruns: {reruns}, mean {sum(t['rerun_seconds'] for t in totals) / reruns * 1000:.1f} ms, "
+              f"{sum(t['sql_statements'] for t in totals) / reruns:.1f} SQL statements each")
+    locks = {}
+    for t in totals:
+        for name, count in t['lock_acquisitions'].items():
+            row = locks.setdefault(name, {'acquisitions': 0, 'wait_seconds': 0.0})
+            row['acquisitions'] += count
+            row['wait_seconds'] += t['lock_seconds'][name]
+    for name, row in sorted(locks.items()):
+        print(f"lock {name:<8} {row['acquisitions']:>8} acquisitions, {row['wait_seconds'] * 1000:9.1f} ms waiting")
+    errors = [(name, error) for name, _, _, error in samples if error is not None]
+    for name, error in errors[:5]:
+        print(f"error in {name}: {error}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'target': args.target, 'users': len(sessions), 'employees': args.employees, 'rows': args.rows,
+                       'seconds': elapsed, 'throughput': len(samples) / elapsed,
+                       'actions': summary, 'locks': locks}, f, indent=2)
+    if args.max_p95 is not None and summary['all']['p95_ms'] > args.max_p95:
+        print(f"p95 {summary['all']['p95_ms']:.1f} ms exceeds --max-p95 {args.max_p95:.1f} ms")
+        return 1
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+"""Seeded synthetic organisations and leave history for scale testing.
+
+Usage: python synthetic_data.py {sqlite,store} PATH [options]
+
+Generates --employees employees across departments, in teams of
+TEAM_SIZE led by a manager, and --rows leave requests. Start dates follow
+a seasonal pattern per leave type (summer and year-end holidays, winter
+sickness), lengths are whole working days under the holiday calendars,
+and requests are made a type-dependent notice period ahead. Leave that
+has started is Approved or Rejected; leave still ahead is mostly
+Pending. A request overlapping an earlier one of the same employee is
+Rejected, so an employee's active leave never overlaps, and so is a
+Pending request that would reserve more days than the employee has left.
+
+The same --seed, sizes and --today always give the same data. Generation
+is vectorized with numpy. The writers then stream it in chunks, either
+into app.py's SQLite database (leave_requests indexes deferred as in
+import_data.py) or into a new leave_management.py store journal. Every
+generated employee has the password --password, hashed once.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+from itertools import repeat
+
+import numpy as np
+
+from credentials import hash_password
+from working_days import get_calendars
+
+# Share of headcount per department
+DEPARTMENTS = {
+    'Engineering': 0.30, 'Sales': 0.15, 'Operations': 0.12, 'Support': 0.12,
+    'Marketing': 0.10, 'Finance': 0.08, 'HR': 0.07, 'Legal': 0.06,
+}
+TEAM_SIZE = 8  # employees per manager, the manager included
+POSITIONS = ('Associate', 'Specialist', 'Senior Specialist', 'Principal')
+POSITION_WEIGHTS = (0.35, 0.35, 0.2, 0.1)
+ANNUAL_ALLOWANCES = (20, 22, 25)
+FIRST_NAMES = ('James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David',
+               'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah',
+               'Wei', 'Aisha', 'Carlos', 'Priya', 'Kenji', 'Fatima', 'Olga', 'Mateo', 'Amara', 'Lars')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson',
+              'Chen', 'Khan', 'Patel', 'Tanaka', 'Silva', 'Novak', 'Okafor', 'Larsen', 'Rossi', 'Kim')
+STORE_FIRST_ID = 10_001  # leave_management.py's demo employees are 1001-1007
+
+# Leave requests per employee per year; sets how far back the history goes
+REQUESTS_PER_YEAR = 6
+FUTURE_DAYS = 90  # requests are made up to this far ahead
+
+# Relative weight of each month as a leave start, January first
+SEASONS = {
+    'holidays': (3, 3, 5, 6, 6, 10, 16, 15, 7, 5, 4, 20),
+    'winter': (16, 14, 10, 7, 5, 4, 4, 4, 6, 8, 10, 12),
+    'flat': (1,) * 12,
+}
+
+STATUSES = ('Pending', 'Approved', 'Rejected')
+PENDING, APPROVED, REJECTED = range(3)
+# Status shares of leave that has started and of leave still ahead
+PAST_STATUSES = (0.0, 0.88, 0.12)
+FUTURE_STATUSES = (0.70, 0.25, 0.05)
+
+class LeaveType:
+    """How often a leave type is taken, when, for how long and at what notice"""
+
+    def __init__(self, name, share, season, days, notice, reasons):
+        self.name = name
+        self.share = share
+        self.season = season
+        self.days = days  # (min, max) working days
+        self.notice = notice  # (min, max) days between applying and the start
+        self.reasons = reasons  # written into JSON unescaped: no quotes or backslashes
+
+
+APP_LEAVE_TYPES = (
+    LeaveType('Vacation', 0.45, 'holidays', (1, 10), (7, 60),
+              ('Family vacation', 'Summer holiday', 'Trip abroad', 'Year-end break')),
+    LeaveType('Sick Leave', 0.30, 'winter', (1, 3), (0, 0),
+              ('Flu', 'Medical appointment', 'Recovering from illness')),
+    LeaveType('Personal Leave', 0.15, 'flat', (1, 2), (2, 14),
+              ('Personal matters', 'Moving house', 'Family event')),
+    LeaveType('Emergency Leave', 0.05, 'flat', (1, 2), (0, 1), ('Family emergency', 'Home repair')),
+    LeaveType('Other', 0.05, 'flat', (1, 3), (3, 21), ('Training course', 'Volunteering', 'Jury duty')),
+)
+STORE_LEAVE_TYPES = (
+    LeaveType('Annual Leave', 0.45, 'holidays', (1, 10), (7, 60),
+              ('Family vacation', 'Summer holiday', 'Trip abroad', 'Year-end break')),
+    LeaveType('Sick Leave', 0.30, 'winter', (1, 3), (0, 0),
+              ('Flu', 'Medical appointment', 'Recovering from illness')),
+    LeaveType('Casual Leave', 0.21, 'flat', (1, 2), (1, 14),
+              ('Personal work', 'Moving house', 'Family function')),
+    LeaveType('Paternity Leave', 0.03, 'flat', (5, 10), (30, 90), ('Birth of a child',)),
+    LeaveType('Maternity Leave', 0.01, 'flat', (40, 60), (30, 90), ('Birth of a child',)),
+)
+
+
+class Organization:
+    """Generated employees as parallel arrays, indexed 0..size-1 and grouped by department"""
+
+    def __init__(self, size, rng):
+        self.department_names = list(DEPARTMENTS)
+        if size < len(self.department_names):
+            raise ValueError(f"Need at least {len(self.department_names)} employees, one per department")
+        self.size = size
+        counts = np.maximum(1, np.floor(np.array(list(DEPARTMENTS.values())) * size).astype(int))
+        counts[0] += size - counts.sum()
+        self.department = np.repeat(np.arange(len(counts), dtype=np.int8), counts)
+        heads = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        index = np.arange(size)
+        rank = index - heads[self.department]  # position within the department
+        self.is_manager = rank % TEAM_SIZE == 0
+        # Who decides each employee's requests: their team's manager; for
+        # managers the department head, and for a head the next department's
+        self.approver = np.where(self.is_manager, heads[self.department], index - rank % TEAM_SIZE)
+        self.approver[heads] = np.roll(heads, -1)
+
+        first = rng.integers(len(FIRST_NAMES), size=size)
+        last = rng.integers(len(LAST_NAMES), size=size)
+        self.names = [f"{FIRST_NAMES[f]} {LAST_NAMES[l]}" for f, l in zip(first.tolist(), last.tolist())]
+        self.emails = [f"{FIRST_NAMES[f]}.{LAST_NAMES[l]}{n + 1}@acme.com".lower()
+                       for n, (f, l) in enumerate(zip(first.tolist(), last.tolist()))]
+        position = rng.choice(len(POSITIONS), size=size, p=POSITION_WEIGHTS)
+        self.positions = [f"{self.department_names[d]} Manager" if manager else POSITIONS[p]
+                          for d, manager, p in zip(self.department.tolist(), self.is_manager.tolist(),
+                                                   position.tolist())]
+        self.total_leaves = rng.choice(ANNUAL_ALLOWANCES, size=size)
+
+    def departments(self):
+        return [self.department_names[d] for d in self.department.tolist()]
+
+    def app_ids(self):
+        """emp_id values in app.py's database"""
+        return np.array([f"EMP{n + 1:06d}" for n in range(self.size)], dtype=object)
+
+    def store_ids(self):
+        """emp_id values in leave_management.py's store"""
+        return STORE_FIRST_ID + np.arange(self.size)
+
+    def used_leaves(self, history):
+        """Approved working days taken so far this year, at most the allowance"""
+        return self.used_days(history.today, history.emp, history.start, history.days, history.status)
+
+    def used_days(self, today, emp, start, days, status):
+        """used_leaves over the request arrays, before they make up a LeaveHistory"""
+        taken = (status == APPROVED) & (start <= today) & (start >= today.astype('datetime64[Y]'))
+        used = np.bincount(emp[taken], weights=days[taken], minlength=self.size)
+        return np.minimum(used.astype(int), self.total_leaves)
+
+
+class LeaveHistory:
+    """Generated leave requests as parallel arrays, in the order they were made"""
+
+    def __init__(self, leave_types, today, emp, leave_type, start, end, days, reason, status, applied, decided):
+        self.leave_types = leave_types
+        self.today = today
+        self.emp = emp
+        self.leave_type = leave_type
+        self.start = start
+        self.end = end
+        self.days = days
+        self.reason = reason
+        self.status = status
+        self.applied = applied
+        self.decided = decided
+        self.reasons = [reason for leave in leave_types for reason in leave.reasons]
+
+    def __len__(self):
+        return len(self.emp)
+
+
+def seasonal_dates(rng, n, first, last, month_weights):
+    """n dates in [first, last] whose months follow month_weights, by rejection sampling"""
+    accept = np.asarray(month_weights, dtype=float) / max(month_weights)
+    span = int((last - first).astype(int)) + 1
+    out = np.empty(n, dtype='datetime64[D]')
+    filled = 0
+    while filled < n:
+        draw = first + rng.integers(span, size=2 * (n - filled))
+        month = draw.astype('datetime64[M]').astype(int) % 12
+        kept = draw[rng.random(draw.size) < accept[month]][:n - filled]
+        out[filled:filled + kept.size] = kept
+        filled += kept.size
+    return out
+
+def by_type(rng, leave_type, leave_types, draw):
+    """One value per request from draw(leave, rng, count), drawn per leave type"""
+    out = None
+    for t, leave in enumerate(leave_types):
+        rows = np.flatnonzero(leave_type == t)
+        values = draw(leave, rng, rows.size)
+        if out is None:
+            out = np.empty(leave_type.size, dtype=values.dtype)
+        out[rows] = values
+    return out
+
+def generate_history(org, rows, leave_types, rng, today=None):
+    """rows leave requests of org's employees, from about rows / (size * REQUESTS_PER_YEAR)
+    years ago to FUTURE_DAYS ahead of today"""
+    today = np.datetime64(today or date.today(), 'D')
+    now = (today + 1).astype('datetime64[s]') - 1
+    years = rows / (org.size * REQUESTS_PER_YEAR)
+    first, last = today - int(years * 365.25), today + FUTURE_DAYS
+
+    emp = rng.integers(org.size, size=rows, dtype=np.int32)
+    leave_type = rng.choice(len(leave_types), size=rows, p=[leave.share for leave in leave_types]).astype(np.int8)
+    start = by_type(rng, leave_type, leave_types,
+                    lambda leave, rng, n: seasonal_dates(rng, n, first, last, SEASONS[leave.season]))
+    days = by_type(rng, leave_type, leave_types,
+                   lambda leave, rng, n: rng.integers(leave.days[0], leave.days[1] + 1, size=n, dtype=np.int16))
+    notice = by_type(rng, leave_type, leave_types,
+                     lambda leave, rng, n: rng.integers(leave.notice[0], leave.notice[1] + 1, size=n))
+
+    # Working-day spans under each department's calendar
+    calendars = get_calendars()
+    end = np.empty(rows, dtype='datetime64[D]')
+    department = org.department[emp]
+    for d, name in enumerate(org.department_names):
+        requests = np.flatnonzero(department == d)
+        calendar = calendars.for_department(name)
+        start[requests] = calendar.roll_forward(start[requests])
+        end[requests] = calendar.end_dates(start[requests], days[requests])
+
+    # Applied during office hours; requests that would be made after now
+    # were made during the last week instead
+    applied = (start - notice).astype('datetime64[s]') + rng.integers(8 * 3600, 19 * 3600, size=rows)
+    applied = np.minimum(applied, now - rng.integers(7 * 86400, size=rows))
+
+    status = np.where(start <= today,
+                      rng.choice(3, size=rows, p=PAST_STATUSES),
+                      rng.choice(3, size=rows, p=FUTURE_STATUSES)).astype(np.int8)
+    # Reject every request that overlaps an earlier one of the same employee.
+    # Sorted by (employee, start), with the employee as the high part of
+    # one key, a running maximum of end days never crosses employees
+    order = np.lexsort((start, emp))
+    key = emp[order].astype(np.int64) << 32
+    latest_end = np.maximum.accumulate(key + end[order].astype(np.int64))
+    clashes = key[1:] + start[order][1:].astype(np.int64) <= latest_end[:-1]
+    status[order[1:][clashes]] = REJECTED
+
+    # Pending requests reserve their days: keep each employee's earliest
+    # made ones while they fit in what is left of the allowance, and
+    # reject the rest, so total - used - pending days never goes negative
+    remaining = org.total_leaves - org.used_days(today, emp, start, days, status)
+    pending = np.flatnonzero(status == PENDING)
+    pending = pending[np.lexsort((applied[pending], emp[pending]))]
+    reserved = np.cumsum(days[pending], dtype=np.int64)
+    firsts = np.flatnonzero(np.r_[True, emp[pending][1:] != emp[pending][:-1]])
+    reserved -= np.repeat(reserved[firsts] - days[pending][firsts], np.diff(np.r_[firsts, pending.size]))
+    status[pending[reserved > remaining[emp[pending]]]] = REJECTED
+
+    decided = np.minimum(applied + rng.integers(3600, 5 * 86400, size=rows), now)
+    decided[status == PENDING] = np.datetime64('NaT')
+    offsets = np.cumsum([0] + [len(leave.reasons) for leave in leave_types])
+    counts = np.diff(offsets)
+    reason = (offsets[:-1][leave_type] + rng.integers(counts[leave_type])).astype(np.int16)
+
+    # Ids follow the order requests were made in
+    order = np.argsort(applied, kind='stable')
+    return LeaveHistory(leave_types, today, emp[order], leave_type[order], start[order], end[order], days[order],
+                        reason[order], status[order], applied[order], decided[order])
+
+# Writers
+def date_strings(days):
+    return np.datetime_as_string(days).tolist()
+
+def timestamp_strings(times):
+    """'YYYY-MM-DD HH:MM:SS', the format of CURRENT_TIMESTAMP; None for NaT"""
+    return [None if text == 'NaT' else text.replace('T', ' ')
+            for text in np.datetime_as_string(times, unit='s').tolist()]
+
+def chunks(history, chunk_size):
+    for start in range(0, len(history), chunk_size):
+        yield slice(start, start + chunk_size)
+
+def write_sqlite(org, history, password, chunk_size=500_000, progress=None):
+    """Add the organisation and its history to app.py's database at LEAVE_DB_PATH"""
+    import db  # reads LEAVE_DB_PATH on first import
+
+    db.bootstrap()
+    emp_ids = org.app_ids()
+    password_hash = hash_password(password)
+    with db.transaction() as conn:
+        if conn.execute("SELECT 1 FROM employees WHERE emp_id = ?", (emp_ids[0],)).fetchone():
+            raise ValueError(f"{db.DB_PATH} already has generated employees")
+        first_new_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM leave_requests").fetchone()[0]
+        conn.executemany(
+            '''INSERT INTO employees
+               (emp_id, name, email, department, position, password, total_leaves, used_leaves)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            zip(emp_ids.tolist(), org.names, org.emails, org.departments(), org.positions,
+                repeat(password_hash), org.total_leaves.tolist(), org.used_leaves(history).tolist()))
+        deferred = db.defer_leave_indexes(conn)
+
+    leave_types = np.array([leave.name for leave in history.leave_types], dtype=object)
+    reasons = np.array(history.reasons, dtype=object)
+    statuses = np.array(STATUSES, dtype=object)
+    # app.py's admin decides every request
+    approvers = np.array(['ADMIN', 'ADMIN', 'ADMIN'], dtype=object)
+    approvers[PENDING] = None
+    try:
+        for rows in chunks(history, chunk_size):
+            with db.transaction() as conn:
+                conn.executemany(
+                    '''INSERT INTO leave_requests
+                       (emp_id, leave_type, start_date, end_date, days, reason, status,
+                        applied_date, approved_by, approved_date)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                    zip(emp_ids[history.emp[rows]].tolist(), leave_types[history.leave_type[rows]].tolist(),
+                        date_strings(history.start[rows]), date_strings(history.end[rows]),
+                        history.days[rows].tolist(), reasons[history.reason[rows]].tolist(),
+                        statuses[history.status[rows]].tolist(), timestamp_strings(history.applied[rows]),
+                        approvers[history.status[rows]].tolist(), timestamp_strings(history.decided[rows])))
+            if progress:
+                progress(min(rows.stop, len(history)))
+    finally:
+        with db.transaction() as conn:
+            db.restore_leave_indexes(conn, deferred)
+            conn.execute(db.FILL_LEAVE_INTERVALS_SQL + " AND id > ?", (first_new_id,))
+            db.rebuild_counters(conn)
+    with db.connection() as conn:
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("ANALYZE")
+
+# One journal line per request, formatted directly: every string in it
+# comes from this module and needs no JSON escaping
+STORE_REQUEST_LINE = ('{"op": "request", "request_id": %d, "emp_id": %d, "leave_type": "%s", '
+                      '"start_date": "%s", "end_date": "%s", "days": %d, "reason": "%s", "status": "%s", '
+                      '"applied_date": "%s", "approved_by": %s}\n')
+
+def write_store(path, org, history, password, chunk_size=500_000, progress=None):
+    """Write the organisation and its history as a new leave_management.py store journal"""
+    emp_ids = org.store_ids()
+    password_hash = hash_password(password)
+    approvers = emp_ids[org.approver].astype(str).astype(object)
+    used_leaves = org.used_leaves(history)
+    leave_types = np.array([leave.name for leave in history.leave_types], dtype=object)
+    reasons = np.array(history.reasons, dtype=object)
+    statuses = np.array(STATUSES, dtype=object)
+    # 'x' refuses to overwrite an existing store
+    with open(path, 'x', encoding='utf-8') as f:
+        for n, (emp_id, department) in enumerate(zip(emp_ids.tolist(), org.departments())):
+            f.write(json.dumps({'op': 'employee', 'emp_id': emp_id, 'name': org.names[n], 'email': org.emails[n],
+                                'password': password_hash, 'department': department,
+                                'role': 'Manager' if org.is_manager[n] else 'Employee',
+                                'total_leaves': int(org.total_leaves[n]), 'used_leaves': int(used_leaves[n])}) + '\n')
+        for rows in chunks(history, chunk_size):
+            emp = history.emp[rows]
+            status = history.status[rows]
+            approved_by = np.where(status == PENDING, 'null', approvers[emp])
+            f.writelines(STORE_REQUEST_LINE % row for row in zip(
+                range(rows.start + 1, rows.start + len(emp) + 1), emp_ids[emp].tolist(),
+                leave_types[history.leave_type[rows]].tolist(),
+                date_strings(history.start[rows]), date_strings(history.end[rows]), history.days[rows].tolist(),
+                reasons[history.reason[rows]].tolist(), statuses[status].tolist(),
+                timestamp_strings(history.applied[rows]), approved_by.tolist()))
+            if progress:
+                progress(min(rows.stop, len(history)))
+
+WRITERS = {
+    'sqlite': (APP_LEAVE_TYPES, lambda args, org, history, progress:
+               write_sqlite(org, history, args.password, args.chunk_size, progress)),
+    'store': (STORE_LEAVE_TYPES, lambda args, org, history, progress:
+              write_store(args.path, org, history, args.password, args.chunk_size, progress)),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('format', choices=sorted(WRITERS), help="sqlite: app.py database, store: leave_management.py journal")
+    parser.add_argument('path', help="database to add to (created if missing), or store journal to create")
+    parser.add_argument('--employees', type=int, default=10_000)
+    parser.add_argument('--rows', type=int, default=1_000_000, help="leave requests")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--today', type=date.fromisoformat, default=date.today(),
+                        help="date the history leads up to, YYYY-MM-DD (default: today)")
+    parser.add_argument('--password', default='password123', help="password of every generated employee")
+    parser.add_argument('--chunk-size', type=int, default=500_000)
+    args = parser.parse_args(argv)
+    if args.format == 'sqlite':
+        os.environ['LEAVE_DB_PATH'] = args.path
+    leave_types, write = WRITERS[args.format]
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(args.seed)
+    org = Organization(args.employees, rng)
+    history = generate_history(org, args.rows, leave_types, rng, args.today)
+    print(f"Generated {args.employees:,} employees and {len(history):,} requests "
+          f"in {time.perf_counter() - start:.1f} s", flush=True)
+
+    start = time.perf_counter()
+
+    def progress(done):
+        elapsed = time.perf_counter() - start
+        print(f"  {done:,} requests written, {done / elapsed:,.0f} rows/s", flush=True)
+
+    write(args, org, history, progress)
+    print(f"Wrote {args.path} in {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    sys.exit(main())
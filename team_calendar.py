@@ -0,0 +1,194 @@
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Apply Leave warns when a department would have fewer than this share of
+# its people in on any working day of the requested range
+MIN_COVERAGE = float(os.environ.get('LEAVE_MIN_COVERAGE', '0.5'))
+
+# Requests in these statuses keep someone out of the office
+ABSENT_STATUSES = ('Pending', 'Approved')
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def to_day(value):
+    """Date, datetime, datetime64 or ISO string as days since 1970-01-01"""
+    # Plain Python conversions for the common types; numpy scalars are slow
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10]).toordinal() - _EPOCH_ORDINAL
+    if isinstance(value, date):
+        return value.toordinal() - _EPOCH_ORDINAL
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+class IntervalIndex:
+    """Closed day intervals [start, end] keyed by integer, queried by overlap.
+
+    Intervals live in an implicit augmented interval tree: an array sorted
+    by start where the node at index x on level k (x has k trailing one
+    bits) covers x +/- 2**k - 1 and stores the latest end in that subtree.
+    An overlap query visits O(log n + k) nodes; subtrees of up to
+    2**(LEAF_LEVEL + 1) - 1 intervals are scanned with numpy instead of
+    walked.
+
+    New intervals collect in an unsorted buffer that is scanned on every
+    query and merged into the tree once it reaches 1/16 of the tree size,
+    so bulk loads rebuild O(log n) times. Discarded keys are masked in
+    the tree and dropped at the next rebuild.
+    """
+
+    LEAF_LEVEL = 10
+    MIN_BUFFER = 1024
+
+    def __init__(self):
+        self._keys = np.empty(0, np.int64)
+        self._starts = np.empty(0, np.int64)
+        self._ends = np.empty(0, np.int64)
+        self._max_end = np.empty(0, np.int64)
+        self._alive = np.empty(0, np.bool_)
+        self._key_order = np.empty(0, np.intp)
+        self._sorted_keys = np.empty(0, np.int64)
+        self._buffer_keys = np.empty(self.MIN_BUFFER, np.int64)
+        self._buffer_starts = np.empty(self.MIN_BUFFER, np.int64)
+        self._buffer_ends = np.empty(self.MIN_BUFFER, np.int64)
+        self._buffered = 0
+        self._dead = 0
+
+    def __len__(self):
+        return len(self._keys) - self._dead + self._buffered
+
+    def add(self, key, start_date, end_date):
+        if self._buffered == len(self._buffer_keys):
+            if self._buffered >= max(self.MIN_BUFFER, len(self._keys) // 16):
+                self._rebuild()
+            else:
+                capacity = 2 * len(self._buffer_keys)
+                self._buffer_keys = np.resize(self._buffer_keys, capacity)
+                self._buffer_starts = np.resize(self._buffer_starts, capacity)
+                self._buffer_ends = np.resize(self._buffer_ends, capacity)
+        m = self._buffered
+        self._buffer_keys[m] = key
+        self._buffer_starts[m] = to_day(start_date)
+        self._buffer_ends[m] = to_day(end_date)
+        self._buffered += 1
+
+    def discard(self, key):
+        """Remove every interval stored under key"""
+        m = self._buffered
+        in_buffer = np.flatnonzero(self._buffer_keys[:m] == key)
+        if len(in_buffer):
+            keep = np.ones(m, np.bool_)
+            keep[in_buffer] = False
+            self._buffered = int(keep.sum())
+            for column in (self._buffer_keys, self._buffer_starts, self._buffer_ends):
+                column[:self._buffered] = column[:m][keep]
+        lo = np.searchsorted(self._sorted_keys, key, side='left')
+        hi = np.searchsorted(self._sorted_keys, key, side='right')
+        for pos in self._key_order[lo:hi]:
+            if self._alive[pos]:
+                self._alive[pos] = False
+                self._dead += 1
+
+    def overlapping(self, start_date, end_date):
+        """Keys of the intervals that share at least one day with [start_date, end_date]"""
+        start, end = to_day(start_date), to_day(end_date)
+        m = self._buffered
+        in_buffer = (self._buffer_starts[:m] <= end) & (self._buffer_ends[:m] >= start)
+        hits = self._tree_query(start, end)
+        hits = hits[self._alive[hits]]
+        return np.concatenate((self._keys[hits], self._buffer_keys[:m][in_buffer]))
+
+    def _tree_query(self, start, end):
+        n = len(self._starts)
+        if n == 0:
+            return np.empty(0, np.intp)
+        found = []
+        level = n.bit_length() - 1
+        stack = [((1 << level) - 1, level, False)]
+        while stack:
+            x, k, left_done = stack.pop()
+            if k <= self.LEAF_LEVEL:
+                lo, hi = x - (1 << k) + 1, min(x + (1 << k), n)
+                if lo < hi:
+                    # Starts are sorted, so the block ends at the first start past `end`
+                    stop = lo + int(np.searchsorted(self._starts[lo:hi], end, side='right'))
+                    found.append(lo + np.flatnonzero(self._ends[lo:stop] >= start))
+            elif not left_done:
+                stack.append((x, k, True))
+                left = x - (1 << (k - 1))
+                if left >= n or self._max_end[left] >= start:
+                    stack.append((left, k - 1, False))
+            elif x < n and self._starts[x] <= end:
+                if self._ends[x] >= start:
+                    found.append(np.array([x], np.intp))
+                stack.append((x + (1 << (k - 1)), k - 1, False))
+        return np.concatenate(found) if found else np.empty(0, np.intp)
+
+    def _rebuild(self):
+        alive = self._alive
+        m = self._buffered
+        keys = np.concatenate((self._keys[alive], self._buffer_keys[:m]))
+        starts = np.concatenate((self._starts[alive], self._buffer_starts[:m]))
+        ends = np.concatenate((self._ends[alive], self._buffer_ends[:m]))
+        order = np.argsort(starts, kind='stable')
+        self._keys, self._starts, self._ends = keys[order], starts[order], ends[order]
+        n = len(self._keys)
+        self._alive = np.ones(n, np.bool_)
+        self._key_order = np.argsort(self._keys, kind='stable')
+        self._sorted_keys = self._keys[self._key_order]
+        self._dead = 0
+        self._buffered = 0
+
+        # Latest end per subtree, one vectorized pass per level. A sentinel
+        # keeps reduceat's exclusive bounds in range at the right edge.
+        self._max_end = self._ends.copy()
+        padded = np.append(self._ends, np.iinfo(np.int64).min)
+        k = 1
+        while (1 << k) - 1 < n:
+            nodes = np.arange((1 << k) - 1, n, 1 << (k + 1))
+            bounds = np.empty(2 * len(nodes), np.intp)
+            bounds[0::2] = nodes - (1 << k) + 1
+            bounds[1::2] = np.minimum(nodes + (1 << k), n)
+            self._max_end[nodes] = np.maximum.reduceat(padded, bounds)[0::2]
+            k += 1
+
+
+def daily_absences(absences, start_date, end_date, calendar):
+    """Distinct people out on each working day of [start_date, end_date].
+
+    `absences` needs emp_id, start_date and end_date columns; an employee
+    with several overlapping requests counts once per day.
+    """
+    days = calendar.working_dates(start_date, end_date)
+    if absences.empty or not len(days):
+        return pd.Series(0, index=pd.DatetimeIndex(days, name='date'), name='out', dtype=np.int64)
+    emp_codes, _ = pd.factorize(absences['emp_id'])
+    order = np.argsort(emp_codes, kind='stable')
+    starts = pd.to_datetime(absences['start_date']).to_numpy().astype('datetime64[D]')[order]
+    ends = pd.to_datetime(absences['end_date']).to_numpy().astype('datetime64[D]')[order]
+    out = (starts[None, :] <= days[:, None]) & (ends[None, :] >= days[:, None])
+    # Collapse each employee's requests to one column before counting
+    first_of_emp = np.flatnonzero(np.r_[True, np.diff(emp_codes[order]) != 0])
+    per_emp = np.logical_or.reduceat(out, first_of_emp, axis=1)
+    return pd.Series(per_emp.sum(axis=1), index=pd.DatetimeIndex(days, name='date'), name='out')
+
+def coverage_warning(absences, headcount, emp_id, start_date, end_date, calendar, threshold=MIN_COVERAGE):
+    """Message if emp_id's leave would drop coverage below threshold, else None"""
+    if not headcount:
+        return None
+    proposed = pd.DataFrame({'emp_id': [emp_id], 'start_date': [pd.Timestamp(start_date)],
+                             'end_date': [pd.Timestamp(end_date)]})
+    absences = pd.concat([absences[['emp_id', 'start_date', 'end_date']], proposed], ignore_index=True)
+    out = daily_absences(absences, start_date, end_date, calendar)
+    if out.empty:
+        return None
+    coverage = 1 - out / headcount
+    worst_day = coverage.idxmin()
+    if coverage[worst_day] >= threshold:
+        return None
+    return (f"Team coverage would drop to {coverage[worst_day]:.0%} on {worst_day:%Y-%m-%d} "
+            f"({out[worst_day]} of {headcount} out), below the {threshold:.0%} minimum")
@@ -0,0 +1,95 @@
+"""Concurrent leave applications never overdraw a balance.
+
+Many threads submit one-day requests for one employee, more days than
+the employee has left, through db.apply_leave (BEGIN IMMEDIATE) and
+LeaveStore.add_request (the store lock). Every day accepted must fit:
+used plus Pending days stays within the total, and the reserved days
+match the Pending rows.
+
+Run with: python -m pytest test_concurrency.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+
+import db
+from leave_store import BalanceError, LeaveStore
+
+THREADS = 16
+EXTRA_SUBMISSIONS = 40  # beyond the balance, so some must be refused
+
+def weekdays(count, first=date(2031, 1, 6)):
+    """Distinct one-day ranges, so only the balance can refuse a request"""
+    days = (first + timedelta(days=n) for n in range(count * 2))
+    return [day for day in days if day.weekday() < 5][:count]
+
+def submit_all(submit, days):
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return sum(pool.map(submit, days))
+
+
+@pytest.fixture
+def database(tmp_path):
+    """db.py on a fresh sample database, with its default connection pool"""
+    db.DB_PATH = str(tmp_path / 'concurrency.db')
+    db._pool = None
+    db._bootstrapped = False
+    db.bootstrap()
+    yield
+    db._pool.close()
+    db._pool = None
+    db._bootstrapped = False
+    db.read_cache.clear()
+
+
+def test_apply_leave_never_overdraws(database):
+    emp_id = 'EMP004'
+    with db.connection() as conn:
+        balance = db.available_balance(conn, emp_id)
+
+    def submit(day):
+        return db.apply_leave(emp_id, 'Vacation', day, day, 'Stress test')[0]
+
+    accepted = submit_all(submit, weekdays(balance + EXTRA_SUBMISSIONS))
+
+    with db.connection() as conn:
+        total, used = conn.execute("SELECT total_leaves, used_leaves FROM employees WHERE emp_id=?",
+                                   (emp_id,)).fetchone()
+        pending_rows = conn.execute("SELECT COALESCE(SUM(days), 0) FROM leave_requests "
+                                    "WHERE emp_id=? AND status='Pending'", (emp_id,)).fetchone()[0]
+        pending_days = conn.execute("SELECT pending_days FROM leave_counters WHERE scope=?",
+                                    (emp_id,)).fetchone()[0]
+        stored = conn.execute("SELECT COUNT(*) FROM leave_requests WHERE emp_id=? AND reason='Stress test'",
+                              (emp_id,)).fetchone()[0]
+    assert used + pending_rows <= total
+    assert pending_days == pending_rows
+    assert stored == accepted
+    # Refusals were for the balance alone: every day available was taken
+    assert accepted == balance
+
+
+def test_store_add_request_never_overdraws():
+    store = LeaveStore()
+    store.seed({1: {'emp_id': 1, 'name': 'Stress Test', 'email': 'stress@acme.com', 'password': '',
+                    'department': 'Engineering', 'role': 'Employee', 'total_leaves': 20, 'used_leaves': 5}}, [])
+    balance = store.available_balance(1)
+
+    def submit(day):
+        try:
+            store.add_request({'emp_id': 1, 'leave_type': 'Casual Leave', 'start_date': str(day),
+                               'end_date': str(day), 'days': 1, 'reason': 'Stress test', 'status': 'Pending',
+                               'applied_date': f"{day} 09:00:00", 'approved_by': None})
+        except BalanceError:
+            return False
+        return True
+
+    accepted = submit_all(submit, weekdays(balance + EXTRA_SUBMISSIONS))
+
+    emp = store.get_employee(1)
+    requests = store.requests_frame(emp_id=1)
+    pending_rows = int(requests.loc[requests['status'] == 'Pending', 'days'].sum())
+    assert emp['used_leaves'] + pending_rows <= emp['total_leaves']
+    assert store.available_balance(1) == emp['total_leaves'] - emp['used_leaves'] - pending_rows
+    assert len(requests) == accepted
+    assert accepted == balance
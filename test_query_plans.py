@@ -0,0 +1,127 @@
+"""Query plans of db.py's data functions on a seeded, ANALYZEd database.
+
+Every statement a call issues is traced and run through EXPLAIN QUERY
+PLAN. A SCAN of leave_requests fails the test unless ALLOWED_SCANS lists
+that plan line for that call, with the reason the read is acceptable.
+
+Run with: python -m pytest test_query_plans.py
+"""
+import re
+import sqlite3
+from datetime import date
+
+import numpy as np
+import pytest
+
+import db
+import synthetic_data
+
+EMPLOYEES = 500
+ROWS = 50_000
+TODAY = '2026-06-30'
+
+# "SCAN leave_requests", "SCAN lr", and index walks such as
+# "SCAN lr USING INDEX idx_leave_requests_applied"
+SCAN = re.compile(r'^SCAN (leave_requests|lr)\b')
+
+ALLOWED_SCANS = {
+    # The legacy admin list and the export read the whole history on purpose
+    'get_all_leaves': {'SCAN lr USING INDEX idx_leave_requests_applied'},
+    'export': {'SCAN lr'},
+    # Newest first under a LIMIT: the walk stops after one page of matching rows
+    'page': {'SCAN lr USING INDEX idx_leave_requests_applied'},
+    'page dates': {'SCAN lr USING INDEX idx_leave_requests_applied'},
+}
+
+
+@pytest.fixture(scope='module')
+def seeded(tmp_path_factory):
+    """db.py pointed at a synthetic database, through one traced connection"""
+    db.DB_PATH = str(tmp_path_factory.mktemp('plans') / 'plans.db')
+    db._pool = db.ConnectionPool(db.DB_PATH, size=1)
+    rng = np.random.default_rng(0)
+    org = synthetic_data.Organization(EMPLOYEES, rng)
+    history = synthetic_data.generate_history(org, ROWS, synthetic_data.APP_LEAVE_TYPES, rng, TODAY)
+    synthetic_data.write_sqlite(org, history, 'password123')  # ends with ANALYZE
+
+    with sqlite3.connect(db.DB_PATH) as conn:
+        pending = [row[0] for row in conn.execute(
+            "SELECT id FROM leave_requests WHERE status = 'Pending' ORDER BY id LIMIT 3")]
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+    yield statements, pending
+    db._pool.close()
+    db._pool = None
+
+
+def calls(pending):
+    emp_id = 'EMP000001'
+    return {
+        'authenticate_user': lambda: db.authenticate_user(emp_id, 'password123'),
+        'get_employee_info': lambda: db.get_employee_info(emp_id),
+        'get_employee_version': lambda: db.get_employee_version(emp_id),
+        'get_employee_snapshot': lambda: db.get_employee_snapshot(emp_id),
+        'get_dashboard_stats employee': lambda: db.get_dashboard_stats(emp_id),
+        'get_dashboard_stats': lambda: db.get_dashboard_stats(),
+        'get_employee_leaves': lambda: db.get_employee_leaves(emp_id),
+        'get_all_leaves': db.get_all_leaves,
+        'get_employees_overview': db.get_employees_overview,
+        'page': lambda: db.get_leaves_page(),
+        'page dates': lambda: db.get_leaves_page(start_date=date(2025, 11, 1), end_date=date(2025, 11, 30)),
+        'page pending': lambda: db.get_leaves_page(status='Pending'),
+        'page pending after': lambda: db.get_leaves_page(status='Pending', after=('2026-01-01 00:00:00', 10**9)),
+        'page approved dates': lambda: db.get_leaves_page(status='Approved', start_date=date(2025, 11, 1),
+                                                          end_date=date(2025, 11, 30)),
+        'page department': lambda: db.get_leaves_page(department='Engineering'),
+        'export': lambda: list(db.iter_leave_history()),
+        'export approved dates': lambda: list(db.iter_leave_history('Approved', None, date(2025, 11, 1),
+                                                                    date(2025, 11, 30))),
+        'get_team_absences': lambda: db.get_team_absences(date(2025, 12, 1), date(2025, 12, 31), 'Engineering'),
+        'get_headcount': lambda: db.get_headcount('Engineering'),
+        'check_team_coverage': lambda: db.check_team_coverage(emp_id, 'Engineering',
+                                                              date(2030, 1, 7), date(2030, 1, 8)),
+        'apply_leave': lambda: db.apply_leave(emp_id, 'Vacation', date(2030, 1, 7), date(2030, 1, 8), 'Plan check'),
+        'apply_leave overlap': lambda: db.apply_leave(emp_id, 'Vacation', date(2030, 1, 8), date(2030, 1, 9),
+                                                      'Overlap check'),
+        'update_leave_status': lambda: db.update_leave_status(pending[0], 'Approved', 'ADMIN'),
+        'update_leave_statuses': lambda: db.update_leave_statuses(pending[1:], 'Rejected', 'ADMIN'),
+        'latest_change employee': lambda: db.latest_change(emp_id),
+        'latest_change': lambda: db.latest_change(),
+    }
+
+
+def traced_plans(statements, call):
+    """{statement: plan lines} for the statements one call issues"""
+    db.read_cache.clear()
+    statements.clear()
+    call()
+    with db.connection() as conn:
+        conn.set_trace_callback(None)
+        try:
+            return {sql: db.explain_query_plan(conn, sql) for sql in dict.fromkeys(statements)
+                    # Trigger bodies are traced as "-- TRIGGER name" comments
+                    if not sql.startswith('--')
+                    and sql.split(None, 1)[0].upper() not in ('BEGIN', 'COMMIT', 'ROLLBACK')}
+        finally:
+            conn.set_trace_callback(statements.append)
+
+
+@pytest.mark.parametrize('name', list(calls([])))
+def test_no_unlisted_scan_of_leave_requests(seeded, name):
+    statements, pending = seeded
+    plans = traced_plans(statements, calls(pending)[name])
+    assert plans, f"{name} issued no statements"
+    allowed = ALLOWED_SCANS.get(name, set())
+    scans = {f"{' '.join(sql.split())}\n    {line}"
+             for sql, plan in plans.items() for line in plan
+             if SCAN.match(line) and line not in allowed}
+    assert not scans, f"{name} scans leave_requests:\n" + "\n".join(sorted(scans))
+
+
+def test_active_date_range_uses_interval_index(seeded):
+    statements, pending = seeded
+    plans = traced_plans(statements, calls(pending)['page approved dates'])
+    lines = [line for plan in plans.values() for line in plan]
+    assert any('leave_intervals' in line for line in lines), lines
+    assert not any('(status=?)' in line for line in lines), lines
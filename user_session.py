@@ -0,0 +1,84 @@
+"""The logged-in user of app.py, kept in st.session_state between reruns.
+
+A UserSession holds the user's identity together with a cached copy of
+their profile, leave balance and leave history, stamped with the
+employees.row_version it was read at. refresh() compares that stamp with
+the current row_version (itself read-cached until a write invalidates
+it) and reloads only when it moved, so a rerun in which nothing changed
+issues no employee queries at all.
+
+Sessions are signed with an HMAC over the identity and version, so a
+session whose fields were altered after login, or that was issued by
+another server secret, is rejected instead of trusted.
+"""
+import hashlib
+import hmac
+import json
+import os
+import time
+
+import db
+
+# Set LEAVE_SESSION_SECRET to share sessions between processes; the
+# default is a fresh secret per process
+SESSION_SECRET = os.environ.get('LEAVE_SESSION_SECRET', '').encode() or os.urandom(32)
+
+ADMIN_ID = 'ADMIN'
+
+class UserSession:
+
+    def __init__(self, emp_id, name, department, is_admin, issued_at=None):
+        self.emp_id = emp_id
+        self.name = name
+        self.department = department
+        self.is_admin = is_admin
+        self.issued_at = issued_at if issued_at is not None else time.time()
+        self.version = None
+        self.stats = None
+        self.leaves = None
+        self.signature = None
+
+    def _payload(self):
+        return json.dumps([self.emp_id, self.name, self.department, self.is_admin,
+                           self.issued_at, self.version]).encode()
+
+    def sign(self):
+        self.signature = hmac.new(SESSION_SECRET, self._payload(), hashlib.sha256).hexdigest()
+
+    def is_valid(self):
+        return self.signature is not None and hmac.compare_digest(
+            self.signature, hmac.new(SESSION_SECRET, self._payload(), hashlib.sha256).hexdigest())
+
+    def load(self, snapshot):
+        """Take version, profile, stats and leave history from db.get_employee_snapshot"""
+        self.version, profile, self.stats, self.leaves = snapshot
+        self.name, self.department = profile['name'], profile['department']
+        self.sign()
+
+
+def start_session(user):
+    """Signed session for an employees row returned by db.authenticate_user"""
+    emp_id = user[1]
+    session = UserSession(emp_id, user[2], user[4], is_admin=(emp_id == ADMIN_ID))
+    if session.is_admin:
+        session.sign()
+        return session
+    return refresh(session, force=True)
+
+def refresh(session, force=False):
+    """The session, reloaded if the employee's row_version has moved.
+
+    None if the session is missing, fails its signature check, or its
+    employee no longer exists: the caller should log the user out.
+    """
+    if session is None or (not force and not session.is_valid()):
+        return None
+    if session.is_admin:
+        return session
+    if not force and db.get_employee_version(session.emp_id) == session.version:
+        return session
+    snapshot = db.get_employee_snapshot(session.emp_id)
+    if snapshot is None:
+        return None
+    session.load(snapshot)
+    return session
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+CALENDAR_PATH = os.environ.get('LEAVE_CALENDAR_PATH', 'calendars.json')
+
+DEFAULT_WEEKEND = ('Sat', 'Sun')
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# Span covered by the precomputed table; ranges outside it are still
+# counted correctly, just without the O(1) lookup
+TABLE_START = np.datetime64('2000-01-01', 'D')
+TABLE_END = np.datetime64('2100-01-01', 'D')
+
+class WorkingDayCalendar:
+    """Counts working days under one weekend rule and holiday list.
+
+    A cumulative count of working days is precomputed over
+    TABLE_START..TABLE_END, so the working days in any inclusive range
+    are one subtraction, and count_many() resolves arrays of ranges
+    with a single vectorized lookup.
+    """
+
+    def __init__(self, weekend=DEFAULT_WEEKEND, holidays=()):
+        self.weekend = tuple(day[:3].title() for day in weekend)
+        unknown = set(self.weekend) - set(WEEKDAYS)
+        if unknown:
+            raise ValueError(f"Unknown weekend day(s): {', '.join(sorted(unknown))}")
+        self.holidays = np.unique(np.asarray(holidays, dtype='datetime64[D]'))
+        weekmask = [0 if day in self.weekend else 1 for day in WEEKDAYS]
+        self._busdaycal = np.busdaycalendar(weekmask=weekmask, holidays=self.holidays)
+        # _cumulative[i] = working days in [TABLE_START, TABLE_START + i)
+        table = np.arange(TABLE_START, TABLE_END, dtype='datetime64[D]')
+        working = np.is_busday(table, busdaycal=self._busdaycal)
+        self._cumulative = np.concatenate(([0], np.cumsum(working, dtype=np.int32)))
+
+    def count(self, start_date, end_date):
+        """Working days from start_date to end_date, both inclusive"""
+        return int(self.count_many([start_date], [end_date])[0])
+
+    def count_many(self, start_dates, end_dates):
+        """Working days for each (start, end) pair, both inclusive; 0 when end < start"""
+        starts = np.asarray(start_dates, dtype='datetime64[D]')
+        stops = np.asarray(end_dates, dtype='datetime64[D]') + 1
+        stops = np.maximum(stops, starts)
+        in_table = (starts >= TABLE_START) & (stops <= TABLE_END)
+        if in_table.all():
+            return (self._cumulative[(stops - TABLE_START).astype(np.intp)]
+                    - self._cumulative[(starts - TABLE_START).astype(np.intp)])
+        counts = np.busday_count(starts, stops, busdaycal=self._busdaycal)
+        return counts.astype(np.int32)
+
+    def roll_forward(self, dates):
+        """Each date, or the first working day after it"""
+        return np.busday_offset(np.asarray(dates, dtype='datetime64[D]'), 0, roll='forward',
+                                busdaycal=self._busdaycal)
+
+    def end_dates(self, start_dates, days):
+        """Last day of a leave of `days` working days from each start, a working day"""
+        return np.busday_offset(self.roll_forward(start_dates), np.asarray(days) - 1, roll='forward',
+                                busdaycal=self._busdaycal)
+
+    def working_dates(self, start_date, end_date):
+        """Working days from start_date to end_date, both inclusive, as datetime64[D]"""
+        days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1,
+                         dtype='datetime64[D]')
+        return days[np.is_busday(days, busdaycal=self._busdaycal)]
+
+    def is_working_day(self, day):
+        return bool(np.is_busday(np.datetime64(day, 'D'), busdaycal=self._busdaycal))
+
+
+class CalendarSet:
+    """The default calendar plus per-department overrides.
+
+    Loaded from a JSON file of the form
+
+        {"default": {"weekend": ["Sat", "Sun"], "holidays": ["2026-01-01"]},
+         "departments": {"Sales": {"weekend": ["Fri", "Sat"]}}}
+
+    A department entry replaces only the keys it names and takes the rest
+    from "default". Departments without an entry use the default calendar.
+    """
+
+    def __init__(self, default=None, departments=None):
+        default = default or {}
+        self.default = WorkingDayCalendar(default.get('weekend', DEFAULT_WEEKEND),
+                                          default.get('holidays', ()))
+        self.departments = {
+            name: WorkingDayCalendar(spec.get('weekend', self.default.weekend),
+                                     spec.get('holidays', self.default.holidays))
+            for name, spec in (departments or {}).items()
+        }
+
+    @classmethod
+    def from_file(cls, path):
+        """Calendars from a JSON file; the Mon-Fri default if it does not exist"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        return cls(config.get('default'), config.get('departments'))
+
+    def for_department(self, department):
+        return self.departments.get(department, self.default)
+
+
+_calendars = None
+_calendars_lock = threading.Lock()
+
+def get_calendars():
+    """Process-wide calendars from CALENDAR_PATH, loaded on first use"""
+    global _calendars
+    if _calendars is None:
+        with _calendars_lock:
+            if _calendars is None:
+                _calendars = CalendarSet.from_file(CALENDAR_PATH)
+    return _calendars
+
+def working_days(start_date, end_date, department=None):
+    """Working days in an inclusive date range under the department's calendar"""
+    return get_calendars().for_department(department).count(start_date, end_date)